@@ -0,0 +1,163 @@
+import collections
+import json
+import threading
+
+from forecast import Forecaster
+
+# --- AI ASSISTANT ---
+# Everything the AI Assistant tab does besides drawing: the inventory summary
+# sent with each question, and the HTTP client that talks to an
+# OpenAI-compatible chat completions endpoint (OpenRouter by default).
+#
+# The summary and the answers are cached under Database.data_version(), so a
+# question asked twice against unchanged data is answered from memory, and a
+# new question only re-reads the database if something was written since the
+# last one. requests is imported on first use, not with the module.
+
+API_URL = "https://openrouter.ai/api/v1/chat/completions"
+CONNECT_TIMEOUT = 5      # seconds to establish the connection
+READ_TIMEOUT = 60        # seconds the stream may stay silent before giving up
+RETRIES = 3              # retries for connection errors and 429/5xx responses
+RESPONSE_CACHE_SIZE = 64
+
+SYSTEM_PROMPT = """You are an expert inventory management AI assistant. Your goal is to provide clear, actionable advice to a shop owner. Analyze the following data and answer the user's question.
+        DO NOT create heandings only do simple formating.
+        **Inventory & Sales Data Summary:**
+        - Low Stock Products (Top 10): {low_stock_products}
+        - Top Selling Products (from recent transactions): {top_sellers}
+        - Forecast to Run Out Soonest (name, in stock, units/day, days left, suggested order): {reorder}
+
+        Based on this data, provide a concise recommendation. Focus on what to restock, what might be overstocked, and potential sales strategies.
+        """
+
+
+def build_system_prompt(db, forecaster=None):
+    """Fills SYSTEM_PROMPT with the low-stock list, recent top sellers and the reorder forecast."""
+    low_stock_products = db.low_stock_products(10)
+    # Top sellers across the 50 most recent transactions
+    top_sellers = db.top_sellers(recent=50, limit=10)
+    forecast = (forecaster or Forecaster(db)).get()
+    reorder = [(name, qty, round(velocity, 1), round(days_left, 1), order_qty)
+               for _, name, qty, velocity, days_left, _, order_qty in forecast.reorder_list(10)]
+    return SYSTEM_PROMPT.format(low_stock_products=low_stock_products, top_sellers=top_sellers, reorder=reorder)
+
+
+def iter_sse_content(lines):
+    """Yields the text deltas from an OpenAI-compatible server-sent event stream.
+
+    'lines' are the decoded lines of the response body. Comment lines (": ...",
+    used as keep-alives) and events without content are skipped; 'data: [DONE]'
+    ends the stream. A streamed error object raises RuntimeError.
+    """
+    for line in lines:
+        if not line or line.startswith(":") or not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            for _ in lines:
+                pass  # read to the end of the body so the connection goes back to the pool
+            return
+        event = json.loads(data)
+        if "error" in event:
+            raise RuntimeError(event["error"].get("message", "The AI service reported an error."))
+        for choice in event.get("choices", ()):
+            content = (choice.get("delta") or {}).get("content")
+            if content:
+                yield content
+
+
+class Assistant:
+    """Answers questions about the inventory, caching the context and the answers.
+
+    Safe to call from any worker thread. on_token(text) receives the answer as
+    it streams in (or all at once when it comes from the cache).
+    """
+
+    def __init__(self, db, api_key, model, url=API_URL, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES,
+                 forecaster=None):
+        self.db = db
+        self.forecaster = forecaster or Forecaster(db)
+        self.api_key = api_key
+        self.model = model
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self._session = None
+        self._context = None  # (data version, system prompt)
+        self._responses = collections.OrderedDict()  # (question, data version) -> answer
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """A pooled requests.Session (keep-alive, so one TLS handshake serves many questions)."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        retry = Retry(total=self.retries, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=None, respect_retry_after_header=True)
+        session = requests.Session()
+        session.mount("https://", HTTPAdapter(max_retries=retry))
+        session.mount("http://", HTTPAdapter(max_retries=retry))
+        session.headers.update({"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"})
+        return session
+
+    def context(self, version=None):
+        """The system prompt, rebuilt only when the data version has moved."""
+        version = version if version is not None else self.db.data_version()
+        with self._lock:
+            if self._context is not None and self._context[0] == version:
+                return self._context[1]
+        prompt = build_system_prompt(self.db, self.forecaster)
+        with self._lock:
+            self._context = (version, prompt)
+        return prompt
+
+    def ask(self, question, on_token=None):
+        """Returns the full answer to 'question', streaming it through on_token."""
+        version = self.db.data_version()
+        key = (" ".join(question.lower().split()), self.model, version)
+        with self._lock:
+            cached = self._responses.get(key)
+            if cached is not None:
+                self._responses.move_to_end(key)
+        if cached is not None:
+            if on_token is not None:
+                on_token(cached)
+            return cached
+
+        payload = {
+            "model": self.model,
+            "stream": True,
+            "messages": [
+                {"role": "system", "content": self.context(version)},
+                {"role": "user", "content": question},
+            ],
+        }
+        parts = []
+        with self.session.post(self.url, data=json.dumps(payload), stream=True, timeout=self.timeout) as response:
+            response.raise_for_status()
+            response.encoding = "utf-8"  # the SSE format is always UTF-8, whatever the headers say
+            for text in iter_sse_content(response.iter_lines(decode_unicode=True)):
+                parts.append(text)
+                if on_token is not None:
+                    on_token(text)
+
+        answer = "".join(parts)
+        with self._lock:
+            self._responses[key] = answer
+            while len(self._responses) > RESPONSE_CACHE_SIZE:
+                self._responses.popitem(last=False)
+        return answer
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
@@ -1,17 +1,40 @@
+import time
+STARTED = time.perf_counter()  # taken before the other imports, for the startup report
+
 import sqlite3
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
 import datetime
-import requests
-import json
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import importlib
+from db import Database, InsufficientStock, LOW_STOCK_THRESHOLD
+from widgets import VirtualTreeview
+from executor import BackgroundExecutor
+from bill import Bill, OutOfStock, to_cents, format_cents
+from scanner import BurstDetector, ScanQueue, SkuCache
+import archive
+import csvio
+import reports
+import receipts
+import ai
+from charts import RevenueChart, SeriesCache
+from forecast import Forecaster, WINDOW_DAYS
+from journal import JournalInUse, SalesJournal
+from backup import BackupScheduler
+from core import StockService
+from client import StockClient, TOKEN_ENV
+from metrics import Metrics, StartupTimer
+from events import (ProductAdded, ProductRemoved, ProductUpdated, ProductsImported, StockChanged,
+                    TransactionRecorded, TransactionDeleted, TransactionsArchived, SaleOversold)
+# matplotlib, NumPy and requests are slow to import, so they are only loaded once
+# the Analytics, Reorder or AI Assistant tab is first opened (see
+# create_analytics_tab, forecast.compute and ai.Assistant)
 
 # ... other imports
 import os  # <-- Add this import
 import sys # <-- Add this import
 import tempfile
 import platform
+import multiprocessing
 
 # Try to import pywin32 printing helpers (optional, faster/raw printing on Windows)
 try:
@@ -42,45 +65,74 @@ DB_FILE = resource_path("inventory.db")
 # ... the rest of your code remains the same
 
 # --- 1. DATABASE SETUP ---
-# All functions related to database interaction are here.
+# Schema creation and every query live in db.py (see the Database class).
 
 DB_FILE = "inventory.db"
 
-def setup_database():
-    """Creates the necessary tables in the SQLite database if they don't exist."""
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-
-    # Products table: Stores all product information.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS products (
-            sku TEXT PRIMARY KEY,
-            name TEXT NOT NULL,
-            price REAL NOT NULL,
-            quantity INTEGER NOT NULL
-        )
-    ''')
-
-    # Transactions table: Stores records of each sale.
-    # The 'items' column will store a JSON string of the products sold.
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            total REAL NOT NULL,
-            created_at TEXT NOT NULL,
-            items TEXT NOT NULL
-        )
-    ''')
-
-    conn.commit()
-    conn.close()
+# Keystrokes in the billing search box closer together than this run one query
+SEARCH_DEBOUNCE_MS = 150
+
+# Seconds the AI service may stay silent before the request is given up
+AI_TIMEOUT = 60
+
+# Chat completions endpoint; STOCKDESK_AI_URL points the assistant elsewhere
+# (e.g. at a local stub server, see bench/ai_stub.py)
+AI_URL = os.environ.get("STOCKDESK_AI_URL", ai.API_URL)
+
+# Diagnostics (statement and handler timings plus a Diagnostics tab) are off
+# unless the app is started with --diagnostics or STOCKDESK_DIAGNOSTICS=1
+DIAGNOSTICS_ENV = "STOCKDESK_DIAGNOSTICS"
+SLOW_QUERY_LOG = "slow_queries.log"
+
+# The window should show the Billing tab with its first results within this
+# many milliseconds of launch; the startup report (--startup-report, or with
+# diagnostics on) flags starts that take longer
+STARTUP_BUDGET_MS = 1500
+
+# Rows shown in the Reorder tab (the products soonest to run out)
+REORDER_LIMIT = 500
+
+# Stock alerts kept in the Dashboard's list (newest first; see db.stock_alerts)
+ALERTS_SHOWN = 200
+
+# Started with --server URL (or STOCKDESK_SERVER=URL), the app is a till for a
+# shared server.py: Dashboard and Billing only, with every read and sale going
+# over HTTP (STOCKDESK_SERVER_TOKEN, if the server requires one)
+SERVER_ENV = "STOCKDESK_SERVER"
+
+# InventoryApp methods timed in the "ui" category when diagnostics are on.
+# Handlers that wait on a modal dialog (confirmations, file pickers) are left
+# out, since their time is the user's, not the app's.
+TIMED_HANDLERS = (
+    "refresh_all_data", "on_tab_changed",
+    "on_product_added", "on_product_removed", "on_product_updated", "on_products_imported", "on_stock_changed",
+    "on_transaction_recorded", "on_transaction_deleted", "on_transactions_archived", "on_sale_oversold",
+    "update_dashboard_stats", "show_dashboard_stats", "show_stock_alerts",
+    "load_products", "add_product",
+    "schedule_search", "search_products", "show_search_results",
+    "add_to_bill", "on_search_return", "add_product_to_bill", "show_bill_line", "remove_bill_line", "clear_bill", "checkout",
+    "update_analytics_chart", "draw_analytics_chart", "load_reorder", "show_reorder",
+    "send_ai_message", "add_message_to_chat",
+    "load_transactions", "view_transaction_details",
+)
 
 # --- 2. GUI APPLICATION ---
 # The main application class that builds and manages the user interface.
 
 class InventoryApp:
-    def __init__(self, root):
+    def __init__(self, root, db, metrics=None, startup=None, service=None, receipt_spool=None):
         self.root = root
+        self.db = db  # None on a till served by a remote server.py
+        # Search, scan lookups, checkout and the dashboard go through the service:
+        # core.StockService over the local db, or a client.StockClient
+        self.service = service or StockService(db)
+        self.receipt_spool = receipt_spool  # receipts.ReceiptSpool, or None with receipts off
+        self.metrics = metrics
+        self.startup = startup
+        if metrics is not None:
+            # Replace the handlers before any widget captures them as a command
+            for name in TIMED_HANDLERS:
+                setattr(self, name, metrics.wrap(getattr(self, name), "ui", name))
         self.root.title("Shop Inventory Management")
         self.root.geometry("1200x800")
 
@@ -92,32 +144,244 @@ class InventoryApp:
         self.style.configure("TButton", font=('Helvetica', 11))
         self.style.configure("Treeview.Heading", font=('Helvetica', 11, 'bold'))
 
+        # Database and network work runs on background threads; results come
+        # back to the Tk thread through the executor, and so do change events.
+        self.executor = BackgroundExecutor(root)
+        self.service.events.dispatch = self.executor.call_in_main
+        self.loading = {}  # Task -> name of the tab waiting on it
+
+        # Sales forecast shared by the Reorder tab and the AI Assistant
+        self.forecaster = Forecaster(db)
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+
+        # Status bar: shows which tabs are waiting on background work
+        self.status_var = tk.StringVar(value="")
+        ttk.Label(root, textvariable=self.status_var, anchor='w').pack(side='bottom', fill='x', padx=10)
+
         # Create the main tabbed interface
         self.notebook = ttk.Notebook(root)
         self.notebook.pack(expand=True, fill='both', padx=10, pady=10)
 
-        # Initialize and create each tab
-        self.create_dashboard_tab()
-        self.create_products_tab()
-        self.create_billing_tab()
-        self.create_analytics_tab()
-        self.create_transactions_tab()  # <-- ADDED Transactions tab
-        self.create_ai_assistant_tab()
-        
-        # Load initial data
-        self.refresh_all_data()
+        # Every tab gets its (empty) frame now, but its widgets are built and its
+        # data loaded only when it is first shown, so startup cost does not grow
+        # with the number of tabs or the size of the database.
+        self.tab_builders = {}  # frame path -> create_*_tab, until the tab is built
+        self.add_tab("dashboard", "Dashboard", self.create_dashboard_tab)
+        self.add_tab("products", "Products", self.create_products_tab, local=True)
+        self.add_tab("billing", "Billing", self.create_billing_tab)
+        self.add_tab("analytics", "Analytics", self.create_analytics_tab, local=True)
+        self.add_tab("reorder", "Reorder", self.create_reorder_tab, local=True)
+        self.add_tab("transactions", "Transactions", self.create_transactions_tab, local=True)
+        self.add_tab("ai", "AI Assistant", self.create_ai_assistant_tab, local=True)
+        if metrics is not None:
+            self.add_tab("diagnostics", "Diagnostics", self.create_diagnostics_tab)
+
+        # Writes publish change events; each tab patches itself from them.
+        # Tabs that are hidden when a change arrives refresh on their next visit.
+        self.dirty_tabs = {}
+        self.subscribe_to_changes()
+
+        # Open on the till: Billing is the only tab built before the window shows
+        self.notebook.select(self.billing_frame)
+        self.build_tab(self.billing_frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+        if startup is not None:
+            startup.mark("window built")
+            self.root.after_idle(startup.mark, "interactive")
+
+    def add_tab(self, name, text, builder, local=False):
+        """Adds an empty tab as self.<name>_frame; builder() fills it on first visit.
+
+        'local' tabs need the database itself. On a remote till their frame is
+        created but never shown, so they stay unbuilt and every refresh skips them.
+        """
+        frame = ttk.Frame(self.notebook, padding="20")
+        if self.db is not None or not local:
+            self.notebook.add(frame, text=text)
+        setattr(self, f"{name}_frame", frame)
+        self.tab_builders[str(frame)] = builder
+
+    def build_tab(self, frame):
+        """Builds a tab's widgets and loads its data, the first time only."""
+        builder = self.tab_builders.pop(str(frame), None)
+        if builder is not None:
+            builder()
+
+    def is_built(self, frame):
+        return str(frame) not in self.tab_builders
 
     def refresh_all_data(self):
-        """Refreshes the data across all tabs."""
-        self.update_dashboard_stats()
-        self.load_products()
-        self.load_transactions()  # <-- ADDED load of transactions
-        self.update_analytics_chart('month') # Default to month view
+        """Refreshes the data across all tabs that have been built."""
+        for frame, refresh in ((self.dashboard_frame, self.update_dashboard_stats),
+                               (self.products_frame, self.load_products),
+                               (self.billing_frame, self.search_products),
+                               (self.analytics_frame, lambda: self.update_analytics_chart(self.analytics_range)),
+                               (self.reorder_frame, self.load_reorder),
+                               (self.transactions_frame, self.load_transactions)):
+            if self.is_built(frame):
+                refresh()
+
+    def on_close(self):
+        self.service.close()  # Applies the journal's pending sales, or closes the server connections
+        self.executor.shutdown()
+        if getattr(self, "assistant", None) is not None:
+            self.assistant.close()
+        self.root.destroy()
+
+    # --- Background Work ---
+    def run_in_background(self, frame, fn, *args, on_done=None, on_error=None, key=None, timeout=None):
+        """Runs fn(*args) on the executor, showing 'frame's tab as loading meanwhile.
+
+        'on_done'/'on_error' run on the Tk thread. Errors without a handler are
+        shown in a messagebox.
+        """
+        def finish(callback, value):
+            self.update_loading_status()
+            if callback is not None:
+                callback(value)
+
+        if self.metrics is not None:
+            fn = self.metrics.wrap(fn, "task", getattr(fn, "__qualname__", None))
+        task = self.executor.submit(fn, *args, key=key, timeout=timeout,
+                                    on_done=lambda result: finish(on_done, result),
+                                    on_error=lambda e: finish(on_error or self.show_background_error, e))
+        self.loading[task] = self.notebook.tab(frame, 'text')
+        self.update_loading_status()
+        return task
+
+    def update_loading_status(self):
+        self.loading = {task: name for task, name in self.loading.items() if self.executor.is_pending(task)}
+        names = sorted(set(self.loading.values()))
+        self.status_var.set(f"Loading {', '.join(names)}..." if names else "")
+
+    def show_background_error(self, error):
+        messagebox.showerror("Error", f"An unexpected error occurred: {error}")
+
+    def show_progress(self, text):
+        """A progress callback for background work: shows 'text' in the status bar."""
+        self.executor.call_in_main(self.status_var.set, text)
+
+    # --- Change Events ---
+    def subscribe_to_changes(self):
+        events = self.service.events
+        events.subscribe(ProductAdded, self.on_product_added)
+        events.subscribe(ProductRemoved, self.on_product_removed)
+        events.subscribe(ProductUpdated, self.on_product_updated)
+        events.subscribe(ProductsImported, self.on_products_imported)
+        events.subscribe(StockChanged, self.on_stock_changed)
+        events.subscribe(TransactionRecorded, self.on_transaction_recorded)
+        events.subscribe(TransactionDeleted, self.on_transaction_deleted)
+        events.subscribe(TransactionsArchived, self.on_transactions_archived)
+        events.subscribe(SaleOversold, self.on_sale_oversold)
+        if self.receipt_spool is not None:
+            # Straight from the writer thread: the spool is thread-safe, and sales the
+            # journal applies while the app closes still get their receipt
+            events.subscribe(TransactionRecorded, self.receipt_spool.print_sale, direct=True)
+
+    def refresh_tab(self, frame, refresh, deferred=None):
+        """Runs 'refresh' now if the tab is on screen, otherwise marks it dirty.
+
+        A dirty tab runs 'deferred' (a full reload, defaulting to 'refresh') on
+        its next visit, so several changes made while it was hidden cost one reload.
+        Tabs not built yet are skipped: they load fresh data when first shown.
+        """
+        if not self.is_built(frame):
+            return
+        if self.notebook.select() == str(frame):
+            refresh()
+        else:
+            self.dirty_tabs[str(frame)] = deferred or refresh
+
+    def on_tab_changed(self, event=None):
+        selected = self.notebook.select()
+        if not self.is_built(selected):
+            self.build_tab(selected)
+            return
+        refresh = self.dirty_tabs.pop(selected, None)
+        if refresh:
+            refresh()
+        if selected == str(self.billing_frame):
+            self.search_entry.focus_set()  # Ready for the next scan
+        if self.metrics is not None and selected == str(self.diagnostics_frame):
+            self.show_diagnostics()
+
+    def on_product_added(self, event):
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.products_frame, lambda: self.product_tree.reload(1), self.load_products)
+        self.refresh_tab(self.billing_frame, self.search_products)
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+
+    def on_product_removed(self, event):
+        if self.is_built(self.billing_frame):
+            self.sku_cache.discard(event.sku)
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.products_frame, lambda: self.product_tree.reload(-1), self.load_products)
+        self.refresh_tab(self.billing_frame, self.search_products)
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+
+    def on_products_imported(self, event):
+        # One reload for the whole import, however many rows it touched
+        if self.is_built(self.billing_frame):
+            self.sku_cache.clear()
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.products_frame, self.load_products)
+        self.refresh_tab(self.billing_frame, self.search_products)
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+
+    def on_stock_changed(self, event):
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+        if self.is_built(self.products_frame):
+            if self.product_tree.query.sort == "Quantity":
+                # The rows move in the current order, so the window has to be re-read
+                self.refresh_tab(self.products_frame, self.product_tree.reload, self.load_products)
+            else:
+                for sku, _, new in event.changes:
+                    self.product_tree.update_row(sku, {"Quantity": new})
+        if self.is_built(self.billing_frame):
+            for sku, _, new in event.changes:
+                self.sku_cache.update_stock(sku, new)
+                if sku in self.search_rows:
+                    self.search_rows[sku] = self.search_rows[sku][:3] + (new,)
+                    self.search_results_tree.set(sku, "Stock", new)
+
+    def on_product_updated(self, event):
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        if self.is_built(self.products_frame):
+            self.refresh_tab(self.products_frame, self.product_tree.reload, self.load_products)
+        if self.is_built(self.billing_frame):
+            row = (event.sku, event.name, event.price, event.quantity)
+            self.sku_cache.remember([row])
+            if event.sku in self.search_rows:
+                self.search_rows[event.sku] = row
+                self.search_results_tree.item(event.sku, values=row)
+
+    def on_transaction_recorded(self, event):
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.transactions_frame, lambda: self.trans_tree.reload(1), self.load_transactions)
+        self.refresh_tab(self.analytics_frame, lambda: self.update_analytics_chart(self.analytics_range))
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+
+    def on_transaction_deleted(self, event):
+        self.refresh_tab(self.dashboard_frame, self.update_dashboard_stats)
+        self.refresh_tab(self.transactions_frame, lambda: self.trans_tree.reload(-1), self.load_transactions)
+        self.refresh_tab(self.analytics_frame, lambda: self.update_analytics_chart(self.analytics_range))
+        self.refresh_tab(self.reorder_frame, self.load_reorder)
+
+    def on_transactions_archived(self, event):
+        # Totals and the rollup still count archived sales; only the hot list shrinks
+        self.refresh_tab(self.transactions_frame, self.load_transactions)
+
+    def on_sale_oversold(self, event):
+        # Rare: another terminal sold the stock between this till's checkout and its write-back
+        lines = "\n".join(f"'{name}': Sold: {qty}, Available: {available}."
+                          for _, name, qty, available in event.shortfalls)
+        messagebox.showwarning("Stock Oversold", f"Sale #{event.tid} was recorded, but the stock had been "
+                                                 f"sold elsewhere; please recount:\n{lines}")
 
     # --- Dashboard Tab ---
     def create_dashboard_tab(self):
-        self.dashboard_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.dashboard_frame, text='Dashboard')
         
         stats_frame = ttk.Frame(self.dashboard_frame)
         stats_frame.pack(pady=20, padx=10, fill='x')
@@ -131,13 +395,44 @@ class InventoryApp:
 
         # Create stat cards
         self.create_stat_card(stats_frame, "Total Products", self.stat_vars["total_products"]).grid(row=0, column=0, padx=10, sticky='ew')
-        self.create_stat_card(stats_frame, "Low Stock Items (<5)", self.stat_vars["low_stock"]).grid(row=0, column=1, padx=10, sticky='ew')
+        self.create_stat_card(stats_frame, "Low Stock Items", self.stat_vars["low_stock"]).grid(row=0, column=1, padx=10, sticky='ew')
         self.create_stat_card(stats_frame, "Total Sales", self.stat_vars["total_sales"]).grid(row=0, column=2, padx=10, sticky='ew')
         self.create_stat_card(stats_frame, "Total Revenue", self.stat_vars["revenue"]).grid(row=0, column=3, padx=10, sticky='ew')
         
         for i in range(4):
             stats_frame.grid_columnconfigure(i, weight=1)
 
+        if self.db is not None:
+            self.create_low_stock_panel()
+
+        self.update_dashboard_stats()
+
+    def create_low_stock_panel(self):
+        # Products below their reorder level, read from the partial index, and
+        # the alert queue the stock triggers fill as products cross their level
+        panel = ttk.PanedWindow(self.dashboard_frame, orient='horizontal')
+        panel.pack(expand=True, fill='both', padx=10, pady=10)
+
+        low_frame = ttk.LabelFrame(panel, text="Below Reorder Level", padding="10")
+        panel.add(low_frame, weight=1)
+        self.low_stock_tree = VirtualTreeview(low_frame, self.db.low_stock_query(),
+                                              columns=("SKU", "Name", "Stock", "Reorder Level"))
+        self.low_stock_tree.pack(expand=True, fill='both')
+        self.instrument_tree("low_stock", self.low_stock_tree)
+
+        alerts_frame = ttk.LabelFrame(panel, text="Stock Alerts", padding="10")
+        panel.add(alerts_frame, weight=1)
+        columns = ("Time", "SKU", "Name", "Stock", "Reorder Level", "Alert")
+        self.alerts_tree = ttk.Treeview(alerts_frame, columns=columns, show='headings')
+        for col in columns:
+            self.alerts_tree.heading(col, text=col)
+            self.alerts_tree.column(col, width=200 if col == "Name" else 90, stretch=(col == "Name"))
+        scrollbar = ttk.Scrollbar(alerts_frame, command=self.alerts_tree.yview)
+        self.alerts_tree.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.alerts_tree.pack(expand=True, fill='both')
+        self.last_alert_id = 0
+
     def create_stat_card(self, parent, title, string_var):
         card = ttk.Frame(parent, borderwidth=2, relief="groove", padding="20")
         title_label = ttk.Label(card, text=title, font=('Helvetica', 12, 'bold'))
@@ -147,32 +442,41 @@ class InventoryApp:
         return card
 
     def update_dashboard_stats(self):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*), SUM(CASE WHEN quantity < 5 THEN 1 ELSE 0 END) FROM products")
-        products_data = cursor.fetchone()
-        
-        cursor.execute("SELECT COUNT(*), SUM(total) FROM transactions")
-        sales_data = cursor.fetchone()
-        
-        conn.close()
-
-        self.stat_vars["total_products"].set(products_data[0] if products_data else 0)
-        self.stat_vars["low_stock"].set(products_data[1] if products_data and products_data[1] else 0)
-        self.stat_vars["total_sales"].set(sales_data[0] if sales_data else 0)
-        self.stat_vars["revenue"].set(f"${sales_data[1]:.2f}" if sales_data and sales_data[1] else "$0.00")
+        # The counters are maintained by triggers, so this is a single-row read,
+        # and new stock alerts are a read of the queue past the last one shown
+        self.run_in_background(self.dashboard_frame, self.service.dashboard_stats,
+                               on_done=self.show_dashboard_stats, key="dashboard")
+        if self.db is not None:
+            self.run_in_background(self.dashboard_frame, self.db.stock_alerts, self.last_alert_id,
+                                   on_done=self.show_stock_alerts, key="stock_alerts")
+
+    def show_dashboard_stats(self, stats):
+        product_count, low_stock, sales_count, revenue = stats
+        self.stat_vars["total_products"].set(product_count)
+        self.stat_vars["low_stock"].set(low_stock)
+        self.stat_vars["total_sales"].set(sales_count)
+        self.stat_vars["revenue"].set(f"${revenue:.2f}")
+        if self.db is not None:
+            # One page of the partial index: stock of the listed products may have moved too
+            self.low_stock_tree.set_total(low_stock)
+
+    def show_stock_alerts(self, alerts):
+        for aid, sku, name, quantity, reorder_level, low, created_at in alerts:
+            if aid <= self.last_alert_id:
+                continue  # Already shown by an overlapping poll
+            self.alerts_tree.insert("", 0, iid=aid, values=(created_at.replace("T", " "), sku, name, quantity,
+                                                            reorder_level, "Low" if low else "Restocked"))
+            self.last_alert_id = aid
+        self.alerts_tree.delete(*self.alerts_tree.get_children()[ALERTS_SHOWN:])
 
     # --- Products Tab ---
     def create_products_tab(self):
-        self.products_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.products_frame, text='Products')
 
         # Form for adding a new product
         form_frame = ttk.LabelFrame(self.products_frame, text="Add/Edit Product", padding="15")
         form_frame.pack(fill='x', pady=10)
 
-        labels = ["SKU:", "Name:", "Price:", "Quantity:"]
+        labels = ["SKU:", "Name:", "Price:", "Quantity:", "Reorder Level:"]
         self.product_entries = {}
         for i, label_text in enumerate(labels):
             ttk.Label(form_frame, text=label_text).grid(row=i, column=0, padx=5, pady=5, sticky='w')
@@ -185,67 +489,79 @@ class InventoryApp:
         btn_frame = ttk.Frame(form_frame)
         btn_frame.grid(row=len(labels), column=0, columnspan=2, pady=10)
         ttk.Button(btn_frame, text="Add Product", command=self.add_product).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Set Reorder Level", command=self.set_reorder_level).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Clear Form", command=self.clear_product_form).pack(side='left', padx=5)
 
-        # Treeview to display products
-        tree_frame = ttk.Frame(self.products_frame)
-        tree_frame.pack(expand=True, fill='both', pady=10)
-        
-        self.product_tree = ttk.Treeview(tree_frame, columns=("SKU", "Name", "Price", "Quantity"), show='headings')
-        self.product_tree.heading("SKU", text="SKU")
-        self.product_tree.heading("Name", text="Name")
-        self.product_tree.heading("Price", text="Price")
-        self.product_tree.heading("Quantity", text="Quantity")
-        
-        # Scrollbar
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.product_tree.yview)
-        self.product_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side='right', fill='y')
-        self.product_tree.pack(expand=True, fill='both')
+        # Virtual list of products: only the visible rows are fetched and drawn,
+        # clicking a heading sorts in SQL
+        self.product_tree = VirtualTreeview(self.products_frame, self.db.products_query(),
+                                            columns=("SKU", "Name", "Price", "Quantity", "Reorder Level"),
+                                            formatter=lambda row: (row[0], row[1], f"${row[2]:.2f}", *row[3:]))
+        self.product_tree.pack(expand=True, fill='both', pady=10)
+        self.instrument_tree("products", self.product_tree)
+
+        # Delete and bulk CSV buttons
+        actions = ttk.Frame(self.products_frame)
+        actions.pack(pady=10)
+        ttk.Button(actions, text="Delete Selected Product", command=self.delete_product).pack(side='left', padx=5)
+        ttk.Button(actions, text="Import CSV...", command=self.import_products_csv).pack(side='left', padx=5)
+        ttk.Button(actions, text="Export CSV...", command=self.export_products_csv).pack(side='left', padx=5)
 
-        # Delete button
-        ttk.Button(self.products_frame, text="Delete Selected Product", command=self.delete_product).pack(pady=10)
+        self.load_products()
 
     def load_products(self):
-        for item in self.product_tree.get_children():
-            self.product_tree.delete(item)
-        
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT sku, name, price, quantity FROM products ORDER BY name")
-        for row in cursor.fetchall():
-            self.product_tree.insert("", "end", values=(row[0], row[1], f"${row[2]:.2f}", row[3]))
-        conn.close()
+        # Counting is the only O(table) step; pages are small indexed reads
+        self.run_in_background(self.products_frame, self.product_tree.query.count,
+                               on_done=self.product_tree.set_total, key="products")
 
     def add_product(self):
         sku = self.product_entries['sku'].get()
         name = self.product_entries['name'].get()
         price = self.product_entries['price'].get()
         quantity = self.product_entries['quantity'].get()
+        reorder_level = self.product_entries['reorder level'].get() or LOW_STOCK_THRESHOLD
 
         if not all([sku, name, price, quantity]):
-            messagebox.showerror("Error", "All fields are required.")
+            messagebox.showerror("Error", "SKU, Name, Price and Quantity are required.")
             return
 
         try:
             price = float(price)
             quantity = int(quantity)
+            reorder_level = int(reorder_level)
         except ValueError:
-            messagebox.showerror("Error", "Price and Quantity must be valid numbers.")
+            messagebox.showerror("Error", "Price, Quantity and Reorder Level must be valid numbers.")
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        try:
-            cursor.execute("INSERT INTO products (sku, name, price, quantity) VALUES (?, ?, ?, ?)", (sku, name, price, quantity))
-            conn.commit()
+        def added(_):
             messagebox.showinfo("Success", "Product added successfully.")
             self.clear_product_form()
-            self.refresh_all_data()
-        except sqlite3.IntegrityError:
-            messagebox.showerror("Error", f"Product with SKU '{sku}' already exists.")
-        finally:
-            conn.close()
+
+        def failed(error):
+            if isinstance(error, sqlite3.IntegrityError):
+                messagebox.showerror("Error", f"Product with SKU '{sku}' already exists.")
+            else:
+                self.show_background_error(error)
+
+        self.run_in_background(self.products_frame, self.db.add_product, sku, name, price, quantity, reorder_level,
+                               on_done=added, on_error=failed)
+
+    def set_reorder_level(self):
+        """Applies the form's reorder level to the selected product."""
+        selected_item = self.product_tree.focus()
+        if not selected_item:
+            messagebox.showerror("Error", "Please select a product to set the reorder level of.")
+            return
+        sku = selected_item  # The row's iid is the raw SKU; its values are converted by Tk ("00123" -> 123)
+        try:
+            level = int(self.product_entries['reorder level'].get())
+            if level < 0:
+                raise ValueError(level)
+        except ValueError:
+            messagebox.showerror("Error", "Reorder Level must be a whole number, zero or more.")
+            return
+        self.run_in_background(self.products_frame, self.db.set_reorder_level, sku, level,
+                               on_done=lambda _: self.status_var.set(f"Reorder level of {sku} set to {level}."))
 
     def delete_product(self):
         selected_item = self.product_tree.focus()
@@ -257,22 +573,48 @@ class InventoryApp:
         sku = product_details['values'][0]
 
         if messagebox.askyesno("Confirm", f"Are you sure you want to delete product with SKU {sku}?"):
-            conn = sqlite3.connect(DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM products WHERE sku = ?", (sku,))
-            conn.commit()
-            conn.close()
-            messagebox.showinfo("Success", "Product deleted.")
-            self.refresh_all_data()
+            self.run_in_background(self.products_frame, self.db.delete_product, sku,
+                                   on_done=lambda _: messagebox.showinfo("Success", "Product deleted."))
             
     def clear_product_form(self):
         for entry in self.product_entries.values():
             entry.delete(0, 'end')
 
+    def import_products_csv(self):
+        path = filedialog.askopenfilename(title="Import Products",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+
+        def done(report):
+            messagebox.showinfo("Import Complete", report.summary())
+
+        def failed(error):
+            if isinstance(error, (ValueError, OSError, UnicodeDecodeError)):
+                messagebox.showerror("Import Failed", str(error))
+            else:
+                self.show_background_error(error)
+
+        progress = lambda rows: self.show_progress(f"Importing products... {rows} rows")
+        self.run_in_background(self.products_frame, csvio.import_products, self.db, path,
+                               csvio.IMPORT_CHUNK_SIZE, progress, on_done=done, on_error=failed, key="import")
+
+    def export_products_csv(self):
+        self.export_csv(self.products_frame, csvio.export_products, "products.csv", "products")
+
+    def export_csv(self, frame, export, default_name, what):
+        path = filedialog.asksaveasfilename(title=f"Export {what.title()}", initialfile=default_name,
+                                            defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+        progress = lambda rows: self.show_progress(f"Exporting {what}... {rows} rows")
+        self.run_in_background(frame, export, self.db, path, progress,
+                               on_done=lambda rows: messagebox.showinfo("Export Complete",
+                                                                        f"Wrote {rows} rows to {path}."))
+
     # --- Billing Tab ---
     def create_billing_tab(self):
-        self.billing_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.billing_frame, text='Billing')
 
         main_pane = ttk.PanedWindow(self.billing_frame, orient='horizontal')
         main_pane.pack(expand=True, fill='both')
@@ -281,12 +623,32 @@ class InventoryApp:
         left_frame = ttk.Frame(main_pane)
         main_pane.add(left_frame, weight=2)
         
-        search_frame = ttk.LabelFrame(left_frame, text="Search Products", padding="10")
+        search_frame = ttk.LabelFrame(left_frame, text="Search or Scan Products", padding="10")
         search_frame.pack(fill='x', pady=5)
         self.search_var = tk.StringVar()
-        self.search_var.trace_add("write", self.search_products)
-        ttk.Entry(search_frame, textvariable=self.search_var, width=50).pack(fill='x')
+        self.search_after_id = None
+        self.search_generation = 0
+        self.search_var.trace_add("write", self.schedule_search)
+        self.search_entry = ttk.Entry(search_frame, textvariable=self.search_var, width=50)
+        self.search_entry.pack(fill='x')
+
+        # Scan mode: Enter adds the product whose SKU is in the box straight to
+        # the bill, so a keyboard-wedge scanner (or a typed SKU) needs no clicks
+        self.scan_mode = tk.BooleanVar(value=True)
+        self.scan_status = tk.StringVar(value="")
+        self.scan_burst = BurstDetector()
+        self.sku_cache = SkuCache(self.service)
+        self.scan_queue = ScanQueue()
+        scan_row = ttk.Frame(search_frame)
+        scan_row.pack(fill='x', pady=(5, 0))
+        ttk.Checkbutton(scan_row, text="Scan mode (Enter adds the SKU to the bill)",
+                        variable=self.scan_mode).pack(side='left')
+        ttk.Label(scan_row, textvariable=self.scan_status).pack(side='left', padx=10)
+        self.search_entry.bind("<Key>", self.scan_burst.key, add='+')
+        self.search_entry.bind("<Return>", self.on_search_return)
+        self.search_entry.bind("<KP_Enter>", self.on_search_return)
         
+        self.search_rows = {}  # SKU -> (sku, name, price, stock) of the rows on show
         self.search_results_tree = ttk.Treeview(left_frame, columns=("SKU", "Name", "Price", "Stock"), show='headings', height=10)
         self.search_results_tree.pack(expand=True, fill='both', pady=5)
         for col in ("SKU", "Name", "Price", "Stock"):
@@ -302,6 +664,8 @@ class InventoryApp:
         bill_frame = ttk.LabelFrame(right_frame, text="Bill Summary", padding="10")
         bill_frame.pack(expand=True, fill='both')
 
+        # The Treeview only renders self.bill; its item ids are the line SKUs
+        self.bill = Bill()
         self.bill_tree = ttk.Treeview(bill_frame, columns=("Name", "Qty", "Price", "Total"), show='headings')
         self.bill_tree.pack(expand=True, fill='both')
         for col in ("Name", "Qty", "Price", "Total"):
@@ -312,122 +676,214 @@ class InventoryApp:
 
         checkout_btn_frame = ttk.Frame(right_frame)
         checkout_btn_frame.pack(pady=5, fill='x')
-        ttk.Button(checkout_btn_frame, text="Checkout", command=self.checkout).pack(side='left', expand=True, fill='x', padx=5)
+        self.checkout_button = ttk.Button(checkout_btn_frame, text="Checkout", command=self.checkout)
+        self.checkout_button.pack(side='left', expand=True, fill='x', padx=5)
+        ttk.Button(checkout_btn_frame, text="Remove Line", command=self.remove_bill_line).pack(side='left', expand=True, fill='x', padx=5)
         ttk.Button(checkout_btn_frame, text="Clear Bill", command=self.clear_bill).pack(side='left', expand=True, fill='x', padx=5)
 
+        # Scans go wherever the focus is, so the till starts out (and ends up
+        # after each sale) with the cursor in the search box
+        self.search_entry.focus_set()
+
+    def schedule_search(self, *args):
+        """Debounces keystrokes: only the last one of a burst runs a query."""
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_generation += 1
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_products)
+
     def search_products(self, *args):
-        for item in self.search_results_tree.get_children():
-            self.search_results_tree.delete(item)
-        
-        search_term = self.search_var.get()
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT sku, name, price, quantity FROM products WHERE name LIKE ? OR sku LIKE ?", 
-                       (f'%{search_term}%', f'%{search_term}%'))
-        for row in cursor.fetchall():
-            self.search_results_tree.insert("", "end", values=row)
-        conn.close()
+        self.search_after_id = None
+        generation = self.search_generation
+
+        def show(rows):
+            if generation == self.search_generation:  # else a newer keystroke superseded it
+                self.show_search_results(rows)
+                if self.startup is not None:
+                    self.startup.finish("billing results shown", self.metrics)
+
+        # The "search" key cancels any query still running for an older keystroke
+        self.run_in_background(self.billing_frame, self.service.search_products, self.search_var.get(),
+                               on_done=show, key="search")
+
+    def show_search_results(self, rows):
+        """Updates the results tree in place, touching only rows that changed."""
+        tree = self.search_results_tree
+        self.search_rows = {str(row[0]): row for row in rows}
+        self.sku_cache.remember(rows)
+        wanted = self.search_rows
+        stale = [iid for iid in tree.get_children() if iid not in wanted]
+        if stale:
+            tree.delete(*stale)
+        for index, row in enumerate(rows):
+            iid = str(row[0])
+            if tree.exists(iid):
+                tree.item(iid, values=row)
+                tree.move(iid, "", index)
+            else:
+                tree.insert("", index, iid=iid, values=row)
 
     def add_to_bill(self):
         selected_item = self.search_results_tree.focus()
         if not selected_item: return
 
-        # Original line that retrieves string values from the Treeview
-        sku, name, price_str, stock_str = self.search_results_tree.item(selected_item)['values']
+        # The search row holds the product's typed values (the item id is its SKU)
+        row = self.search_rows.get(selected_item)
+        if row is None: return
+        self.add_product_to_bill(row)
 
-        # --- FIX HERE ---
-        # Convert the retrieved strings to their proper numeric types (float and int)
-        try:
-            price = float(price_str)
-            stock = int(stock_str)
-        except ValueError:
-            messagebox.showerror("Error", "Invalid price or stock value in the product list.")
+    def on_search_return(self, event=None):
+        """Enter in the search box: in scan mode, adds the product with that exact SKU."""
+        if not self.scan_mode.get():
             return
-    
-        # Check if item already in bill to update quantity
-        for item in self.bill_tree.get_children():
-            if self.bill_tree.item(item)['values'][0] == name:
-                qty = int(self.bill_tree.item(item)['values'][1]) + 1
-            
-                # Now we can safely compare two integers
-                if qty > stock:
-                    messagebox.showwarning("Stock Alert", f"Cannot add more '{name}'. Only {stock} available in stock.")
-                    return
-
-                self.bill_tree.item(item, values=(name, qty, f"${price:.2f}", f"${price * qty:.2f}"))
-                self.update_bill_total()
+        text = self.search_var.get()
+        scanned = self.scan_burst.is_burst(text)
+        self.scan_burst.reset()
+        code = text.strip()
+        if not code:
+            return "break"
+        # Outcomes are applied in scan order, even when an earlier scan's lookup is still running
+        ticket = self.scan_queue.add()
+
+        def handle(outcome):
+            for apply in self.scan_queue.resolve(ticket, outcome):
+                apply()
+
+        # A dict hit: no search query, no results redraw
+        row = self.sku_cache.get(code)
+        if row is not None:
+            self.search_var.set("")
+            handle(lambda: self.add_product_to_bill(row, scanned=True))
+            return "break"
+
+        # A miss is one primary-key read (an HTTP request on a remote till), done
+        # off the Tk thread so the next scan's keystrokes are never held up.
+        # A scanned code is cleared at once, as the next scan may follow it.
+        if scanned:
+            self.search_var.set("")
+
+        def found(row):
+            if row is None:
+                if scanned:
+                    handle(lambda: self.scan_failed(f"Unknown code: {code}"))
+                else:
+                    handle(lambda: None)  # Typed text that is not a SKU stays a search
                 return
-            
-        # Now we can safely compare two integers
-        if stock < 1:
-            messagebox.showwarning("Stock Alert", f"'{name}' is out of stock.")
-            return
+            self.sku_cache.remember([row])
+
+            def add():
+                if not scanned and self.search_var.get() == text:
+                    self.search_var.set("")
+                self.add_product_to_bill(row, scanned=True)
+            handle(add)
+
+        def failed(error):
+            if scanned:
+                handle(lambda: self.scan_failed(f"Lookup of {code} failed: {error}"))
+            else:
+                handle(lambda: self.show_background_error(error))
+
+        self.run_in_background(self.billing_frame, self.sku_cache.fetch, code, on_done=found, on_error=failed)
+        return "break"
+
+    def scan_failed(self, message):
+        self.root.bell()
+        self.scan_status.set(message)
 
-        # Add new item to bill (price is now a float and can be formatted)
-        self.bill_tree.insert("", "end", values=(name, 1, f"${price:.2f}", f"${price:.2f}"))
+    def add_product_to_bill(self, row, scanned=False):
+        """Adds one unit of a (sku, name, price, stock) row, checking the stock.
+
+        Scanned items report problems with a bell and the status line instead
+        of a dialog, which would swallow the keystrokes of the next scans.
+        """
+        sku, name, price, stock = row
+        try:
+            line = self.bill.add(sku, name, to_cents(price), stock)
+        except OutOfStock:
+            if stock < 1:
+                message = f"'{name}' is out of stock."
+            else:
+                message = f"Cannot add more '{name}'. Only {stock} available in stock."
+            if scanned:
+                self.root.bell()
+                self.scan_status.set(message)
+            else:
+                messagebox.showwarning("Stock Alert", message)
+            return
+        self.show_bill_line(line)
+        if scanned:
+            self.bill_tree.see(sku)
+            self.scan_status.set(f"Added {name} (x{line.qty})")
+
+    def show_bill_line(self, line):
+        """Renders one bill line (and the total) after it changed: O(1)."""
+        values = (line.name, line.qty, format_cents(line.unit_cents), format_cents(line.total_cents))
+        if self.bill_tree.exists(line.sku):
+            self.bill_tree.item(line.sku, values=values)
+        else:
+            self.bill_tree.insert("", "end", iid=line.sku, values=values)
         self.update_bill_total()
 
     def update_bill_total(self):
-        total = 0.0
-        for item in self.bill_tree.get_children():
-            total += float(self.bill_tree.item(item)['values'][3].replace('$', ''))
-        self.total_var.set(f"Total: ${total:.2f}")
+        self.total_var.set(f"Total: {format_cents(self.bill.total_cents)}")
+
+    def remove_bill_line(self):
+        sku = self.bill_tree.focus()
+        if not sku: return
+        self.bill.remove(sku)
+        self.bill_tree.delete(sku)
+        self.update_bill_total()
 
     def clear_bill(self):
-        for item in self.bill_tree.get_children():
-            self.bill_tree.delete(item)
+        self.bill.clear()
+        self.bill_tree.delete(*self.bill_tree.get_children())
         self.update_bill_total()
 
     def checkout(self):
-        if not self.bill_tree.get_children():
+        if not self.bill:
             messagebox.showerror("Error", "The bill is empty.")
             return
-    
-        total = float(self.total_var.get().replace('Total: $', ''))
-        items_sold = []
-    
-        # Use a 'with' statement for safer database connection handling
-        with sqlite3.connect(DB_FILE) as conn:
-            cursor = conn.cursor()
-
-            # Before committing, check if there is enough stock for the entire transaction
-            for item in self.bill_tree.get_children():
-                name, qty_str, _, _ = self.bill_tree.item(item)['values']
-                qty = int(qty_str) # Convert quantity to int for checking
-            
-                cursor.execute("SELECT quantity FROM products WHERE name = ?", (name,))
-                stock = cursor.fetchone()[0]
 
-                if qty > stock:
-                    messagebox.showerror("Checkout Error", f"Not enough stock for '{name}'. Required: {qty}, Available: {stock}.")
-                    return # Stop the checkout process
-
-            # If all stock checks pass, proceed with the transaction
-            for item in self.bill_tree.get_children():
-                name, qty_str, _, _ = self.bill_tree.item(item)['values']
-            
-                # --- FIX HERE ---
-                # Convert the quantity string to an integer for the database operation
-                qty = int(qty_str)
-
-                items_sold.append({"name": name, "quantity": qty})
-                cursor.execute("UPDATE products SET quantity = quantity - ? WHERE name = ?", (qty, name))
-        
-            # Record transaction
-            created_at = datetime.datetime.now().isoformat()
-            cursor.execute("INSERT INTO transactions (total, created_at, items) VALUES (?, ?, ?)",
-                        (total, created_at, json.dumps(items_sold)))
-        
-            # No need to call conn.commit() explicitly when using a 'with' statement
-    
-        messagebox.showinfo("Success", "Checkout complete. Transaction recorded.")
-        self.clear_bill()
-        self.refresh_all_data()
+        total = self.bill.total_cents / 100
+        items_sold = self.bill.sale_lines()
+
+        def finished(result):
+            # The receipt is printed from TransactionRecorded (see subscribe_to_changes)
+            self.checkout_button.state(['!disabled'])
+            # A status line, not a dialog: the next customer can be scanned right away
+            self.scan_status.set(f"Checkout complete: {format_cents(to_cents(total))} recorded.")
+            # Only what was sold comes off: items scanned while the sale was being written stay
+            for sku in self.bill.deduct(items_sold):
+                line = self.bill.get(sku)
+                if line is None:
+                    self.bill_tree.delete(sku)
+                else:
+                    self.show_bill_line(line)
+            self.update_bill_total()
+            self.search_entry.focus_set()
+
+        def failed(error):
+            self.checkout_button.state(['!disabled'])
+            if isinstance(error, InsufficientStock):
+                for sku, _, _, available in error.shortfalls:
+                    self.sku_cache.update_stock(sku, available)  # Sold elsewhere since it was cached
+                lines = "\n".join(f"'{name}': Required: {qty}, Available: {available}."
+                                  for _, name, qty, available in error.shortfalls)
+                messagebox.showerror("Checkout Error", f"Not enough stock for:\n{lines}")
+            else:
+                self.show_background_error(error)
+
+        # The button stays disabled until the sale is written, so it cannot be submitted twice.
+        # The stock check and the decrement are one atomic step inside Database.checkout;
+        # with the sales journal, the sale is durable once journaled and applied in the background.
+        self.checkout_button.state(['disabled'])
+        self.run_in_background(self.billing_frame, self.service.checkout, items_sold, total,
+                               on_done=finished, on_error=failed)
         # --- Analytics Tab ---
     def create_analytics_tab(self):
-        self.analytics_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.analytics_frame, text='Analytics')
-        
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         controls_frame = ttk.Frame(self.analytics_frame)
         controls_frame.pack(pady=10, fill='x')
         
@@ -435,60 +891,97 @@ class InventoryApp:
         ttk.Button(controls_frame, text="Week", command=lambda: self.update_analytics_chart('week')).pack(side='left', padx=5)
         ttk.Button(controls_frame, text="Month", command=lambda: self.update_analytics_chart('month')).pack(side='left', padx=5)
         ttk.Button(controls_frame, text="Year", command=lambda: self.update_analytics_chart('year')).pack(side='left', padx=5)
+        ttk.Button(controls_frame, text="All Time", command=lambda: self.update_analytics_chart('all')).pack(side='left', padx=5)
+
+        # Custom range: two YYYY-MM-DD dates
+        today = datetime.date.today()
+        ttk.Label(controls_frame, text="From:").pack(side='left', padx=(20, 5))
+        self.custom_from = ttk.Entry(controls_frame, width=11)
+        self.custom_from.insert(0, (today - datetime.timedelta(days=90)).isoformat())
+        self.custom_from.pack(side='left')
+        ttk.Label(controls_frame, text="To:").pack(side='left', padx=5)
+        self.custom_to = ttk.Entry(controls_frame, width=11)
+        self.custom_to.insert(0, today.isoformat())
+        self.custom_to.pack(side='left')
+        ttk.Button(controls_frame, text="Show", command=self.apply_custom_range).pack(side='left', padx=5)
         
         self.chart_frame = ttk.Frame(self.analytics_frame)
         self.chart_frame.pack(expand=True, fill='both')
         
         self.fig = Figure(figsize=(10, 6), dpi=100)
-        self.ax = self.fig.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_frame)
         self.canvas.get_tk_widget().pack(expand=True, fill='both')
+        self.revenue_chart = RevenueChart(self.fig, self.canvas)
+        self.chart_series = SeriesCache(self.db)
+        self.analytics_custom = None
+
+        self.update_analytics_chart('month') # Default to month view
 
     def update_analytics_chart(self, time_range):
-        self.ax.clear()
+        self.analytics_range = time_range
+        start, end = self.analytics_custom if time_range == 'custom' else (None, None)
+        # Cached series come back after a version check, without querying or redrawing
+        self.run_in_background(self.analytics_frame, self.chart_series.get, time_range, start, end,
+                               on_done=self.draw_analytics_chart, key="analytics")
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        
-        end_date = datetime.date.today()
-        if time_range == 'week':
-            start_date = end_date - datetime.timedelta(days=7)
-        elif time_range == 'month':
-            start_date = end_date - datetime.timedelta(days=30)
-        elif time_range == 'year':
-            start_date = end_date - datetime.timedelta(days=365)
-        
-        cursor.execute("""
-            SELECT DATE(created_at), SUM(total)
-            FROM transactions
-            WHERE DATE(created_at) BETWEEN ? AND ?
-            GROUP BY DATE(created_at)
-            ORDER BY DATE(created_at)
-        """, (start_date.isoformat(), end_date.isoformat()))
-        
-        data = cursor.fetchall()
-        conn.close()
-        
-        if data:
-            dates = [datetime.datetime.strptime(row[0], '%Y-%m-%d').date() for row in data]
-            revenues = [row[1] for row in data]
-            
-            self.ax.plot(dates, revenues, marker='o', linestyle='-', color='b')
-            self.ax.set_title(f"Revenue Over Last {time_range.capitalize()}", fontsize=16)
-            self.ax.set_ylabel("Revenue ($)", fontsize=12)
-            self.ax.grid(True)
-            self.fig.autofmt_xdate()
-        else:
-            self.ax.text(0.5, 0.5, "No sales data available for this period.",
-                         horizontalalignment='center', verticalalignment='center',
-                         transform=self.ax.transAxes, fontsize=14)
-        
-        self.canvas.draw()
+    def apply_custom_range(self):
+        try:
+            start = datetime.date.fromisoformat(self.custom_from.get().strip())
+            end = datetime.date.fromisoformat(self.custom_to.get().strip())
+        except ValueError:
+            messagebox.showerror("Error", "Dates must be in YYYY-MM-DD format.")
+            return
+        if start > end:
+            messagebox.showerror("Error", "The start date must not be after the end date.")
+            return
+        self.analytics_custom = (start, end)
+        self.update_analytics_chart('custom')
+
+    def draw_analytics_chart(self, series):
+        self.revenue_chart.show(series)
+
+    # --- Reorder Tab ---
+    def create_reorder_tab(self):
+        controls = ttk.Frame(self.reorder_frame)
+        controls.pack(fill='x', pady=5)
+        ttk.Button(controls, text="Refresh", command=self.load_reorder).pack(side='left', padx=5)
+        self.reorder_summary = tk.StringVar(value="")
+        ttk.Label(controls, textvariable=self.reorder_summary).pack(side='left', padx=10)
+
+        # Products due for reordering, the soonest to run out first
+        columns = ("SKU", "Name", "Stock", "Sold / Day", "Days Left", "Reorder Point", "Order Qty")
+        tree_frame = ttk.Frame(self.reorder_frame)
+        tree_frame.pack(expand=True, fill='both', pady=10)
+        self.reorder_tree = ttk.Treeview(tree_frame, columns=columns, show='headings')
+        for col in columns:
+            self.reorder_tree.heading(col, text=col)
+            self.reorder_tree.column(col, width=400 if col == "Name" else 100, stretch=(col == "Name"))
+        scrollbar = ttk.Scrollbar(tree_frame, command=self.reorder_tree.yview)
+        self.reorder_tree.config(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side='right', fill='y')
+        self.reorder_tree.pack(expand=True, fill='both')
+
+        self.load_reorder()
+
+    def load_reorder(self):
+        def compute():
+            forecast = self.forecaster.get()
+            return len(forecast), int((forecast.order_qty > 0).sum()), forecast.reorder_list(REORDER_LIMIT)
+
+        self.run_in_background(self.reorder_frame, compute, on_done=lambda result: self.show_reorder(*result),
+                               key="reorder")
+
+    def show_reorder(self, product_count, due_count, rows):
+        self.reorder_tree.delete(*self.reorder_tree.get_children())
+        for sku, name, quantity, velocity, days_left, reorder_point, order_qty in rows:
+            self.reorder_tree.insert("", "end", iid=sku, values=(sku, name, quantity, f"{velocity:.2f}",
+                                                                 f"{days_left:.1f}", reorder_point, order_qty))
+        shown = f", showing the first {len(rows)}" if len(rows) < due_count else ""
+        self.reorder_summary.set(f"{due_count} of {product_count} products due for reordering "
+                                 f"(last {WINDOW_DAYS} days of sales{shown}).")
 
     # --- AI Assistant Tab ---
     def create_ai_assistant_tab(self):
-        self.ai_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.ai_frame, text='AI Assistant')
 
         chat_frame = ttk.Frame(self.ai_frame)
         chat_frame.pack(expand=True, fill='both', pady=5)
@@ -510,9 +1003,16 @@ class InventoryApp:
         self.ai_input.bind("<Return>", self.send_ai_message)
         ttk.Button(input_frame, text="Send", command=self.send_ai_message).pack(side='right')
 
+        # Warm up the HTTP client off the Tk thread while the user types
+        self.assistant = None
+        self.executor.submit(importlib.import_module, "requests")
+
     def add_message_to_chat(self, sender, message):
+        self.append_to_chat(f"{sender}: {message}\n\n")
+
+    def append_to_chat(self, text):
         self.chat_history.config(state='normal')
-        self.chat_history.insert('end', f"{sender}: {message}\n\n")
+        self.chat_history.insert('end', text)
         self.chat_history.config(state='disabled')
         self.chat_history.see('end')
 
@@ -534,104 +1034,101 @@ class InventoryApp:
             self.add_message_to_chat("AI Assistant", "Error: OpenRouter API Key is not configured in the code.")
             return
 
-        # Prepare data for the AI prompt
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT name, quantity FROM products ORDER BY quantity ASC LIMIT 10")
-        low_stock_products = cursor.fetchall()
-        cursor.execute("SELECT items FROM transactions ORDER BY created_at DESC LIMIT 50")
-        recent_transactions = cursor.fetchall()
-        conn.close()
-
-        # Process sales data to find top sellers
-        sales_count = {}
-        for trans in recent_transactions:
-            items = json.loads(trans[0])
-            for item in items:
-                sales_count[item['name']] = sales_count.get(item['name'], 0) + item['quantity']
-        
-        top_sellers = sorted(sales_count.items(), key=lambda x: x[1], reverse=True)[:10]
-
-        # Build the system prompt
-        system_prompt = f"""You are an expert inventory management AI assistant. Your goal is to provide clear, actionable advice to a shop owner. Analyze the following data and answer the user's question.
-        DO NOT create heandings only do simple formating.
-        **Inventory & Sales Data Summary:**
-        - Low Stock Products (Top 10): {low_stock_products}
-        - Top Selling Products (from recent transactions): {top_sellers}
+        if self.assistant is None:
+            self.assistant = ai.Assistant(self.db, API_KEY, MODEL_NAME, url=AI_URL,
+                                          timeout=(ai.CONNECT_TIMEOUT, AI_TIMEOUT), forecaster=self.forecaster)
 
-        Based on this data, provide a concise recommendation. Focus on what to restock, what might be overstocked, and potential sales strategies.
-        """
+        def failed(error):
+            # requests' exceptions derive from OSError, so this needs no import of requests
+            if isinstance(error, (OSError, TimeoutError)):
+                self.append_to_chat(f"Error connecting to AI service: {error}\n\n")
+            else:
+                self.append_to_chat(f"An unexpected error occurred: {error}\n\n")
 
-        try:
-            response = requests.post(
-                url="https://openrouter.ai/api/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {API_KEY}",
-                    "Content-Type": "application/json"
-                },
-                data=json.dumps({
-                    "model": MODEL_NAME,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_message}
-                    ]
-                })
-            )
-            response.raise_for_status() # Raise an exception for bad status codes
-            ai_response = response.json()['choices'][0]['message']['content']
-            self.add_message_to_chat("AI Assistant", ai_response.strip())
-
-        except requests.exceptions.RequestException as e:
-            self.add_message_to_chat("AI Assistant", f"Error connecting to AI service: {e}")
-        except Exception as e:
-            self.add_message_to_chat("AI Assistant", f"An unexpected error occurred: {e}")
+        # The answer streams into the chat as it is generated; tokens reach the
+        # Tk thread through the executor's queue, ahead of the completion
+        self.append_to_chat("AI Assistant: ")
+        on_token = lambda text: self.executor.call_in_main(self.append_to_chat, text)
+        self.run_in_background(self.ai_frame, self.assistant.ask, user_message, on_token,
+                               on_done=lambda _: self.append_to_chat("\n\n"), on_error=failed)
 
     # --- Transactions Tab ---
     def create_transactions_tab(self):
-        self.transactions_frame = ttk.Frame(self.notebook, padding="20")
-        self.notebook.add(self.transactions_frame, text='Transactions')
         controls = ttk.Frame(self.transactions_frame)
 
         controls.pack(fill='x', pady=5)
         ttk.Button(controls, text="Refresh", command=self.load_transactions).pack(side='left', padx=5)
         ttk.Button(controls, text="View Details", command=self.view_transaction_details).pack(side='left', padx=5)
         ttk.Button(controls, text="Delete Selected", command=self.delete_transaction).pack(side='left', padx=5)
-
-        tree_frame = ttk.Frame(self.transactions_frame)
-        tree_frame.pack(expand=True, fill='both', pady=10)
-
-        # Columns: ID, Total, Created At, Items Count
-        self.trans_tree = ttk.Treeview(tree_frame, columns=("ID", "Total", "Created At", "Items Count"), show='headings')
-        self.trans_tree.heading("ID", text="ID")
-        self.trans_tree.heading("Total", text="Total")
-        self.trans_tree.heading("Created At", text="Created At")
-        self.trans_tree.heading("Items Count", text="Items Count")
-        self.trans_tree.pack(expand=True, fill='both', side='left')
-
-        scrollbar = ttk.Scrollbar(tree_frame, orient="vertical", command=self.trans_tree.yview)
-        self.trans_tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side='right', fill='y')
+        ttk.Button(controls, text="Export CSV...", command=self.export_transactions_csv).pack(side='left', padx=5)
+        ttk.Button(controls, text="Print Receipt", command=self.print_receipt).pack(side='left', padx=5)
+        ttk.Button(controls, text="Export Report...", command=self.export_report).pack(side='left', padx=5)
+        ttk.Button(controls, text="Archive Old Years...", command=self.archive_transactions).pack(side='left', padx=5)
+        # Archived years are only attached and read when asked for
+        self.include_archived = tk.BooleanVar(value=False)
+        ttk.Checkbutton(controls, text="Include archived", variable=self.include_archived,
+                        command=self.toggle_archived_transactions).pack(side='left', padx=15)
+
+        # Columns: ID, Total, Created At, Items Count (virtual list, newest first)
+        self.trans_tree = VirtualTreeview(self.transactions_frame, self.db.transactions_query(),
+                                          columns=("ID", "Total", "Created At", "Items Count"),
+                                          formatter=lambda row: (row[0], f"${row[1]:.2f}", row[2], row[3]))
+        self.trans_tree.pack(expand=True, fill='both', pady=10)
+        self.instrument_tree("transactions", self.trans_tree)
 
         # Initial load
         self.load_transactions()
 
     def load_transactions(self):
-        # Clear existing rows
-        for item in self.trans_tree.get_children():
-            self.trans_tree.delete(item)
-
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, total, created_at, items FROM transactions ORDER BY created_at DESC")
-        for row in cursor.fetchall():
-            tid, total, created_at, items_json = row
-            try:
-                items = json.loads(items_json)
-                items_count = sum(it.get("quantity", 0) for it in items)
-            except Exception:
-                items_count = ""
-            self.trans_tree.insert("", "end", values=(tid, f"${total:.2f}", created_at, items_count))
-        conn.close()
+        self.run_in_background(self.transactions_frame, self.trans_tree.query.count,
+                               on_done=self.trans_tree.set_total, key="transactions")
+
+    def toggle_archived_transactions(self):
+        query = self.db.transactions_query(include_archived=self.include_archived.get())
+        query.set_sort(self.trans_tree.query.sort, self.trans_tree.query.descending)
+        self.trans_tree.query = query
+        self.trans_tree.top = 0
+        self.load_transactions()
+
+    def archive_transactions(self):
+        years = archive.closed_years(self.db)
+        if not years:
+            messagebox.showinfo("Archive", f"There are no closed years to archive (a year can be archived "
+                                           f"{archive.CLOSED_AFTER_DAYS} days after it ends).")
+            return
+        names = ", ".join(map(str, years))
+        if not messagebox.askyesno("Confirm", f"Move the sales of {names} into read-only archive files? "
+                                              "They stay visible with 'Include archived'."):
+            return
+
+        def done(archived):
+            moved = sum(count for _, count in archived)
+            messagebox.showinfo("Archive Complete", f"Archived {moved} sales from {names}.")
+
+        self.run_in_background(self.transactions_frame, archive.archive_closed_years, self.db, on_done=done)
+
+    def export_transactions_csv(self):
+        self.export_csv(self.transactions_frame, csvio.export_transactions, "transactions.csv", "transactions")
+
+    def export_report(self):
+        """Writes the daily, monthly, annual and per-product reports (CSV and HTML) to a chosen folder."""
+        dest = filedialog.askdirectory(title="Export Report To")
+        if not dest:
+            return
+
+        def done(written):
+            names = "\n".join(os.path.basename(path) for path, _ in written)
+            messagebox.showinfo("Report Complete", f"Wrote {len(written)} files to {dest}:\n{names}")
+
+        def failed(error):
+            if isinstance(error, OSError):
+                messagebox.showerror("Report Failed", str(error))
+            else:
+                self.show_background_error(error)
+
+        progress = lambda done, total: self.show_progress(f"Building report... {done}/{total} ranges")
+        self.run_in_background(self.transactions_frame, reports.generate, self.db, dest, reports.REPORT_KINDS,
+                               reports.FORMATS, None, None, None, progress, on_done=done, on_error=failed)
 
     def view_transaction_details(self):
         sel = self.trans_tree.focus()
@@ -640,27 +1137,36 @@ class InventoryApp:
             return
 
         tid = self.trans_tree.item(sel)['values'][0]
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("SELECT total, created_at, items FROM transactions WHERE id = ?", (tid,))
-        row = cursor.fetchone()
-        conn.close()
+        self.run_in_background(self.transactions_frame, self.db.transaction_details, tid,
+                               on_done=lambda details: self.show_transaction_details(tid, *details))
 
+    def print_receipt(self):
+        """Reprints the selected sale's receipt through the receipt spool."""
+        sel = self.trans_tree.focus()
+        if not sel:
+            messagebox.showerror("Error", "Please select a transaction to print.")
+            return
+        if self.receipt_spool is None:
+            messagebox.showinfo("Receipts Off", f"Receipts are turned off ({receipts.PRINTER_ENV}=off).")
+            return
+
+        def spool(details):
+            (total, created_at), items = details
+            self.receipt_spool.submit(receipts.Receipt(tid, created_at, tuple(items), total))
+            self.status_var.set(f"Receipt for transaction {tid} queued for printing.")
+
+        tid = self.trans_tree.item(sel)['values'][0]
+        self.run_in_background(self.transactions_frame, self.db.transaction_details, tid, on_done=spool)
+
+    def show_transaction_details(self, tid, row, items):
         if not row:
             messagebox.showerror("Error", "Transaction not found.")
             return
 
-        total, created_at, items_json = row
-        try:
-            items = json.loads(items_json)
-        except Exception:
-            items = []
-
+        total, created_at = row
         details = f"Transaction ID: {tid}\nTotal: ${total:.2f}\nDate: {created_at}\n\nItems:\n"
-        for it in items:
-            name = it.get("name", "Unknown")
-            qty = it.get("quantity", 0)
-            details += f"- {name}  x{qty}\n"
+        for name, qty, unit_price in items:
+            details += f"- {name}  x{qty}  @ ${unit_price:.2f}\n"
 
         # show in a simple messagebox (could be replaced with a larger Toplevel if desired)
         messagebox.showinfo("Transaction Details", details)
@@ -675,20 +1181,116 @@ class InventoryApp:
         if not messagebox.askyesno("Confirm", f"Delete transaction {tid}? This will not modify product stock."):
             return
 
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM transactions WHERE id = ?", (tid,))
-        conn.commit()
-        conn.close()
+        self.run_in_background(self.transactions_frame, self.db.delete_transaction, tid,
+                               on_done=lambda _: messagebox.showinfo("Deleted", f"Transaction {tid} deleted."))
+    # --- Diagnostics Tab ---
+    def create_diagnostics_tab(self):
+
+        controls = ttk.Frame(self.diagnostics_frame)
+        controls.pack(fill='x', pady=5)
+        ttk.Button(controls, text="Refresh", command=self.show_diagnostics).pack(side='left', padx=5)
+        ttk.Button(controls, text="Reset", command=self.reset_diagnostics).pack(side='left', padx=5)
+        ttk.Button(controls, text="Export JSON...", command=self.export_diagnostics).pack(side='left', padx=5)
+
+        pane = ttk.PanedWindow(self.diagnostics_frame, orient='vertical')
+        pane.pack(expand=True, fill='both', pady=10)
+
+        # Latency per SQL statement, UI handler and background task, slowest p95 first
+        columns = ("Category", "Name", "Count", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)")
+        self.timings_tree = ttk.Treeview(pane, columns=columns, show='headings')
+        for col in columns:
+            self.timings_tree.heading(col, text=col)
+            self.timings_tree.column(col, width=500 if col == "Name" else 80, stretch=(col == "Name"))
+        pane.add(self.timings_tree, weight=3)
+
+        slow_frame = ttk.LabelFrame(pane, text="Slow Queries (with query plans)", padding="5")
+        self.slow_query_text = tk.Text(slow_frame, wrap='none', height=10, font=('Courier', 10), state='disabled')
+        self.slow_query_text.pack(expand=True, fill='both')
+        pane.add(slow_frame, weight=1)
+
+        self.show_diagnostics()
+
+    def instrument_tree(self, name, tree):
+        """With diagnostics on, times a virtual list's redraws as Treeview work."""
+        if self.metrics is not None:
+            tree._render = self.metrics.wrap(tree._render, "ui", f"{name} tree render")
+
+    def show_diagnostics(self):
+        snapshot = self.metrics.snapshot()
+        self.timings_tree.delete(*self.timings_tree.get_children())
+        for t in snapshot["timings"]:
+            self.timings_tree.insert("", "end", values=(t["category"], t["name"], t["count"], t["p50_ms"],
+                                                        t["p95_ms"], t["p99_ms"], t["max_ms"]))
+
+        self.slow_query_text.config(state='normal')
+        self.slow_query_text.delete('1.0', 'end')
+        for entry in reversed(snapshot["slow_queries"]):
+            self.slow_query_text.insert('end', f"{entry['at']}  {entry['ms']} ms  [{entry['thread']}]\n"
+                                               f"{entry['sql']}\n{entry['plan']}\n\n")
+        self.slow_query_text.config(state='disabled')
+
+    def reset_diagnostics(self):
+        self.metrics.reset()
+        self.show_diagnostics()
+
+    def export_diagnostics(self):
+        path = filedialog.asksaveasfilename(title="Export Diagnostics", initialfile="diagnostics.json",
+                                            defaultextension=".json",
+                                            filetypes=[("JSON files", "*.json"), ("All files", "*.*")])
+        if path:
+            self.metrics.export_json(path)
+            messagebox.showinfo("Export Complete", f"Diagnostics written to {path}.")
+
 
-        messagebox.showinfo("Deleted", f"Transaction {tid} deleted.")
-        self.load_transactions()
 # --- 3. MAIN EXECUTION ---
 # This block runs when the script is executed.
 if __name__ == "__main__":
-    setup_database()  # Ensure the database and tables exist
-    
+    multiprocessing.freeze_support()  # A frozen build's report workers start here; this runs them instead of the app
+    diagnostics = "--diagnostics" in sys.argv[1:] or os.environ.get(DIAGNOSTICS_ENV) == "1"
+    metrics = Metrics(slow_log_path=SLOW_QUERY_LOG) if diagnostics else None
+    startup = StartupTimer(STARTED, STARTUP_BUDGET_MS, echo=diagnostics or "--startup-report" in sys.argv[1:])
+    startup.mark("imports")
+
+    server_url = os.environ.get(SERVER_ENV)
+    if "--server" in sys.argv[1:]:
+        server_url = sys.argv[sys.argv.index("--server") + 1]
+    if server_url:
+        db = None
+        service = StockClient(server_url, token=os.environ.get(TOKEN_ENV))
+    else:
+        db = Database(DB_FILE, metrics=metrics)
+        db.setup()  # Ensure the database and tables exist
+        # A stopped journal also fails the next checkout; its unapplied sales are replayed at the next start
+        journal = SalesJournal(db, on_error=lambda e: app.show_progress(f"Sales journal error: {e}"))
+        try:
+            journal.start()  # Applies sales journaled before a crash, so every tab loads them
+        except JournalInUse:
+            journal = None  # Another till on this database owns it; check out directly (see Database.checkout)
+        service = StockService(db, journal)
+    startup.mark("database ready")
+
+    # Receipts are rendered and printed on their own thread (see receipts.py)
+    receipt_spool = receipts.from_env(
+        on_error=lambda name, e, retry_in: app.show_progress(
+            f"Receipt {name} not printed ({e}); " + (f"retrying in {retry_in}s." if retry_in is not None
+                                                     else f"moved to {receipts.SPOOL_DIR}/{receipts.FAILED_DIR}.")))
+
     root = tk.Tk()
-    app = InventoryApp(root)
+    app = InventoryApp(root, db, metrics, startup, service, receipt_spool)
+    if receipt_spool is not None:
+        receipt_spool.start()  # Also prints receipts left in the spool last time
+
+    # Online snapshots of the database every few hours, into backups/ (see backup.py)
+    backups = None
+    if db is not None:
+        backups = BackupScheduler(db, on_done=lambda path: app.show_progress(f"Backup saved: {os.path.basename(path)}"),
+                                  on_error=lambda e: app.show_progress(f"Backup failed: {e}"))
+        backups.start()
 
     root.mainloop()
+    if receipt_spool is not None:
+        receipt_spool.stop()
+    if backups is not None:
+        backups.stop()
+    if db is not None:
+        db.close()
@@ -0,0 +1,150 @@
+import datetime
+import os
+
+from events import TransactionsArchived
+
+# --- TRANSACTION ARCHIVING ---
+# Moves closed years of sales out of inventory.db into transactions_YYYY.db
+# files next to it, so the hot file (and every backup of it) only carries
+# recent history. Archived sales keep their ids and stay readable: the
+# Transactions tab and the exports ATTACH the files read-only on demand and
+# query through the all_transactions views (see Database.archive_conn). The
+# Dashboard counters and the Analytics rollup are not affected, since both
+# already count archived years (see setup_archives).
+#
+#     python manage.py archive             # every closed year
+#     python manage.py archive --year 2023
+
+ARCHIVE_FILE = "transactions_{year}.db"
+CLOSED_AFTER_DAYS = 90  # a year can be archived once it ended this many days ago
+
+# Schema of an archive file: the two sales tables, without the triggers and
+# AUTOINCREMENT bookkeeping of the hot file ('{schema}' is the attach name)
+ARCHIVE_TABLES = """
+    CREATE TABLE IF NOT EXISTS {schema}.transactions (
+        id INTEGER PRIMARY KEY,
+        total REAL NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS {schema}.transaction_items (
+        id INTEGER PRIMARY KEY,
+        transaction_id INTEGER NOT NULL,
+        sku TEXT,
+        name TEXT NOT NULL,
+        qty INTEGER NOT NULL,
+        unit_price REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS {schema}.idx_transaction_items_tid ON transaction_items(transaction_id);
+    CREATE INDEX IF NOT EXISTS {schema}.idx_transactions_created_at ON transactions(created_at);
+"""
+
+# (count, revenue, first id, last id) of the sales in one year of a schema
+YEAR_SUMMARY = """
+    SELECT COUNT(*), COALESCE(SUM(total), 0.0), MIN(id), MAX(id)
+    FROM {schema}.transactions WHERE created_at >= ? AND created_at < ?
+"""
+
+
+def year_bounds(year):
+    """created_at bounds [start, end) of a calendar year, as ISO strings."""
+    return datetime.date(year, 1, 1).isoformat(), datetime.date(year + 1, 1, 1).isoformat()
+
+
+def is_closed(year, today=None):
+    today = today or datetime.date.today()
+    return today - datetime.date(year, 12, 31) >= datetime.timedelta(days=CLOSED_AFTER_DAYS)
+
+
+def closed_years(db, today=None):
+    """Years that still have sales in the hot file and are closed, oldest first."""
+    conn = db.conn
+    oldest = conn.execute("SELECT MIN(created_at) FROM transactions").fetchone()[0]
+    if oldest is None:
+        return []
+    today = today or datetime.date.today()
+    years = []
+    for year in range(int(oldest[:4]), today.year):
+        if is_closed(year, today) and conn.execute(
+                "SELECT 1 FROM transactions WHERE created_at >= ? AND created_at < ? LIMIT 1",
+                year_bounds(year)).fetchone():
+            years.append(year)
+    return years
+
+
+def archive_year(db, year, today=None):
+    """Moves one closed year of sales into its archive file. Returns the number of sales moved.
+
+    The copy is written and committed in the archive file first; only then are
+    the hot rows deleted, together with the registry insert, in one write
+    transaction on the main file. A crash in between leaves the sales in the
+    hot file and an unregistered archive file, which the next run replaces.
+    """
+    if not is_closed(year, today):
+        raise ValueError(f"{year} is not closed yet: years can be archived {CLOSED_AFTER_DAYS} days after they end.")
+    conn = db.conn
+    if conn.execute("SELECT 1 FROM archives WHERE year = ?", (year,)).fetchone():
+        raise ValueError(f"{year} is already archived.")
+    bounds = year_bounds(year)
+    name = ARCHIVE_FILE.format(year=year)
+    path = db.archive_path(name)
+    for leftover in (path, path + "-journal"):
+        if os.path.exists(leftover):
+            os.remove(leftover)  # Unregistered, so left behind by an interrupted run
+
+    # 1. Copy the year into the archive file (a transaction of its own)
+    conn.execute("ATTACH DATABASE ? AS archive_new", (path,))
+    try:
+        conn.executescript(ARCHIVE_TABLES.format(schema="archive_new"))
+        with conn:
+            conn.execute("""
+                INSERT INTO archive_new.transactions (id, total, created_at)
+                SELECT id, total, created_at FROM main.transactions WHERE created_at >= ? AND created_at < ?
+            """, bounds)
+            conn.execute("""
+                INSERT INTO archive_new.transaction_items (id, transaction_id, sku, name, qty, unit_price)
+                SELECT i.id, i.transaction_id, i.sku, i.name, i.qty, i.unit_price
+                FROM archive_new.transactions t JOIN main.transaction_items i ON i.transaction_id = t.id
+            """)
+        copied = conn.execute(YEAR_SUMMARY.format(schema="archive_new"), bounds).fetchone()
+    finally:
+        conn.execute("DETACH DATABASE archive_new")
+
+    # 2. Register the file and drop the hot rows, if nothing changed in between
+    cursor = conn.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        count, revenue, first_id, last_id = cursor.execute(YEAR_SUMMARY.format(schema="main"), bounds).fetchone()
+        if (count, round(revenue, 2), first_id, last_id) != (copied[0], round(copied[1], 2), copied[2], copied[3]):
+            raise RuntimeError(f"Sales in {year} changed while they were being archived; run the archiver again.")
+        cursor.execute("""
+            INSERT INTO archives (year, path, sales_count, revenue, first_id, last_id, archived_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (year, name, count, revenue, first_id, last_id, datetime.datetime.now().isoformat(timespec="seconds")))
+        cursor.execute("""
+            DELETE FROM transaction_items WHERE transaction_id IN
+                (SELECT id FROM transactions WHERE created_at >= ? AND created_at < ?)
+        """, bounds)
+        cursor.execute("DELETE FROM transactions WHERE created_at >= ? AND created_at < ?", bounds)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        os.remove(path)
+        raise
+    db.events.publish(TransactionsArchived(year, count))
+    return count
+
+
+def archive_closed_years(db, today=None, vacuum=False, progress=None):
+    """Archives every closed year. Returns [(year, sales moved)].
+
+    With vacuum=True the main file is compacted afterwards, so it also shrinks
+    on disk (otherwise the freed pages are reused by new sales).
+    """
+    archived = []
+    for year in closed_years(db, today):
+        if progress is not None:
+            progress(year)
+        archived.append((year, archive_year(db, year, today)))
+    if vacuum and archived:
+        db.conn.execute("VACUUM")
+    return archived
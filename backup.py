@@ -0,0 +1,241 @@
+import datetime
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import time
+
+from db import BUSY_TIMEOUT
+from journal import JOURNAL_SUFFIX
+
+# --- ONLINE BACKUP ---
+# Snapshots inventory.db while the app (or server.py) keeps selling. SQLite's
+# online backup API copies PAGES_PER_STEP pages at a time and sleeps
+# STEP_PAUSE between steps, so the copy never hogs the disk. The whole copy
+# runs inside one read transaction: under WAL that pins a snapshot, so
+# checkouts carry on committing (to the WAL) without waiting, and they never
+# force the copy to restart, as they would on every commit otherwise.
+#
+# Each snapshot is written to a .partial file, must pass PRAGMA
+# integrity_check, and is then renamed into place. Old snapshots are pruned:
+# the KEEP_LAST newest, plus the newest of each of the last KEEP_WEEKLY weeks,
+# are kept. Archived years (see archive.py) never change, so each is copied
+# once next to the snapshots. restore() writes a snapshot back over the
+# database through the same API.
+#
+#     python manage.py backup [--dest backups] [--list]
+#     python manage.py restore backups/inventory-20261017-031500.db
+
+BACKUP_DIR = "backups"           # next to the database, unless given
+SNAPSHOT_FILE = "{stem}-{stamp}.db"
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+PAGES_PER_STEP = 256             # pages per step (1 MB at the default 4 KB page size)
+STEP_PAUSE = 0.005               # seconds to sleep between steps
+KEEP_LAST = 7
+KEEP_WEEKLY = 4
+BACKUP_INTERVAL = 6 * 3600       # seconds between scheduled snapshots
+
+
+class BackupError(Exception):
+    pass
+
+
+class BackupCancelled(BackupError):
+    pass
+
+
+def backup_dir(db_path, dest=None):
+    return dest or os.path.join(os.path.dirname(os.path.abspath(db_path)), BACKUP_DIR)
+
+
+def snapshots(dest, stem):
+    """[(taken at, path)] of the finished snapshots of database 'stem' in 'dest', newest first."""
+    pattern = re.compile(re.escape(stem) + r"-(\d{8}-\d{6})\.db$")
+    found = []
+    if os.path.isdir(dest):
+        for name in os.listdir(dest):
+            match = pattern.match(name)
+            if match:
+                found.append((datetime.datetime.strptime(match.group(1), STAMP_FORMAT), os.path.join(dest, name)))
+    return sorted(found, reverse=True)
+
+
+def integrity_problems(path):
+    """PRAGMA integrity_check of a database file: [] if it is sound, else the messages."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def copy_database(source, dest_path, pages=PAGES_PER_STEP, pause=STEP_PAUSE, progress=None, stop=None):
+    """Copies the database behind connection 'source' to dest_path, a step at a time.
+
+    progress(pages_done, pages_total) runs after each step; setting the 'stop'
+    event cancels the copy (BackupCancelled). The file appears at dest_path
+    only once it is complete and passes the integrity check.
+    """
+    partial = dest_path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+
+    def step(status, remaining, total):
+        if progress is not None:
+            progress(total - remaining, total)
+        if stop is not None and stop.is_set():
+            raise BackupCancelled("Backup cancelled.")
+        time.sleep(pause)
+
+    target = sqlite3.connect(partial)
+    try:
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone()  # Opens the read transaction
+        try:
+            source.backup(target, pages=pages, progress=step)
+        finally:
+            source.rollback()
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+
+    problems = integrity_problems(partial)
+    if problems:
+        os.remove(partial)
+        raise BackupError(f"Snapshot failed its integrity check: {'; '.join(problems[:5])}")
+    os.replace(partial, dest_path)
+    return dest_path
+
+
+def prune(dest, stem, keep_last=KEEP_LAST, keep_weekly=KEEP_WEEKLY):
+    """Deletes the snapshots outside the retention policy. Returns their paths."""
+    removed = []
+    weeks = []
+    for i, (taken, path) in enumerate(snapshots(dest, stem)):
+        week = taken.isocalendar()[:2]
+        newest_of_week = week not in weeks
+        if newest_of_week:
+            weeks.append(week)
+        if i < keep_last or (newest_of_week and len(weeks) <= keep_weekly):
+            continue
+        os.remove(path)
+        removed.append(path)
+    return removed
+
+
+def backup(db, dest=None, pages=PAGES_PER_STEP, pause=STEP_PAUSE, keep_last=KEEP_LAST, keep_weekly=KEEP_WEEKLY,
+           progress=None, stop=None, now=None):
+    """Takes a snapshot of 'db' (and copies any archive file not backed up yet), then prunes. Returns its path."""
+    dest = backup_dir(db.path, dest)
+    os.makedirs(dest, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(db.path))[0]
+    stamp = (now or datetime.datetime.now()).strftime(STAMP_FORMAT)
+    path = os.path.join(dest, SNAPSHOT_FILE.format(stem=stem, stamp=stamp))
+
+    source = db.connect()  # Its own connection: the read transaction must not hold up the caller's
+    try:
+        copy_database(source, path, pages, pause, progress, stop)
+    finally:
+        source.close()
+    for _, name, _, _ in db.archives():
+        if not os.path.exists(os.path.join(dest, name)):
+            archived = sqlite3.connect(f"file:{db.archive_path(name)}?mode=ro", uri=True)
+            try:
+                copy_database(archived, os.path.join(dest, name), pages, pause, stop=stop)
+            finally:
+                archived.close()
+    prune(dest, stem, keep_last, keep_weekly)
+    return path
+
+
+def restore(db_path, snapshot, keep_current=True):
+    """Replaces the database at db_path with a snapshot. Returns the safety copy's path, if one was made.
+
+    Stop the app and server.py first. The snapshot is integrity-checked
+    before anything is touched. Unless keep_current is False, the current
+    database is first snapshotted as '<name>.pre-restore.db' (outside the
+    rotation). The sales journal is set aside as '<journal>.before-restore',
+    since its entries belong to the replaced history, and archive files the
+    snapshot refers to are copied back if they are missing.
+    """
+    problems = integrity_problems(snapshot)
+    if problems:
+        raise BackupError(f"{snapshot} failed its integrity check: {'; '.join(problems[:5])}")
+    dest = os.path.dirname(os.path.abspath(snapshot))
+    source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+    target = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT)
+    safety = None
+    try:
+        if keep_current and os.path.exists(db_path) and os.path.getsize(db_path) > 0:
+            stamp = datetime.datetime.now().strftime(STAMP_FORMAT)
+            stem = os.path.splitext(os.path.basename(db_path))[0]
+            safety = copy_database(target, os.path.join(dest, f"{stem}-{stamp}.pre-restore.db"))
+        source.backup(target)  # One step: readers see the old database or the new one, never a mix
+        archives = [row[0] for row in source.execute("SELECT path FROM archives")] if source.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'archives'").fetchone() else []
+    finally:
+        source.close()
+        target.close()
+
+    journal = os.path.splitext(os.path.abspath(db_path))[0] + JOURNAL_SUFFIX
+    if os.path.exists(journal) and os.path.getsize(journal) > 0:
+        os.replace(journal, journal + ".before-restore")
+    for name in archives:
+        live = os.path.join(os.path.dirname(os.path.abspath(db_path)), name)
+        if not os.path.exists(live) and os.path.exists(os.path.join(dest, name)):
+            shutil.copy2(os.path.join(dest, name), live)
+    return safety
+
+
+class BackupScheduler:
+    """Takes a snapshot every 'interval' seconds on a background thread.
+
+    The first one is due 'interval' after the newest existing snapshot, so
+    restarting the app does not take a fresh one each time. on_done(path) and
+    on_error(exception) run on the scheduler thread.
+    """
+
+    def __init__(self, db, interval=BACKUP_INTERVAL, dest=None, on_done=None, on_error=None, **options):
+        self.db = db
+        self.interval = interval
+        self.dest = backup_dir(db.path, dest)
+        self.on_done = on_done
+        self.on_error = on_error
+        self.options = options
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="backup-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Cancels a snapshot in progress (its partial file is removed) and stops the thread."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def next_due(self):
+        stem = os.path.splitext(os.path.basename(self.db.path))[0]
+        existing = snapshots(self.dest, stem)
+        if not existing:
+            return time.time()
+        return existing[0][0].timestamp() + self.interval
+
+    def _run(self):
+        while not self._stop.wait(max(0.0, self.next_due() - time.time())):
+            try:
+                path = backup(self.db, self.dest, stop=self._stop, **self.options)
+            except BackupCancelled:
+                return
+            except Exception as e:
+                if self.on_error is not None:
+                    self.on_error(e)
+                self._stop.wait(min(self.interval, 600))  # Retry sooner than a full interval
+                continue
+            if self.on_done is not None:
+                self.on_done(path)
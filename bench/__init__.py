@@ -0,0 +1,3 @@
+# --- BENCHMARKS ---
+# Standalone scripts that exercise the data layer against scratch databases.
+# Run them from the repository root, e.g. `python -m bench.checkout_stress`.
@@ -0,0 +1,165 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import ai
+from db import Database
+
+# --- AI STUB SERVER ---
+# A local, OpenAI-compatible chat completions endpoint that streams a canned
+# answer as server-sent events, for exercising ai.Assistant without a network
+# or an API key.
+#
+#     python -m bench.ai_stub                 # self-check: streaming, caching, retries, keep-alive
+#     python -m bench.ai_stub --serve 8765    # serve for the GUI:
+#     STOCKDESK_AI_URL=http://127.0.0.1:8765/v1/chat/completions python app.py
+
+ANSWER = "Restock the low items first, then run a promotion on slow sellers. Café prices look fine."
+
+
+class StubState:
+    def __init__(self, answer=ANSWER, fail_first=0, token_delay=0.0):
+        self.answer = answer
+        self.fail_first = fail_first      # respond 503 to this many requests before succeeding
+        self.token_delay = token_delay
+        self.requests = 0
+        self.completions = 0
+        self.clients = set()              # client (host, port) pairs = TCP connections used
+        self.last_payload = None
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse is observable
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        state = self.server.state
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with state.lock:
+            state.requests += 1
+            state.clients.add(self.client_address)
+            failing = state.fail_first > 0
+            if failing:
+                state.fail_first -= 1
+        if failing:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        payload = json.loads(body)
+        with state.lock:
+            state.completions += 1
+            state.last_payload = payload
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        self._chunk(": STUB PROCESSING\n\n")
+        for word in state.answer.split(" "):
+            token = word if word == state.answer.split(" ")[0] else " " + word
+            event = {"choices": [{"index": 0, "delta": {"content": token}}]}
+            self._chunk(f"data: {json.dumps(event)}\n\n")
+            if state.token_delay:
+                time.sleep(state.token_delay)
+        self._chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_stub(port=0, **state):
+    """Starts a stub server on a background thread; returns (server, completions URL)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubHandler)
+    server.state = StubState(**state)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/chat/completions"
+
+
+def self_check():
+    """Runs ai.Assistant against the stub; returns a list of failures."""
+    failures = []
+
+    def expect(condition, message):
+        if not condition:
+            failures.append(message)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        db = Database(os.path.join(scratch, "ai.db"))
+        server, url = start_stub(fail_first=2)
+        assistant = ai.Assistant(db, "test-key", "stub-model", url=url, timeout=(2, 5))
+        try:
+            db.setup()
+            db.add_product("A1", "Apples", 1.5, 2)
+            db.add_product("B1", "Bread", 2.0, 40)
+            db.checkout([("B1", "Bread", 3, 2.0)], 6.0)
+
+            tokens = []
+            answer = assistant.ask("What should I restock?", tokens.append)
+            state = server.state
+            expect(answer == ANSWER, f"streamed answer mismatch: {answer!r}")
+            expect(len(tokens) == len(ANSWER.split(" ")), f"expected one token per word, got {len(tokens)}")
+            expect(state.requests == 3, f"expected 2 retried 503s then success, saw {state.requests} requests")
+            system = state.last_payload["messages"][0]["content"]
+            expect("Apples" in system and "Bread" in system, "inventory context missing from the system prompt")
+            expect(state.last_payload.get("stream") is True, "request did not ask for a stream")
+
+            tokens = []
+            again = assistant.ask("  what should I RESTOCK? ", tokens.append)
+            expect(again == ANSWER and tokens == [ANSWER], "repeated question was not served from the cache")
+            expect(state.completions == 1, "repeated question reached the server")
+
+            db.checkout([("A1", "Apples", 1, 1.5)], 1.5)
+            assistant.ask("What should I restock?")
+            expect(state.completions == 2, "a write did not invalidate the response cache")
+            system = state.last_payload["messages"][0]["content"]
+            expect("('Apples', 1)" in system, "a write did not invalidate the inventory context")
+
+            assistant.ask("Anything overstocked?")
+            expect(len(state.clients) == 1, f"session did not reuse connections ({len(state.clients)} used)")
+        finally:
+            assistant.close()
+            server.shutdown()
+            db.close()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stub for the AI Assistant.")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="serve until interrupted instead of self-checking")
+    parser.add_argument("--token-delay", type=float, default=0.05, help="seconds between streamed tokens when serving")
+    args = parser.parse_args(argv)
+
+    if args.serve is not None:
+        server, url = start_stub(args.serve, token_delay=args.token_delay)
+        print(f"Serving {url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return 0
+
+    failures = self_check()
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if failures:
+        return 1
+    print("OK: streaming, retries, context and response caching, connection reuse.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
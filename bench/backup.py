@@ -0,0 +1,160 @@
+import argparse
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import backup
+from db import Database, InsufficientStock
+
+# --- BACKUP IMPACT ---
+# Checkout latency on a database of --mb megabytes while it is being backed up.
+# A separate process rings up a sale every few milliseconds throughout; the
+# main process runs, one after the other:
+#
+#   idle         no backup (the baseline)
+#   stepped      backup.backup with the default step size and pause
+#   one-shot     the same copy in a single backup step
+#   locked copy  the naive way: hold the write lock and copy the file
+#
+# and reports each phase's duration and the checkouts' p50/p99/max latency and
+# failures. Padding rows stand in for a long sales history.
+#
+#     python -m bench.backup [--mb 2048] [--idle 5]
+
+PRODUCTS = 1000
+PAD_ROW = 64 * 1024  # bytes per padding row
+
+
+def build(path, megabytes):
+    db = Database(path)
+    try:
+        db.setup()
+        db.import_products((f"B{i:05d}", f"Backup item {i}", 2.5, 10**9) for i in range(PRODUCTS))
+        conn = db.conn
+        conn.execute("CREATE TABLE IF NOT EXISTS bench_padding (id INTEGER PRIMARY KEY, data BLOB)")
+        rows = megabytes * 1024 * 1024 // PAD_ROW
+        for start in range(0, rows, 1000):
+            with conn:
+                conn.executemany("INSERT INTO bench_padding (data) VALUES (zeroblob(?))",
+                                 [(PAD_ROW,)] * min(1000, rows - start))
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        db.close()
+
+
+def till(path, interval, stop, results):
+    """Sells one line every 'interval' seconds until 'stop' is set; sends [(started at, latency, ok)]."""
+    db = Database(path)
+    samples = []
+    i = 0
+    try:
+        while not stop.is_set():
+            sku = f"B{i % PRODUCTS:05d}"
+            at, started = time.time(), time.perf_counter()
+            ok = True
+            try:
+                db.checkout([(sku, "Backup item", 1, 2.5)], 2.5)
+            except (sqlite3.OperationalError, InsufficientStock):
+                ok = False  # e.g. "database is locked" after the busy timeout
+            samples.append((at, time.perf_counter() - started, ok))
+            i += 1
+            time.sleep(interval)
+    finally:
+        db.close()
+    results.put(samples)
+
+
+def locked_copy(path, dest):
+    """The naive backup: take the write lock, then copy the file."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        shutil.copyfile(path, dest)
+        if os.path.exists(path + "-wal"):
+            shutil.copyfile(path + "-wal", dest + "-wal")  # Committed pages not checkpointed yet
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+
+def summarize(name, window, samples, megabytes):
+    start, end = window
+    inside = sorted(latency for at, latency, ok in samples if start <= at <= end)
+    failed = sum(1 for at, _, ok in samples if start <= at <= end and not ok)
+    seconds = end - start
+    if not inside:
+        print(f"  {name:<12} {seconds:6.1f}s   no checkouts")
+        return
+
+    def pct(fraction):
+        return inside[min(len(inside) - 1, int(len(inside) * fraction))] * 1000
+
+    rate = f"{megabytes / seconds:7.0f} MB/s" if megabytes else " " * 12
+    print(f"  {name:<12} {seconds:6.1f}s {rate}   {len(inside):6d} checkouts   p50 {pct(0.5):7.2f} ms"
+          f"   p99 {pct(0.99):8.2f} ms   max {inside[-1] * 1000:8.1f} ms   failed {failed}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkout latency while the database is backed up.")
+    parser.add_argument("--mb", type=int, default=2048, help="database size to build, in MB")
+    parser.add_argument("--idle", type=float, default=5, help="seconds of baseline without a backup")
+    parser.add_argument("--interval", type=float, default=0.005, help="seconds between checkouts")
+    parser.add_argument("--dir", help="scratch folder (default: a temporary one)")
+    args = parser.parse_args(argv)
+
+    scratch = args.dir or tempfile.mkdtemp(prefix="stockdesk-backup-")
+    try:
+        path = os.path.join(scratch, "big.db")
+        print(f"Building a {args.mb} MB database in {scratch}...", file=sys.stderr)
+        build(path, args.mb)
+        megabytes = os.path.getsize(path) / 1e6
+
+        stop = multiprocessing.Event()
+        results = multiprocessing.Queue()
+        seller = multiprocessing.Process(target=till, args=(path, args.interval, stop, results))
+        seller.start()
+        windows = {}
+        try:
+            time.sleep(1)  # Let the till warm up
+            start = time.time()
+            time.sleep(args.idle)
+            windows["idle"] = (start, time.time())
+
+            db = Database(path)
+            try:
+                start = time.time()
+                snapshot = backup.backup(db, os.path.join(scratch, "stepped"))
+                windows["stepped"] = (start, time.time())
+                print(f"Stepped snapshot verified: {snapshot}", file=sys.stderr)
+
+                start = time.time()
+                backup.backup(db, os.path.join(scratch, "one-shot"), pages=-1, pause=0)
+                windows["one-shot"] = (start, time.time())
+            finally:
+                db.close()
+
+            start = time.time()
+            locked_copy(path, os.path.join(scratch, "locked.db"))
+            windows["locked copy"] = (start, time.time())
+            time.sleep(0.5)
+        finally:
+            stop.set()
+            samples = results.get()
+            seller.join()
+
+        print(f"{megabytes:.0f} MB database, a checkout every {args.interval * 1000:.0f} ms:")
+        for name, window in windows.items():
+            summarize(name, window, samples, 0 if name == "idle" else megabytes)
+        print("(stepped and one-shot include the snapshot's integrity check)")
+    finally:
+        if args.dir is None:
+            shutil.rmtree(scratch, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+from db import Database, InsufficientStock
+
+# --- CHECKOUT STRESS ---
+# Several processes ring up random bills against one database with deliberately
+# scarce stock. Afterwards every product must satisfy
+#     initial stock == remaining stock + units recorded as sold
+# and no stock level may be negative; otherwise a checkout oversold.
+#
+#     python -m bench.checkout_stress [--workers 4] [--checkouts 500] [--products 20]
+
+
+def seed(path, products, stock):
+    db = Database(path)
+    try:
+        db.setup()
+        for i in range(products):
+            db.add_product(f"S{i:04d}", f"Stress item {i}", 1.25 + i, stock)
+    finally:
+        db.close()
+
+
+def worker(path, products, checkouts, seed_value, results):
+    rng = random.Random(seed_value)
+    db = Database(path)
+    sold = rejected = 0
+    try:
+        for _ in range(checkouts):
+            lines = []
+            for i in rng.sample(range(products), rng.randint(1, 3)):
+                qty = rng.randint(1, 4)
+                lines.append((f"S{i:04d}", f"Stress item {i}", qty, 1.25 + i))
+            try:
+                db.checkout(lines, round(sum(qty * price for _, _, qty, price in lines), 2))
+                sold += 1
+            except InsufficientStock:
+                rejected += 1
+    finally:
+        db.close()
+    results.put((sold, rejected))
+
+
+def verify(path, stock):
+    """Returns a list of problems found in the finished database (empty if none)."""
+    db = Database(path)
+    try:
+        conn = db.conn
+        problems = []
+        rows = conn.execute("""
+            SELECT p.sku, p.quantity, COALESCE(SUM(ti.qty), 0)
+            FROM products p LEFT JOIN transaction_items ti ON ti.sku = p.sku
+            GROUP BY p.sku
+        """).fetchall()
+        for sku, remaining, units_sold in rows:
+            if remaining < 0:
+                problems.append(f"{sku}: negative stock {remaining}")
+            if remaining + units_sold != stock:
+                problems.append(f"{sku}: {units_sold} sold + {remaining} left != {stock} stocked")
+        mismatches = db.check_stats()
+        if mismatches:
+            problems.append(f"dashboard counters out of sync: {mismatches}")
+        return problems
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent checkout stress test.")
+    parser.add_argument("--workers", type=int, default=4, help="checkout processes (default: %(default)s)")
+    parser.add_argument("--checkouts", type=int, default=500, help="checkouts per process (default: %(default)s)")
+    parser.add_argument("--products", type=int, default=20, help="products in the catalogue (default: %(default)s)")
+    parser.add_argument("--stock", type=int, default=200, help="initial stock per product (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "stress.db")
+        seed(path, args.products, args.stock)
+
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker, args=(path, args.products, args.checkouts, n, results))
+                     for n in range(args.workers)]
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+        outcomes = [results.get() for _ in processes]
+        for p in processes:
+            p.join()
+        elapsed = time.perf_counter() - start
+
+        sold = sum(s for s, _ in outcomes)
+        rejected = sum(r for _, r in outcomes)
+        problems = verify(path, args.stock)
+
+    attempts = sold + rejected
+    print(f"{args.workers} processes, {attempts} checkouts in {elapsed:.2f}s "
+          f"({attempts / elapsed:.0f}/s): {sold} sold, {rejected} rejected for stock.")
+    if problems:
+        for problem in problems[:20]:
+            print(problem)
+        print(f"FAILED: {len(problems)} problems.")
+        return 1
+    print("OK: no oversells.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import argparse
+import datetime
+import itertools
+import os
+import random
+import sys
+import time
+
+from db import Database
+
+# --- SYNTHETIC STORE GENERATOR ---
+# Builds reproducible inventory.db files at store sizes the GUI is never tested
+# with by hand. The same (products, transactions, seed) always produces the same
+# rows, so timings from different commits are measured on identical data. The
+# sales history ends on --now (default: today), so the app's date-relative
+# views (the Analytics week and month, the forecast window, archiving closed
+# years) find the recent sales they would in a live store; only the dates
+# shift with it.
+#
+#     python -m bench.generate store.db --size medium
+#     python -m bench.generate store.db --products 250000 --transactions 2000000 --seed 7
+#     python -m bench.generate store.db --now 2025-06-30
+
+SIZES = {
+    # name: (products, transactions)
+    "small": (10_000, 50_000),
+    "medium": (100_000, 500_000),
+    "large": (1_000_000, 5_000_000),
+}
+
+HISTORY_DAYS = 730
+CHUNK_SIZE = 10_000
+
+BRANDS = ("Acme", "Northwind", "Contoso", "Fabrikam", "Globex", "Initech", "Umbrella", "Hooli",
+          "Vandelay", "Wonka", "Stark", "Wayne", "Tyrell", "Cyberdyne", "Soylent", "Aperture")
+ADJECTIVES = ("Organic", "Classic", "Premium", "Family", "Mini", "Extra", "Lite", "Fresh", "Spicy",
+              "Sweet", "Salted", "Roasted", "Whole", "Low Fat", "Sugar Free", "Deluxe", "Natural")
+NOUNS = ("Green Tea", "Coffee Beans", "Rice", "Pasta", "Olive Oil", "Biscuits", "Chocolate", "Soap",
+         "Shampoo", "Toothpaste", "Batteries", "Light Bulb", "Notebook", "Pen", "Detergent", "Honey",
+         "Cereal", "Juice", "Water", "Chips", "Noodles", "Flour", "Sugar", "Milk Powder", "Candles")
+PACK_SIZES = ("100g", "250g", "500g", "1kg", "2kg", "330ml", "500ml", "1L", "2L", "Pack of 6", "Pack of 12")
+
+
+def product_rows(rng, count):
+    """Yields (sku, name, price, quantity) rows with a mix of plentiful and scarce stock."""
+    for i in range(count):
+        name = f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {rng.choice(PACK_SIZES)}"
+        price = round(rng.lognormvariate(1.6, 0.8), 2) + 0.49
+        quantity = rng.randint(0, 4) if rng.random() < 0.08 else rng.randint(5, 500)
+        yield f"SKU{i:07d}", name, price, quantity
+
+
+def generate(path, products, transactions, seed=1, days=HISTORY_DAYS, progress=None, now=None):
+    """Creates a synthetic store at 'path' (which must not exist yet).
+
+    Product popularity follows a Zipf-like curve, so a few items account for
+    most sales, as in a real shop. Sales have 1-8 lines (mostly small baskets),
+    mostly single units, spread over the 'days' days before the date 'now'
+    (default: today) in id order.
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    rng = random.Random(seed)
+    db = Database(path)
+    try:
+        db.setup()
+        conn = db.conn
+
+        catalog = []  # (sku, name, price) for building sale lines
+        rows = product_rows(rng, products)
+        for chunk in iter(lambda: list(itertools.islice(rows, CHUNK_SIZE)), []):
+            with conn:
+                conn.executemany("INSERT INTO products (sku, name, price, quantity) VALUES (?, ?, ?, ?)", chunk)
+            catalog.extend((sku, name, price) for sku, name, price, _ in chunk)
+            if progress:
+                progress("products", len(catalog), products)
+
+        # Zipf-like weights over a shuffled catalog, as cumulative weights for rng.choices
+        order = list(range(len(catalog)))
+        rng.shuffle(order)
+        popular = [catalog[i] for i in order]
+        cum_weights = list(itertools.accumulate(1.0 / (rank + 1) for rank in range(len(popular))))
+
+        # Midnight of 'now', so the rows do not depend on the time of day the store was generated
+        end = datetime.datetime.combine(now or datetime.date.today(), datetime.time())
+        moment = end - datetime.timedelta(days=days)
+        mean_gap = days * 86400.0 / max(1, transactions)
+        tid = 0
+        while tid < transactions and popular:
+            headers, items = [], []
+            for _ in range(min(CHUNK_SIZE, transactions - tid)):
+                tid += 1
+                moment = min(end, moment + datetime.timedelta(seconds=rng.expovariate(1.0 / mean_gap)))
+                lines = min(8, 1 + int(rng.expovariate(0.6)))
+                total = 0.0
+                for sku, name, price in rng.choices(popular, cum_weights=cum_weights, k=lines):
+                    qty = 1 if rng.random() < 0.8 else rng.randint(2, 6)
+                    items.append((tid, sku, name, qty, price))
+                    total += qty * price
+                headers.append((tid, round(total, 2), moment.isoformat()))
+            with conn:
+                conn.executemany("INSERT INTO transactions (id, total, created_at) VALUES (?, ?, ?)", headers)
+                conn.executemany("INSERT INTO transaction_items (transaction_id, sku, name, qty, unit_price) "
+                                 "VALUES (?, ?, ?, ?, ?)", items)
+            if progress:
+                progress("transactions", tid, transactions)
+
+        db.rebuild_sales_daily()
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic Stock-Desk database.")
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--size", choices=SIZES, default="small", help="preset store size (default: %(default)s)")
+    parser.add_argument("--products", type=int, help="override the preset's product count")
+    parser.add_argument("--transactions", type=int, help="override the preset's transaction count")
+    parser.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    parser.add_argument("--now", type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="day the sales history ends, YYYY-MM-DD (default: today)")
+    args = parser.parse_args(argv)
+
+    products, transactions = SIZES[args.size]
+    products = args.products if args.products is not None else products
+    transactions = args.transactions if args.transactions is not None else transactions
+
+    def progress(stage, done, total):
+        print(f"\r{stage}: {done}/{total}", end="", file=sys.stderr)
+
+    start = time.perf_counter()
+    generate(args.path, products, transactions, args.seed, progress=progress, now=args.now)
+    print(file=sys.stderr)
+    print(f"Generated {products} products and {transactions} transactions in "
+          f"{time.perf_counter() - start:.1f}s: {args.path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+import argparse
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import tempfile
+import threading
+import time
+
+from db import Database, InsufficientStock
+from journal import SalesJournal, read_journal
+
+# --- SALES JOURNAL CHECKS ---
+# Crash recovery: a child process rings up sales through the journal from
+# several threads, writing down each seq the journal acknowledged, and is
+# killed with SIGKILL mid-stream; a torn half-line is then appended to the
+# journal. Reopening must cut the torn tail, apply every acknowledged sale
+# exactly once and leave the stock and the dashboard counters consistent.
+#
+# Throughput: the same workload through Database.checkout (as shipped, and with
+# synchronous=FULL, i.e. one fsync per sale) and through the journal, which
+# also fsyncs every sale it acknowledges but shares the fsync among the sales
+# that arrive together.
+#
+#     python -m bench.journal [--threads 8] [--checkouts 300] [--skip-crash]
+
+PRODUCTS = 50
+STOCK = 100_000
+
+
+def seed(path, products=PRODUCTS, stock=STOCK):
+    db = Database(path)
+    try:
+        db.setup()
+        for i in range(products):
+            db.add_product(f"J{i:04d}", f"Journal item {i}", 1.5 + i, stock)
+    finally:
+        db.close()
+
+
+def random_bill(rng, products=PRODUCTS):
+    lines = []
+    for i in rng.sample(range(products), rng.randint(1, 3)):
+        lines.append((f"J{i:04d}", f"Journal item {i}", rng.randint(1, 3), 1.5 + i))
+    return lines, round(sum(qty * price for _, _, qty, price in lines), 2)
+
+
+# --- Crash recovery ---
+def crashing_child(path, acked_path, threads):
+    """Sells until killed; appends each acknowledged seq to acked_path."""
+    db = Database(path)
+    journal = SalesJournal(db, rotate_bytes=None)
+    journal.start()
+    acked = open(acked_path, "a")
+    lock = threading.Lock()
+
+    def sell(n):
+        rng = random.Random(n)
+        while True:
+            seq = journal.checkout(*random_bill(rng))
+            with lock:
+                acked.write(f"{seq}\n")
+                acked.flush()
+
+    for n in range(threads):
+        threading.Thread(target=sell, args=(n,), daemon=True).start()
+    while True:
+        time.sleep(1)
+
+
+def crash_check(scratch, threads, sales_before_kill):
+    """Returns a list of problems found after a killed run (empty if none)."""
+    path = os.path.join(scratch, "crash.db")
+    acked_path = os.path.join(scratch, "acked.txt")
+    seed(path)
+    child = multiprocessing.Process(target=crashing_child, args=(path, acked_path, threads))
+    child.start()
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if os.path.exists(acked_path):
+            with open(acked_path) as f:
+                if sum(1 for _ in f) >= sales_before_kill:
+                    break
+        time.sleep(0.01)
+    os.kill(child.pid, signal.SIGKILL)
+    child.join()
+
+    db = Database(path)
+    journal = SalesJournal(db, rotate_bytes=None)
+    with open(journal.path, "ab") as f:
+        f.write(b'[999999999,"2020-01-01T00:00:00",[["J0000","torn')  # an interrupted write
+    problems = []
+    try:
+        replayed = journal.start()
+        journal.close()
+        entries, valid = read_journal(journal.path)
+        with open(acked_path) as f:
+            acked = {int(line) for line in f if line.strip()}
+        seqs = [entry[0] for entry in entries]
+        conn = db.conn
+        if os.path.getsize(journal.path) != valid:
+            problems.append("the torn tail was not cut off")
+        if seqs != list(range(1, len(seqs) + 1)):
+            problems.append("journal seqs are not contiguous")
+        if not acked <= set(seqs):
+            problems.append(f"{len(acked - set(seqs))} acknowledged sales missing from the journal")
+        sales = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+        if sales != len(entries):
+            problems.append(f"{len(entries)} journaled sales but {sales} transactions")
+        if db.journal_applied_seq() != (seqs[-1] if seqs else 0):
+            problems.append("journal_state does not point at the last entry")
+        journaled = {}
+        for _, _, lines, _ in entries:
+            for sku, _, qty, _ in lines:
+                journaled[sku] = journaled.get(sku, 0) + qty
+        for sku, quantity in conn.execute("SELECT sku, quantity FROM products"):
+            if quantity < 0:
+                problems.append(f"{sku} has negative stock ({quantity})")
+            if quantity + journaled.get(sku, 0) != STOCK:
+                problems.append(f"{sku}: {STOCK} != {quantity} left + {journaled.get(sku, 0)} journaled")
+        if db.check_stats():
+            problems.append(f"dashboard counters disagree: {db.check_stats()}")
+        print(f"Crash recovery: killed after {len(acked)} acknowledged sales, "
+              f"{len(entries)} in the journal, {replayed} replayed on restart.")
+    finally:
+        db.close()
+    return problems
+
+
+# --- Throughput ---
+def run_threads(threads, checkouts, sell):
+    """Runs 'checkouts' sales on each of 'threads' threads; returns (seconds, sorted latencies)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(n):
+        rng = random.Random(n)
+        mine = []
+        for _ in range(checkouts):
+            bill = random_bill(rng)
+            started = time.perf_counter()
+            try:
+                sell(*bill)
+            except InsufficientStock:
+                pass
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - started, sorted(latencies)
+
+
+def throughput(scratch, threads, checkouts):
+    results = []
+    for label in ("Database.checkout", "Database.checkout, synchronous=FULL", "SalesJournal.checkout"):
+        path = os.path.join(scratch, f"throughput{len(results)}.db")
+        seed(path)
+        db = Database(path)
+        journal = None
+        try:
+            if label.startswith("SalesJournal"):
+                journal = SalesJournal(db)
+                journal.start()
+                sell = journal.checkout
+            elif "FULL" in label:
+                def sell(lines, total):
+                    db.conn.execute("PRAGMA synchronous = FULL")
+                    return db.checkout(lines, total)
+            else:
+                sell = db.checkout
+            started = time.perf_counter()
+            _, latencies = run_threads(threads, checkouts, sell)
+            if journal is not None:
+                journal.close()  # Timed too: a sale only counts once it is in the database
+            seconds = time.perf_counter() - started
+        finally:
+            db.close()
+        count = len(latencies)
+        results.append((label, count / seconds, latencies[count // 2] * 1000, latencies[int(count * 0.99)] * 1000))
+    print(f"{threads} threads x {checkouts} checkouts:")
+    for label, rate, p50, p99 in results:
+        print(f"  {label:<38} {rate:8.0f}/s   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crash-recovery check and throughput benchmark for the sales journal.")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--checkouts", type=int, default=300, help="checkouts per thread in the throughput run")
+    parser.add_argument("--kill-after", type=int, default=500, help="acknowledged sales before the child is killed")
+    parser.add_argument("--skip-crash", action="store_true")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if not args.skip_crash:
+            problems = crash_check(scratch, args.threads, args.kill_after)
+            for problem in problems:
+                print(f"FAIL: {problem}")
+            if problems:
+                return 1
+            print("OK: every acknowledged sale applied exactly once; stock and counters consistent.")
+        throughput(scratch, args.threads, args.checkouts)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+import receipts
+from db import Database
+
+# --- RECEIPT SPOOL ---
+# Checkout latency with receipts printed inline versus through the spool, on a
+# simulated printer that takes --print-ms per receipt and fails now and then.
+# Halfway through the spooled run the spool is stopped and a new one started
+# on the same folder, as when the app is restarted. Afterwards every receipt
+# must have been printed exactly once, in sale order.
+#
+#     python -m bench.receipts [--sales 100] [--print-ms 150] [--fail-rate 0.1]
+
+
+class SlowPrinter:
+    """A sink that takes 'seconds' per receipt and fails at random with probability 'fail_rate'."""
+
+    def __init__(self, seconds, fail_rate, seed=1):
+        self.seconds = seconds
+        self.fail_rate = fail_rate
+        self.rng = random.Random(seed)
+        self.printed = []
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def send(self, path, fmt):
+        time.sleep(self.seconds)
+        with self._lock:
+            if self.rng.random() < self.fail_rate:
+                self.failures += 1
+                raise receipts.PrintError("Paper jam.")
+            self.printed.append(int(os.path.basename(path).split("-sale-")[1].split(".")[0]))
+
+
+def seed(path):
+    db = Database(path)
+    try:
+        db.setup()
+        db.import_products((f"R{i:03d}", f"Receipt item {i}", 1.25 + i, 10**6) for i in range(100))
+    finally:
+        db.close()
+
+
+def sell(db, rng, count, after_sale):
+    """Rings up 'count' sales, calling after_sale(receipt) for each; returns the latencies in seconds."""
+    latencies = []
+    for _ in range(count):
+        lines = [(f"R{n:03d}", f"Receipt item {n}", rng.randint(1, 3), 1.25 + n) for n in rng.sample(range(100), 3)]
+        total = round(sum(qty * price for _, _, qty, price in lines), 2)
+        started = time.perf_counter()
+        sale = db.checkout(lines, total)
+        after_sale(receipts.Receipt(sale, datetime.datetime.now().isoformat(),
+                                    tuple(line[1:] for line in lines), total))
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summary(name, latencies):
+    latencies = sorted(latencies)
+    p = lambda f: latencies[min(len(latencies) - 1, int(len(latencies) * f))] * 1000
+    print(f"  {name:<8} {len(latencies):5d} sales   p50 {p(0.5):8.2f} ms   p99 {p(0.99):8.2f} ms   "
+          f"total {sum(latencies):7.2f} s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkout latency with inline versus spooled receipt printing.")
+    parser.add_argument("--sales", type=int, default=100)
+    parser.add_argument("--print-ms", type=float, default=150, help="time the printer takes per receipt")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="chance that a print fails")
+    parser.add_argument("--format", choices=receipts.RENDERERS, default="escpos")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "receipts.db")
+        seed(path)
+        db = Database(path)
+        template = receipts.ReceiptTemplate()
+        renderer, extension = receipts.RENDERERS[args.format]
+        try:
+            # Inline: render and print before the till is free again (failures are just retried on the spot)
+            printer = SlowPrinter(args.print_ms / 1000, args.fail_rate)
+
+            def print_now(receipt):
+                inline_file = os.path.join(scratch, f"inline-sale-{receipt.sale}{extension}")
+                with open(inline_file, "wb") as f:
+                    f.write(renderer(template.render(receipt), template.width))
+                while True:
+                    try:
+                        return printer.send(inline_file, args.format)
+                    except receipts.PrintError:
+                        pass
+
+            inline = sell(db, random.Random(1), max(1, args.sales // 10), print_now)
+
+            # Spooled, with a restart halfway
+            printer = SlowPrinter(args.print_ms / 1000, args.fail_rate)
+            folder = os.path.join(scratch, "spool")
+            spool = receipts.ReceiptSpool(folder, printer, args.format, retry_delays=(0.05, 0.2))
+            spool.start()
+            rng = random.Random(2)
+            first = sell(db, rng, args.sales // 2, spool.submit)
+            spool.stop()
+            left = spool.pending()
+            spool = receipts.ReceiptSpool(folder, printer, args.format, retry_delays=(0.05, 0.2))
+            recovered = spool.start()
+            spooled = first + sell(db, rng, args.sales - args.sales // 2, spool.submit)
+            started = time.perf_counter()
+            while spool.pending():
+                time.sleep(0.05)
+            drained = time.perf_counter() - started
+            spool.stop()
+            sold = [row[0] for row in db.conn.execute("SELECT id FROM transactions ORDER BY id")][len(inline):]
+        finally:
+            db.close()
+
+    print(f"Printer: {args.print_ms:.0f} ms per receipt, {args.fail_rate:.0%} of prints fail; {args.format} receipts")
+    summary("inline", inline)
+    summary("spooled", spooled)
+    print(f"  restart: {left} receipts were still spooled at the stop, {recovered} picked up by the new spool")
+    print(f"  the spool finished printing {drained:.1f} s after the last sale ({printer.failures} failed prints retried)")
+    if printer.printed != sold:
+        missing = sorted(set(sold) - set(printer.printed))
+        print(f"FAIL: {len(printer.printed)} receipts printed for {len(sold)} sales; missing {missing[:10]}, "
+              f"in order: {printer.printed == sorted(printer.printed)}")
+        return 1
+    print("OK: every sale's receipt printed exactly once, in order.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
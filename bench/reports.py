@@ -0,0 +1,89 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import reports
+from bench.generate import SIZES
+from bench.suite import DATA_DIR, store_path
+from bill import to_cents
+from db import Database
+
+# --- REPORT GENERATOR ---
+# Times reports.generate on a generated store with 1..N worker processes, plus
+# the whole history as one query, and checks that every run produced the same
+# totals as a plain Python scan of every sold line (db.iter_transaction_items).
+#
+#     python -m bench.reports [--size medium] [--workers 1,2,4]
+
+
+def scan_totals(db):
+    """({year: [sales, units, cents]}, {product: [units, cents]}) from a row-by-row scan."""
+    years, products = {}, {}
+    last = None
+    for tid, created_at, total, sku, name, qty, unit_price in db.iter_transaction_items(include_archived=True):
+        year = years.setdefault(created_at[:4], [0, 0, 0])
+        if tid != last:
+            year[0] += 1
+            year[2] += to_cents(total)
+            last = tid
+        year[1] += qty
+        product = products.setdefault(sku or name, [0, 0])
+        product[0] += qty
+        product[1] += to_cents(qty * unit_price)
+    return years, products
+
+
+def report_totals(totals):
+    years = {year: [sales, units, to_cents(revenue)] for year, sales, units, revenue, _ in totals.periods("annual")}
+    products = {product: [t[3], t[4]] for product, t in totals.products.items()}
+    return years, products
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the parallel report generator.")
+    parser.add_argument("--size", choices=SIZES, default="medium")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts to time")
+    parser.add_argument("--data-dir", default=DATA_DIR)
+    args = parser.parse_args(argv)
+
+    path = store_path(args.data_dir, args.size, args.seed, *SIZES[args.size])
+    db = Database(path)
+    db.setup()  # Stores cached by older versions get the current schema
+    scratch = tempfile.mkdtemp(prefix="stockdesk-reports-")
+    try:
+        tasks = reports.plan(db)
+        print(f"{path}: {db.dashboard_stats()[2]} sales in {len(tasks)} months, {os.cpu_count()} CPUs")
+        expected = scan_totals(db)
+
+        runs = [("one query", [(db.path, "", "9999")], 1)]
+        runs += [(f"{n} worker{'s' if n > 1 else ''}", tasks, n) for n in map(int, args.workers.split(","))]
+        problems = []
+        for name, run_tasks, workers in runs:
+            started = time.perf_counter()
+            totals = reports.aggregate(run_tasks, workers)
+            aggregated = time.perf_counter() - started
+            for kind in reports.REPORT_KINDS:
+                for fmt in reports.FORMATS:
+                    reports.write_report(os.path.join(scratch, f"{kind}.{fmt}"), kind, totals.rows(kind), fmt)
+            total = time.perf_counter() - started
+            print(f"  {name:<12} aggregate {aggregated:6.2f}s   with all 8 files written {total:6.2f}s")
+            if report_totals(totals) != expected:
+                problems.append(name)
+    finally:
+        db.close()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    for name in problems:
+        print(f"FAIL: {name}: totals differ from a full scan")
+    if problems:
+        return 1
+    print("OK: every run matched a full scan.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
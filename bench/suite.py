@@ -0,0 +1,245 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import ai
+import forecast
+from bench.generate import SIZES, generate
+from db import Database, InsufficientStock
+from scanner import SkuCache
+
+# --- QUERY BENCHMARK SUITE ---
+# Times every query path the GUI runs, headlessly, against a generated store,
+# and writes the results as JSON so runs from different commits can be diffed:
+#
+#     python -m bench.suite --size medium --output before.json
+#     python -m bench.suite --size medium --compare before.json
+#
+# Generated stores are cached in --data-dir (one file per size and seed, ending
+# today: a new day's first run regenerates it, so date-relative queries always
+# see recent sales); each run works on a scratch copy, so the checkout case
+# never alters the cache.
+
+DATA_DIR = "bench_data"
+REGRESSION_THRESHOLD = 1.25  # --compare flags cases whose median grew by more than this
+
+
+def measure(fn, repeat, warmup=2):
+    """Runs fn() warmup + repeat times; returns timing statistics in milliseconds."""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "runs": repeat,
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "max_ms": round(samples[-1], 4),
+    }
+
+
+def sample(conn, rng, table, columns, size=200):
+    """Picks up to 'size' rows by seeded random rowid, as one list per column."""
+    top = conn.execute(f"SELECT MAX(rowid) FROM {table}").fetchone()[0] or 0
+    rowids = rng.sample(range(1, top + 1), min(size, top))
+    marks = ",".join("?" * len(rowids))
+    rows = conn.execute(f"SELECT {columns} FROM {table} WHERE rowid IN ({marks}) ORDER BY rowid", rowids).fetchall()
+    return [list(column) for column in zip(*rows)] or [[] for _ in columns.split(",")]
+
+
+def cases(db, rng):
+    """Returns {name: zero-argument callable}, one per query path the app uses."""
+    conn = db.conn
+    product_count = db.products_query().count()
+    transaction_count = db.transactions_query().count()
+    skus, names = sample(conn, rng, "products", "sku, name")
+    tids, = sample(conn, rng, "transactions", "id")
+    today = datetime.date.today()
+
+    products = db.products_query()
+    transactions = db.transactions_query()
+    by_quantity = db.products_query()
+    by_quantity.set_sort("Quantity")
+    first_page = products.fetch_at(0, 100)
+    low_stock = db.low_stock_query()
+    low_first_page = low_stock.fetch_at(0, 100) or [("", "", 0, 0)]
+    last_alert = max((row[0] for row in db.stock_alerts(limit=1)), default=0)
+    scan_cache = SkuCache(db)
+    scan_cache.remember(filter(None, map(scan_cache.fetch, skus)))
+
+    def checkout():
+        picks = rng.sample(skus, 3)
+        lines = [(sku, name, 1, price) for sku, name, price in
+                 (conn.execute("SELECT sku, name, price FROM products WHERE sku = ?", (sku,)).fetchone()
+                  for sku in picks)]
+        try:
+            db.checkout(lines, round(sum(price for _, _, _, price in lines), 2))
+        except InsufficientStock:
+            pass
+
+    return {
+        "dashboard_stats": db.dashboard_stats,
+        "products_count": products.count,
+        "products_first_page": lambda: products.fetch_at(0, 100),
+        "products_jump_page": lambda: products.fetch_at(rng.randrange(max(1, product_count - 100)), 100),
+        "products_scroll_page": lambda: products.fetch_after(products.key(first_page[-1]), 100),
+        "products_by_quantity_page": lambda: by_quantity.fetch_at(0, 100),
+        "low_stock_count": low_stock.count,
+        "low_stock_first_page": lambda: low_stock.fetch_at(0, 100),
+        "low_stock_scroll_page": lambda: low_stock.fetch_after(low_stock.key(low_first_page[-1]), 100),
+        "stock_alerts_poll": lambda: db.stock_alerts(last_alert),
+        "search_empty": lambda: db.search_products(""),
+        "search_short_like": lambda: db.search_products(rng.choice(names)[:2]),
+        "search_sku_exact": lambda: db.search_products(rng.choice(skus)),
+        "search_name_prefix": lambda: db.search_products(rng.choice(names)[:8]),
+        "search_substring": lambda: db.search_products(rng.choice(names).split()[-2][1:]),
+        "search_miss": lambda: db.search_products("zzqx"),
+        "scan_sku_lookup": lambda: db.product_by_sku(rng.choice(skus)),
+        "scan_sku_cached": lambda: scan_cache.get(rng.choice(skus)),
+        "checkout_3_lines": checkout,
+        "analytics_week": lambda: db.revenue_by_day(today - datetime.timedelta(days=7), today),
+        "analytics_month": lambda: db.revenue_by_day(today - datetime.timedelta(days=30), today),
+        "analytics_year": lambda: db.revenue_by_day(today - datetime.timedelta(days=365), today),
+        "transactions_count": transactions.count,
+        "transactions_first_page": lambda: transactions.fetch_at(0, 100),
+        "transactions_jump_page": lambda: transactions.fetch_at(rng.randrange(max(1, transaction_count - 100)), 100),
+        "transaction_details": lambda: db.transaction_details(rng.choice(tids)),
+        "reorder_forecast": lambda: forecast.compute(db, today),
+        "ai_context": lambda: ai.build_system_prompt(db),
+    }
+
+
+def store_path(data_dir, size, seed, products, transactions):
+    """Returns the cached store for these parameters, generating it on first use.
+
+    The store's history ends today; copies generated on earlier days are replaced.
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    stem = f"{size}-{products}p-{transactions}t-seed{seed}"
+    today = datetime.date.today()
+    path = os.path.join(data_dir, f"{stem}-{today:%Y%m%d}.db")
+    if not os.path.exists(path):
+        print(f"Generating {path} (once a day)...", file=sys.stderr)
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate(partial, products, transactions, seed, now=today)
+        os.replace(partial, path)
+        for name in os.listdir(data_dir):
+            if (name == f"{stem}.db" or name.startswith(f"{stem}-")) and name.endswith(".db") \
+                    and name != os.path.basename(path):
+                os.remove(os.path.join(data_dir, name))
+    return path
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(path, repeat, seed, only=None):
+    """Times every case against a scratch copy of the store at 'path'."""
+    with tempfile.TemporaryDirectory() as scratch:
+        work = os.path.join(scratch, "bench.db")
+        shutil.copyfile(path, work)
+        db = Database(work)
+        try:
+            db.setup()
+            results = {}
+            for name, fn in cases(db, random.Random(seed)).items():
+                if only and not any(pattern in name for pattern in only):
+                    continue
+                results[name] = measure(fn, repeat)
+                print(f"{name:28s} median {results[name]['median_ms']:9.3f} ms   "
+                      f"p95 {results[name]['p95_ms']:9.3f} ms", file=sys.stderr)
+            return results
+        finally:
+            db.close()
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Prints median ratios against a baseline run; returns the names of regressed cases."""
+    regressed = []
+    for name, current in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        ratio = current["median_ms"] / max(before["median_ms"], 1e-6)
+        flag = ""
+        if ratio > threshold:
+            flag = "  REGRESSION"
+            regressed.append(name)
+        print(f"{name:28s} {before['median_ms']:9.3f} -> {current['median_ms']:9.3f} ms  x{ratio:5.2f}{flag}")
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Stock-Desk query benchmarks.")
+    parser.add_argument("--size", choices=SIZES, default="small", help="preset store size (default: %(default)s)")
+    parser.add_argument("--products", type=int, help="override the preset's product count")
+    parser.add_argument("--transactions", type=int, help="override the preset's transaction count")
+    parser.add_argument("--seed", type=int, default=1, help="data and workload seed (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per case (default: %(default)s)")
+    parser.add_argument("--only", nargs="*", help="run only cases whose name contains one of these")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="where generated stores are cached (default: %(default)s)")
+    parser.add_argument("--output", help="write the JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="a previous JSON result to compare medians against")
+    args = parser.parse_args(argv)
+
+    products, transactions = SIZES[args.size]
+    products = args.products if args.products is not None else products
+    transactions = args.transactions if args.transactions is not None else transactions
+    path = store_path(args.data_dir, args.size, args.seed, products, transactions)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "size": args.size,
+            "products": products,
+            "transactions": transactions,
+            "seed": args.seed,
+            "repeat": args.repeat,
+        },
+        "results": run(path, args.repeat, args.seed, args.only),
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(report["results"], baseline):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
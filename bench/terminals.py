@@ -0,0 +1,165 @@
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+from client import StockClient
+from db import Database, InsufficientStock, StaleVersion
+from server import serve
+
+# --- SIMULATED TERMINALS ---
+# Load test for server.py on one machine: N processes each play a till against
+# a shared server, with a scan-heavy mix of searches, SKU lookups, checkouts
+# and dashboard reads, plus the odd price change made through an optimistic
+# (versioned) update. Stock is scarce enough that checkouts compete for it.
+#
+# Afterwards every product must satisfy
+#     initial stock == remaining stock + units recorded as sold
+# with no negative stock and consistent dashboard counters: a price update
+# that wrote back a stale quantity, or an oversold checkout, breaks this.
+#
+#     python -m bench.terminals [--terminals 8] [--seconds 10] [--products 200]
+
+SEARCH_TERMS = ("Item", "item 1", "Terminal", "1", "99", "item 4")
+
+
+def seed(path, products, stock):
+    db = Database(path)
+    try:
+        db.setup()
+        db.import_products((f"T{i:05d}", f"Terminal item {i}", round(1.0 + i % 50 * 0.5, 2), stock)
+                           for i in range(products))
+    finally:
+        db.close()
+
+
+def terminal(url, number, products, seconds, results):
+    """One till: returns {operation: [latencies]} plus conflict and rejection counts via 'results'."""
+    rng = random.Random(number)
+    client = StockClient(url)
+    latencies = {"search": [], "lookup": [], "checkout": [], "stats": [], "update": []}
+    counts = {"sold": 0, "short": 0, "stale": 0}
+
+    def timed(operation, fn, *args):
+        started = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            latencies[operation].append(time.perf_counter() - started)
+
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            timed("search", client.search_products, rng.choice(SEARCH_TERMS))
+            bill = []
+            for _ in range(rng.randint(1, 4)):  # scans
+                row = timed("lookup", client.product_by_sku, f"T{rng.randrange(products):05d}")
+                bill.append((row[0], row[1], rng.randint(1, 3), row[2]))
+            try:
+                timed("checkout", client.checkout, bill, round(sum(q * p for _, _, q, p in bill), 2))
+                counts["sold"] += 1
+            except InsufficientStock:
+                counts["short"] += 1
+            if rng.random() < 0.2:
+                timed("stats", client.dashboard_stats)
+            if rng.random() < 0.1:
+                # Reprice a product from a possibly stale read; the quantity read goes back as is
+                sku, name, price, quantity, version = client.product_by_sku(f"T{rng.randrange(products):05d}",
+                                                                            with_version=True)
+                try:
+                    timed("update", client.update_product, sku, name, round(price * 1.01, 2), quantity, version)
+                except StaleVersion:
+                    counts["stale"] += 1
+    finally:
+        client.close()
+    results.put((latencies, counts))
+
+
+def verify(path, stock):
+    """Returns a list of problems found in the finished database (empty if none)."""
+    db = Database(path)
+    try:
+        problems = []
+        rows = db.conn.execute("""
+            SELECT p.sku, p.quantity, COALESCE(SUM(ti.qty), 0)
+            FROM products p LEFT JOIN transaction_items ti ON ti.sku = p.sku
+            GROUP BY p.sku
+        """).fetchall()
+        for sku, remaining, sold in rows:
+            if remaining < 0:
+                problems.append(f"{sku}: negative stock {remaining}")
+            if remaining + sold != stock:
+                problems.append(f"{sku}: {stock} != {remaining} remaining + {sold} sold")
+        if db.check_stats():
+            problems.append(f"dashboard counters disagree: {db.check_stats()}")
+        return problems
+    finally:
+        db.close()
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000 if values else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="N simulated tills against one local stock server.")
+    parser.add_argument("--terminals", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=200, help="initial stock per product")
+    parser.add_argument("--no-journal", action="store_true", help="serve checkouts without the sales journal")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, "terminals.db")
+        seed(path, args.products, args.stock)
+        server = serve(path, port=0, workers=max(args.terminals * 2, 8), journal=not args.no_journal)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            results = multiprocessing.Queue()
+            tills = [multiprocessing.Process(target=terminal, args=(server.url, n, args.products, args.seconds, results))
+                     for n in range(args.terminals)]
+            started = time.perf_counter()
+            for till in tills:
+                till.start()
+            outcomes = [results.get() for _ in tills]
+            for till in tills:
+                till.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.service.close()
+            server.service.db.close()
+
+        latencies = {}
+        counts = {"sold": 0, "short": 0, "stale": 0}
+        for till_latencies, till_counts in outcomes:
+            for operation, values in till_latencies.items():
+                latencies.setdefault(operation, []).extend(values)
+            for name, value in till_counts.items():
+                counts[name] += value
+        requests = sum(len(values) for values in latencies.values())
+        print(f"{args.terminals} terminals, {elapsed:.1f}s: {requests / elapsed:.0f} requests/s, "
+              f"{counts['sold'] / elapsed:.0f} checkouts/s ({counts['sold']} sold, {counts['short']} short of stock, "
+              f"{counts['stale']} stale price updates refused)")
+        for operation, values in latencies.items():
+            values.sort()
+            print(f"  {operation:<9} {len(values):7d}   p50 {percentile(values, 0.5):7.2f} ms"
+                  f"   p99 {percentile(values, 0.99):7.2f} ms")
+
+        problems = verify(path, args.stock)
+    for problem in problems[:20]:
+        print(f"FAIL: {problem}")
+    if problems:
+        return 1
+    print("OK: no oversells, no lost updates, counters consistent.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+# --- BILL MODEL ---
+# The bill being rung up at the till, independent of how it is displayed.
+# Lines are keyed by SKU and money is held in integer cents, so adding,
+# incrementing or removing a line is O(1) and the running total never drifts.
+
+
+def to_cents(amount):
+    """Converts a price in dollars (float or numeric string) to integer cents."""
+    return int(round(float(amount) * 100))
+
+
+def format_cents(cents):
+    sign = "-" if cents < 0 else ""
+    cents = abs(cents)
+    return f"{sign}${cents // 100}.{cents % 100:02d}"
+
+
+class OutOfStock(Exception):
+    """Raised when a bill line would need more units than are in stock."""
+
+    def __init__(self, name, available):
+        super().__init__(f"Only {available} of '{name}' in stock.")
+        self.name = name
+        self.available = available
+
+
+class BillLine:
+    __slots__ = ("sku", "name", "unit_cents", "qty", "stock")
+
+    def __init__(self, sku, name, unit_cents, qty, stock):
+        self.sku = sku
+        self.name = name
+        self.unit_cents = unit_cents
+        self.qty = qty
+        self.stock = stock
+
+    @property
+    def total_cents(self):
+        return self.unit_cents * self.qty
+
+
+class Bill:
+    """Bill lines keyed by SKU, in the order they were first added."""
+
+    def __init__(self):
+        self._lines = {}
+        self.total_cents = 0
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __contains__(self, sku):
+        return sku in self._lines
+
+    def get(self, sku):
+        return self._lines.get(sku)
+
+    def add(self, sku, name, unit_cents, stock, qty=1):
+        """Adds 'qty' units of a product, creating its line if needed.
+
+        'stock' is the latest known stock level; raises OutOfStock (leaving the
+        bill unchanged) if the line would exceed it. An existing line keeps the
+        price it was first added at, so the total stays the sum of the lines
+        even if the price changed between two scans. Returns the line.
+        """
+        line = self._lines.get(sku)
+        current = line.qty if line else 0
+        if current + qty > stock:
+            raise OutOfStock(name, stock)
+        if line is None:
+            line = self._lines[sku] = BillLine(sku, name, unit_cents, 0, stock)
+        line.qty += qty
+        line.stock = stock
+        self.total_cents += line.unit_cents * qty
+        return line
+
+    def set_quantity(self, sku, qty):
+        """Sets a line's quantity; zero or less removes it. Returns the line or None."""
+        line = self._lines[sku]
+        if qty <= 0:
+            self.remove(sku)
+            return None
+        if qty > line.stock:
+            raise OutOfStock(line.name, line.stock)
+        self.total_cents += line.unit_cents * (qty - line.qty)
+        line.qty = qty
+        return line
+
+    def remove(self, sku):
+        line = self._lines.pop(sku, None)
+        if line is not None:
+            self.total_cents -= line.total_cents
+        return line
+
+    def clear(self):
+        self._lines.clear()
+        self.total_cents = 0
+
+    def deduct(self, sale_lines):
+        """Takes checked-out (sku, name, qty, unit_price) lines off the bill.
+
+        Units added while the checkout was running stay on the bill; a line
+        whose units were all sold goes. Returns the SKUs whose lines changed.
+        """
+        changed = []
+        for sku, _, qty, _ in sale_lines:
+            line = self._lines.get(sku)
+            if line is None:
+                continue
+            changed.append(sku)
+            if qty >= line.qty:
+                self.remove(sku)
+            else:
+                line.qty -= qty
+                self.total_cents -= line.unit_cents * qty
+        return changed
+
+    def sale_lines(self):
+        """The bill as (sku, name, qty, unit_price) tuples for Database.checkout."""
+        return [(line.sku, line.name, line.qty, line.unit_cents / 100) for line in self._lines.values()]
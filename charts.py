@@ -0,0 +1,178 @@
+import collections
+import datetime
+import threading
+
+# --- ANALYTICS CHARTS ---
+# The Analytics tab's revenue chart, split into a data side and a drawing side.
+#
+# SeriesCache runs on a worker thread: it turns a named range into dates and
+# revenues, bucketing or downsampling long ranges to at most MAX_POINTS, and
+# caches each series under the database's sales_version() so a repeated click
+# costs two indexed reads instead of a query and a rebuild.
+#
+# RevenueChart runs on the Tk thread: it keeps one Line2D for the lifetime of
+# the tab and updates it with set_data() and draw_idle(), instead of clearing
+# the axes and redrawing every artist. matplotlib is only imported when the
+# chart is created, with the Analytics tab.
+
+MAX_POINTS = 200      # custom ranges are downsampled to this many points
+MARKER_LIMIT = 60     # series longer than this are drawn without point markers
+CACHE_SIZE = 32       # cached series (each range, plus recent custom ranges)
+
+# Named ranges: days back from today (None = all history) and bucket size
+RANGES = {
+    "week": (7, "day"),
+    "month": (30, "day"),
+    "year": (365, "week"),
+    "all": (None, None),  # bucket picked from the history's length
+}
+
+RANGE_TITLES = {
+    "week": "Revenue Over Last Week",
+    "month": "Revenue Over Last Month",
+    "year": "Revenue Over Last Year (weekly)",
+    "all": "Revenue, All Time",
+}
+
+
+class Series:
+    """A chart-ready series: parallel lists of dates and revenues, plus a title."""
+
+    __slots__ = ("dates", "values", "title")
+
+    def __init__(self, dates, values, title):
+        self.dates = dates
+        self.values = values
+        self.title = title
+
+    def __len__(self):
+        return len(self.dates)
+
+
+def lttb(points, threshold):
+    """Largest-Triangle-Three-Buckets downsampling of (x, y) points sorted by x.
+
+    Keeps the first and last points and, from each of 'threshold' - 2 equal
+    buckets in between, the point forming the largest triangle with the
+    previously kept point and the next bucket's average. Peaks and dips
+    survive, unlike plain every-nth sampling.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+    sampled = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    kept = 0
+    for i in range(threshold - 2):
+        next_start = min(int((i + 1) * every) + 1, n - 1)
+        next_end = max(min(int((i + 2) * every) + 1, n), next_start + 1)
+        next_bucket = points[next_start:next_end]
+        avg_x = sum(p[0] for p in next_bucket) / len(next_bucket)
+        avg_y = sum(p[1] for p in next_bucket) / len(next_bucket)
+
+        kept_x, kept_y = points[kept]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            x, y = points[j]
+            area = abs((kept_x - avg_x) * (y - kept_y) - (kept_x - x) * (avg_y - kept_y))
+            if area > best_area:
+                best, best_area = j, area
+        sampled.append(points[best])
+        kept = best
+    sampled.append(points[-1])
+    return sampled
+
+
+class SeriesCache:
+    """Builds revenue series for the chart, cached per range and data version."""
+
+    def __init__(self, db, size=CACHE_SIZE):
+        self.db = db
+        self.size = size
+        self._cache = collections.OrderedDict()  # range key -> (version, Series)
+        self._lock = threading.Lock()
+
+    def get(self, time_range, start=None, end=None, today=None):
+        """The Series for a named range, or for 'custom' with start/end dates."""
+        key = (time_range, start, end) if time_range == "custom" else time_range
+        version = self.db.sales_version()
+        today = today or datetime.date.today()
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == (version, today):
+                self._cache.move_to_end(key)
+                return cached[1]
+
+        series = self._build(time_range, start, end, today)
+        with self._lock:
+            self._cache[key] = ((version, today), series)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.size:
+                self._cache.popitem(last=False)
+        return series
+
+    def _build(self, time_range, start, end, today):
+        if time_range == "custom":
+            rows = self.db.revenue_by_day(start, end)
+            points = lttb([(datetime.date.fromisoformat(day).toordinal(), revenue) for day, revenue in rows],
+                          MAX_POINTS)
+            dates = [datetime.date.fromordinal(int(x)) for x, _ in points]
+            title = f"Revenue {start.isoformat()} to {end.isoformat()}"
+            if len(points) < len(rows):
+                title += f" ({len(points)} of {len(rows)} days)"
+            return Series(dates, [y for _, y in points], title)
+
+        days, bucket = RANGES[time_range]
+        if days is None:
+            start = self.db.first_sale_day() or today
+            span = (today - start).days
+            bucket = "day" if span <= 2 * MAX_POINTS // 3 else "week" if span <= 7 * MAX_POINTS else "month"
+        else:
+            start = today - datetime.timedelta(days=days)
+        rows = self.db.revenue_by_period(start, today, bucket)
+        title = RANGE_TITLES[time_range]
+        if days is None and bucket != "day":
+            title += f" ({bucket}ly)"
+        return Series([datetime.date.fromisoformat(day) for day, _ in rows], [revenue for _, revenue in rows], title)
+
+
+class RevenueChart:
+    """The revenue line on a Figure, updated in place."""
+
+    def __init__(self, fig, canvas):
+        import matplotlib.dates as mdates
+
+        self._date2num = mdates.date2num
+        self.fig = fig
+        self.canvas = canvas
+        self.ax = fig.add_subplot(111)
+        self.line, = self.ax.plot([], [], marker='o', linestyle='-', color='b')
+        self.empty_text = self.ax.text(0.5, 0.5, "No sales data available for this period.",
+                                       horizontalalignment='center', verticalalignment='center',
+                                       transform=self.ax.transAxes, fontsize=14, visible=False)
+        self.ax.set_ylabel("Revenue ($)", fontsize=12)
+        self.ax.grid(True)
+        locator = mdates.AutoDateLocator()
+        self.ax.xaxis.set_major_locator(locator)
+        self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        self.shown = None
+
+    def show(self, series):
+        """Puts 'series' on the chart; a no-op if it is already the one on show."""
+        if series is self.shown:
+            return
+        self.shown = series
+        has_data = len(series) > 0
+        self.line.set_data(self._date2num(series.dates) if has_data else [], series.values)
+        self.line.set_marker('o' if len(series) <= MARKER_LIMIT else '')
+        self.line.set_visible(has_data)
+        self.empty_text.set_visible(not has_data)
+        self.ax.set_title(series.title, fontsize=16)
+        if has_data:
+            self.ax.relim()
+            self.ax.autoscale_view()
+            if len(series) == 1:
+                # A single point has no extent; give it a day either side
+                x = self._date2num(series.dates[0])
+                self.ax.set_xlim(x - 1, x + 1)
+        self.canvas.draw_idle()
@@ -0,0 +1,181 @@
+import json
+import threading
+import time
+from urllib.parse import quote
+
+from db import InsufficientStock, StaleVersion, SEARCH_LIMIT
+from events import EventBus, StockChanged, TransactionRecorded
+
+# --- STOCK CLIENT ---
+# core.StockService's methods, answered by a server.py over HTTP, for tills
+# that share one inventory (python app.py --server http://host:8766).
+#
+# Requests go through one pooled requests.Session (keep-alive, retries on
+# connection errors and 5xx). Reads are cached locally: a cached answer younger
+# than CACHE_TTL is used as is, an older one is revalidated with If-None-Match,
+# which costs the server no query when nothing changed; any response showing
+# that the server's data moved on makes every entry revalidate. invalidate()
+# drops entries outright, as the client does after its own writes.
+# requests is imported on first use, not with the module.
+
+CONNECT_TIMEOUT = 3   # seconds to reach the server
+READ_TIMEOUT = 15     # seconds to wait for an answer
+RETRIES = 2           # retries for connection errors and 502/503/504 (never for a checkout POST)
+POOL_SIZE = 8         # pooled connections (the app's background workers share them)
+CACHE_TTL = 2.0       # seconds a cached read is served without asking the server
+TOKEN_ENV = "STOCKDESK_SERVER_TOKEN"  # shared secret the server requires, if set
+
+
+class StockClient:
+    """Talks to a server.py; safe to call from any thread."""
+
+    def __init__(self, url, token=None, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=RETRIES,
+                 cache_ttl=CACHE_TTL, events=None):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.retries = retries
+        self.cache_ttl = cache_ttl
+        self.events = events or EventBus()
+        self.data_version = None  # X-Data-Version of the last response
+        self._session = None
+        self._cache = {}  # (path, params) -> (etag, fetched at, value)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                self._session = self._new_session()
+            return self._session
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # POST is not retried: a checkout that reached the server must not be sold twice
+        retry = Retry(total=self.retries, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                      allowed_methods=("GET", "PUT"))
+        session = requests.Session()
+        session.trust_env = False  # a till talks to its server directly; skips per-request proxy/netrc lookups
+        session.mount("http://", HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=POOL_SIZE))
+        session.mount("https://", HTTPAdapter(max_retries=retry, pool_connections=1, pool_maxsize=POOL_SIZE))
+        if self.token:
+            session.headers["Authorization"] = f"Bearer {self.token}"
+        return session
+
+    # --- Reads (cached) ---
+    def search_products(self, term, limit=SEARCH_LIMIT):
+        body = self._get("/api/products", (("q", term.strip()), ("limit", limit)))
+        return [tuple(row) for row in body["products"]]
+
+    def product_by_sku(self, sku, with_version=False):
+        body = self._get(self._product_path(sku))
+        if body is None:
+            return None
+        row = tuple(body["product"])
+        return row + (body["version"],) if with_version else row
+
+    def dashboard_stats(self):
+        body = self._get("/api/stats")
+        return body["product_count"], body["low_stock_count"], body["sales_count"], body["revenue"]
+
+    def invalidate(self, skus=None):
+        """Drops cached reads: everything, or the searches and the given products."""
+        with self._lock:
+            if skus is None:
+                self._cache.clear()
+                return
+            paths = {self._product_path(sku) for sku in skus}
+            for key in [key for key in self._cache if key[0] in paths or key[0] == "/api/products"]:
+                del self._cache[key]
+
+    def _get(self, path, params=()):
+        """The JSON body of a GET (None for 404), from the cache when it is fresh or still valid."""
+        key = (path, params)
+        with self._lock:
+            cached = self._cache.get(key)
+        if cached is not None and time.monotonic() - cached[1] < self.cache_ttl:
+            return cached[2]
+        headers = {"If-None-Match": cached[0]} if cached is not None else {}
+        response = self.session.get(self.url + path, params=params, headers=headers, timeout=self.timeout)
+        self._saw(response)
+        if response.status_code == 304 and cached is not None:
+            value = cached[2]
+        elif response.status_code == 404:
+            return None
+        else:
+            response.raise_for_status()
+            value = response.json()
+        etag = response.headers.get("ETag")
+        if etag is not None:
+            with self._lock:
+                self._cache[key] = (etag, time.monotonic(), value)
+        return value
+
+    # --- Writes ---
+    def update_product(self, sku, name, price, quantity, version):
+        """Overwrites a product if it is still at 'version'. Returns the new version.
+
+        Raises StaleVersion (with the server's current row) if someone else
+        changed it first, KeyError if it does not exist.
+        """
+        response = self.session.put(self.url + self._product_path(sku), timeout=self.timeout,
+                                    data=json.dumps({"name": name, "price": price, "quantity": quantity,
+                                                     "version": version}))
+        self._saw(response)
+        self.invalidate([sku])
+        if response.status_code == 404:
+            raise KeyError(sku)
+        if response.status_code == 409:
+            body = response.json()
+            raise StaleVersion(tuple(body["product"]) + (body["version"],))
+        response.raise_for_status()
+        return response.json()["version"]
+
+    def checkout(self, lines, total):
+        """Sells (sku, name, qty, unit_price) lines on the server. Returns (transaction id, {sku: stock left}).
+
+        Raises InsufficientStock with the server's shortfalls. Publishes
+        StockChanged and TransactionRecorded (with the server's transaction id
+        and time, for the receipt) locally, for this till's views.
+        """
+        response = self.session.post(self.url + "/api/checkout", timeout=self.timeout,
+                                     data=json.dumps({"lines": [list(line) for line in lines], "total": total}))
+        self._saw(response)
+        skus = {sku for sku, _, _, _ in lines}
+        self.invalidate(skus)
+        if response.status_code == 409:
+            raise InsufficientStock([tuple(shortfall) for shortfall in response.json()["shortfalls"]])
+        response.raise_for_status()
+        body = response.json()
+        stock = body["stock"]
+        sold = {}
+        for sku, _, qty, _ in lines:
+            sold[sku] = sold.get(sku, 0) + qty
+        self.events.publish(StockChanged(tuple((sku, left + sold[sku], left) for sku, left in stock.items())))
+        self.events.publish(TransactionRecorded(body["sale"], total, body["created_at"], sum(sold.values()),
+                                                tuple((name, qty, price) for _, name, qty, price in lines)))
+        return body["sale"], stock
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
+
+    # --- Helpers ---
+    def _saw(self, response):
+        """Notes the server's data version; when it moved, every cached read is revalidated on next use."""
+        version = response.headers.get("X-Data-Version")
+        if version is None or version == self.data_version:
+            return
+        with self._lock:
+            if self.data_version is not None:
+                self._cache = {key: (etag, float("-inf"), value) for key, (etag, _, value) in self._cache.items()}
+            self.data_version = version
+
+    @staticmethod
+    def _product_path(sku):
+        return "/api/products/" + quote(sku, safe="")
@@ -0,0 +1,96 @@
+from db import SEARCH_LIMIT, StaleVersion
+
+# --- STOCK SERVICE ---
+# What a till needs from the inventory, without any Tk: product search and
+# lookup, checkout and the dashboard counters. The Billing and Dashboard tabs
+# talk to one of two implementations with the same methods:
+#
+#   StockService  - in-process, over a Database (and the sales journal, if any);
+#                   also what server.py exposes over HTTP
+#   client.StockClient - the same calls against a server.py on another machine
+#
+# Stock figures are projected: with a journal, units sold but not applied yet
+# are already taken off, as in the StockChanged events the journal publishes.
+
+
+class StockService:
+    """The till operations over a local Database, optionally checking out through a SalesJournal."""
+
+    def __init__(self, db, journal=None):
+        self.db = db
+        self.journal = journal
+
+    @property
+    def events(self):
+        return self.db.events
+
+    def version(self):
+        """A value that changes whenever any product, sale or pending sale does (for HTTP validators)."""
+        products, sales = self.db.data_version()
+        pending = self.journal.last_seq if self.journal is not None else 0
+        return f"{products}-{sales}-{pending}"
+
+    def search_products(self, term, limit=SEARCH_LIMIT):
+        return [self._projected(row) for row in self.db.search_products(term, limit)]
+
+    def product_by_sku(self, sku, with_version=False):
+        row = self.db.product_by_sku(sku, with_version)
+        return self._projected(row) if row is not None else None
+
+    def update_product(self, sku, name, price, quantity, version):
+        """Overwrites a product if it is still at 'version' (see Database.update_product).
+
+        While journaled sales of the product are still pending, the quantity the
+        caller saw was projected, not stored, so the update is refused as stale
+        (the version moves once they are applied, a few milliseconds later).
+        """
+        if self.journal is not None and self.journal.pending_units(sku):
+            raise StaleVersion(self.product_by_sku(sku, with_version=True))
+        return self.db.update_product(sku, name, price, quantity, version)
+
+    def checkout(self, lines, total):
+        """Sells (sku, name, qty, unit_price) lines. Returns (sale id, {sku: stock left}).
+
+        The sale id is the transaction id, or the journal seq when checking out
+        through the journal. Raises InsufficientStock.
+        """
+        if self.journal is not None:
+            sale = self.journal.checkout(lines, total)
+        else:
+            sale = self.db.checkout(lines, total)
+        return sale, self.stock_levels({sku for sku, _, _, _ in lines})
+
+    def record_sale(self, lines, total):
+        """Like checkout(), but returns once the sale is in the database: (transaction id, created_at, stock).
+
+        What a remote till prints on its receipt, so a reprint from the
+        Transactions tab matches it. Raises InsufficientStock.
+        """
+        if self.journal is not None:
+            tid, created_at = self.journal.checkout(lines, total, applied=True)
+        else:
+            tid = self.db.checkout(lines, total)
+            (_, created_at), _ = self.db.transaction_details(tid)
+        return tid, created_at, self.stock_levels({sku for sku, _, _, _ in lines})
+
+    def stock_levels(self, skus):
+        """{sku: projected stock} for the given SKUs that exist."""
+        levels = {}
+        for sku in skus:
+            row = self.product_by_sku(sku)
+            if row is not None:
+                levels[sku] = row[3]
+        return levels
+
+    def dashboard_stats(self):
+        return self.db.dashboard_stats()
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+    def _projected(self, row):
+        if self.journal is None:
+            return row
+        pending = self.journal.pending_units(row[0])
+        return row[:3] + (row[3] - pending,) + row[4:] if pending else row
@@ -0,0 +1,125 @@
+import csv
+import math
+
+from db import IMPORT_CHUNK_SIZE
+
+# --- CSV IMPORT / EXPORT ---
+# Bulk movement of data in and out of an inventory.db. Files are streamed: the
+# importer validates one record at a time and hands the good ones to
+# Database.import_products in chunks, and the exporters write rows as the
+# database cursor yields them, so neither side ever holds a whole table.
+
+PRODUCT_FIELDS = ("sku", "name", "price", "quantity", "reorder_level")
+REQUIRED_PRODUCT_FIELDS = PRODUCT_FIELDS[:4]  # reorder_level may be left out
+TRANSACTION_FIELDS = ("transaction_id", "created_at", "total", "sku", "name", "qty", "unit_price")
+
+MAX_REPORTED_ERRORS = 1000  # further bad rows are counted but not kept
+
+
+class ImportReport:
+    """Outcome of a bulk import: row counts plus (line_number, message) per rejected row."""
+
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def summary(self):
+        text = f"{self.inserted} added, {self.updated} updated, {self.rejected} rejected."
+        for line, message in self.errors[:10]:
+            text += f"\nLine {line}: {message}"
+        if self.rejected > 10:
+            text += f"\n... and {self.rejected - 10} more."
+        return text
+
+
+def parse_product(record):
+    """Validates and coerces one CSV record into a (sku, name, price, quantity, reorder_level) tuple.
+
+    A missing or blank reorder level comes back as None (keep the current one).
+    Raises ValueError with a readable message for a bad row.
+    """
+    sku = (record.get("sku") or "").strip()
+    name = (record.get("name") or "").strip()
+    if not sku:
+        raise ValueError("missing SKU")
+    if not name:
+        raise ValueError("missing name")
+    try:
+        price = float((record.get("price") or "").strip().lstrip("$").replace(",", ""))
+    except ValueError:
+        raise ValueError(f"price {record.get('price')!r} is not a number") from None
+    if not math.isfinite(price) or price < 0:
+        raise ValueError(f"price {record.get('price')!r} must be zero or more")
+    try:
+        quantity = float((record.get("quantity") or "").strip())
+    except ValueError:
+        raise ValueError(f"quantity {record.get('quantity')!r} is not a number") from None
+    if not quantity.is_integer() or quantity < 0:
+        raise ValueError(f"quantity {record.get('quantity')!r} must be a whole number, zero or more")
+    level = (record.get("reorder_level") or "").strip() or None
+    if level is not None:
+        try:
+            level = float(level)
+        except ValueError:
+            raise ValueError(f"reorder level {record.get('reorder_level')!r} is not a number") from None
+        if not level.is_integer() or level < 0:
+            raise ValueError(f"reorder level {record.get('reorder_level')!r} must be a whole number, zero or more")
+        level = int(level)
+    return sku, name, round(price, 2), int(quantity), level
+
+
+def import_products(db, path, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """Upserts the products in a CSV file (header: sku,name,price,quantity[,reorder_level]; any order).
+
+    Existing SKUs are updated, new ones inserted. Bad rows are reported in the
+    returned ImportReport rather than aborting the import. progress(rows_done)
+    is called after each committed chunk. Raises ValueError if the header lacks
+    a required column.
+    """
+    report = ImportReport()
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        reader.fieldnames = [(field or "").strip().lower() for field in reader.fieldnames or []]
+        missing = [field for field in REQUIRED_PRODUCT_FIELDS if field not in reader.fieldnames]
+        if missing:
+            raise ValueError(f"CSV header is missing column(s): {', '.join(missing)}")
+
+        def valid_rows():
+            for record in reader:
+                try:
+                    yield parse_product(record)
+                except ValueError as e:
+                    report.reject(reader.line_num, str(e))
+
+        report.inserted, report.updated = db.import_products(valid_rows(), chunk_size, progress)
+    return report
+
+
+def export_products(db, path, progress=None):
+    """Writes every product to a CSV file in import format. Returns the row count."""
+    return _write_csv(path, PRODUCT_FIELDS, db.iter_products(), progress)
+
+
+def export_transactions(db, path, progress=None):
+    """Writes the sales history, archived years included, one row per sold line. Returns the row count."""
+    return _write_csv(path, TRANSACTION_FIELDS, db.iter_transaction_items(include_archived=True), progress)
+
+
+def _write_csv(path, header, rows, progress):
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+            if progress is not None and written % IMPORT_CHUNK_SIZE == 0:
+                progress(written)
+    return written
@@ -0,0 +1,1152 @@
+import sqlite3
+import threading
+import json
+import datetime
+import itertools
+import os
+import pathlib
+
+from metrics import TimedConnection
+from events import (EventBus, ProductAdded, ProductRemoved, ProductUpdated, ProductsImported, StockChanged,
+                    TransactionRecorded, TransactionDeleted)
+
+# --- DATA ACCESS LAYER ---
+# Every SQL statement the application runs lives in this module. A Database owns
+# one long-lived connection per thread (the Tk thread plus any background
+# workers), so hot paths such as the billing search never pay for a connect or
+# teardown. Statements are kept as fixed strings so sqlite3's per-connection
+# statement cache can reuse the prepared statements between calls.
+
+# Connection tuning applied to every connection the Database opens.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",        # readers never block the writer (and vice versa)
+    "PRAGMA synchronous = NORMAL",      # safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size = -20000",       # ~20 MB page cache
+    "PRAGMA mmap_size = 268435456",     # memory-map up to 256 MB of the file
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA foreign_keys = ON",
+)
+
+STATEMENT_CACHE_SIZE = 256
+SEARCH_LIMIT = 50  # rows returned by the billing search
+LOW_STOCK_THRESHOLD = 5  # default reorder level: a product is low on stock below its level
+ALERT_HISTORY = 1000  # stock alerts kept in the queue; older ones are pruned as new ones arrive
+ALERT_LIMIT = 50  # alerts returned by one stock_alerts call
+
+# Adds (revenue, tx_count, units) to the rollup row of the day 'created_at' falls on
+SALES_DAILY_ADD = """
+    INSERT INTO sales_daily (day, revenue, tx_count, units) VALUES (DATE(?), ?, ?, ?)
+    ON CONFLICT(day) DO UPDATE SET
+        revenue = revenue + excluded.revenue,
+        tx_count = tx_count + excluded.tx_count,
+        units = units + excluded.units
+"""
+# Expressions mapping a sales_daily day to the first day of its bucket
+SALES_BUCKETS = {
+    "week": "DATE(day, '-' || ((CAST(strftime('%w', day) AS INTEGER) + 6) % 7) || ' days')",
+    "month": "strftime('%Y-%m-01', day)",
+}
+BUSY_TIMEOUT = 5.0  # seconds to wait for another connection's write lock
+IMPORT_CHUNK_SIZE = 1000  # rows per executemany/commit in bulk imports
+EXPORT_BATCH_SIZE = 1000  # rows fetched at a time by the streaming exports
+ARCHIVE_SCHEMA = "archive_{year}"  # schema name an archived year is ATTACHed under
+
+# A NULL reorder level (?5) gives new products the default and leaves existing ones' alone
+PRODUCT_UPSERT = f"""
+    INSERT INTO products (sku, name, price, quantity, reorder_level)
+    VALUES (?1, ?2, ?3, ?4, COALESCE(?5, {LOW_STOCK_THRESHOLD}))
+    ON CONFLICT(sku) DO UPDATE SET
+        name = excluded.name,
+        price = excluded.price,
+        quantity = excluded.quantity,
+        reorder_level = COALESCE(?5, products.reorder_level),
+        version = products.version + 1
+"""
+
+
+def setup_schema(conn):
+    """Creates the necessary tables in the SQLite database if they don't exist."""
+    cursor = conn.cursor()
+
+    # Products table: Stores all product information.
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS products (
+            sku TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            quantity INTEGER NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            reorder_level INTEGER NOT NULL DEFAULT {LOW_STOCK_THRESHOLD}
+        )
+    ''')
+    # Row version: bumped by every write to the row, for optimistic concurrency (see update_product).
+    # Reorder level: the product counts as low on stock while quantity < reorder_level.
+    cursor.execute("PRAGMA table_info(products)")
+    columns = [col[1] for col in cursor.fetchall()]
+    if "version" not in columns:
+        cursor.execute("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    if "reorder_level" not in columns:
+        cursor.execute(f"ALTER TABLE products ADD COLUMN reorder_level INTEGER NOT NULL DEFAULT {LOW_STOCK_THRESHOLD}")
+
+    # Transactions table: Stores the header record of each sale.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            total REAL NOT NULL,
+            created_at TEXT NOT NULL
+        )
+    ''')
+
+    # Transaction items table: One row per product line of a sale.
+    # 'name' is a snapshot so details survive the product being deleted later.
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            transaction_id INTEGER NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
+            sku TEXT,
+            name TEXT NOT NULL,
+            qty INTEGER NOT NULL,
+            unit_price REAL NOT NULL
+        )
+    ''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transaction_items_tid ON transaction_items(transaction_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transaction_items_sku ON transaction_items(sku)")
+    conn.commit()
+
+    # Older databases still keep line items as a JSON blob in transactions.items.
+    # This rebuilds the transactions table, so it runs before anything (indexes,
+    # triggers, rollups) that is attached to or derived from it.
+    cursor.execute("PRAGMA table_info(transactions)")
+    if any(col[1] == "items" for col in cursor.fetchall()):
+        migrate_transaction_items(conn)
+
+    # Indexes that let the virtual lists seek straight to a page in sort order
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_name ON products(name, sku)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_quantity ON products(quantity, sku)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_transactions_created_at ON transactions(created_at)")
+    # Partial index holding only the products below their reorder level, in stock
+    # order: the low-stock panel reads it through the view without touching the
+    # rest of the catalog (queries must repeat the index's WHERE, as the view does)
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_products_low_stock ON products(quantity, sku) WHERE quantity < reorder_level")
+    cursor.execute("""
+        CREATE VIEW IF NOT EXISTS low_stock AS
+        SELECT sku, name, quantity, reorder_level FROM products WHERE quantity < reorder_level
+    """)
+    conn.commit()
+
+    setup_search_index(conn)
+    setup_archives(conn)
+
+    # Daily sales rollup: one row per day with sales, kept current by checkout
+    # and delete_transaction so the Analytics tab never has to scan transactions.
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sales_daily'")
+    rollup_exists = cursor.fetchone() is not None
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS sales_daily (
+            day TEXT PRIMARY KEY,
+            revenue REAL NOT NULL DEFAULT 0,
+            tx_count INTEGER NOT NULL DEFAULT 0,
+            units INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    conn.commit()
+    if not rollup_exists:
+        rebuild_sales_daily(conn)
+
+    setup_stats(conn)
+    setup_stock_alerts(conn)
+    setup_data_version(conn)
+    setup_journal_state(conn)
+
+
+def setup_stats(conn):
+    """Creates the single-row 'stats' table and the triggers that maintain it.
+
+    The Dashboard's four counters are kept exact by triggers on products and
+    transactions, so reading them is one primary-key lookup instead of two
+    full-table aggregates.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'stats'")
+    exists = cursor.fetchone() is not None
+    # Triggers from before per-product reorder levels compare against a fixed threshold
+    cursor.execute("SELECT sql FROM sqlite_master WHERE name = 'stats_product_quantity'")
+    row = cursor.fetchone()
+    stale = row is not None and "reorder_level" not in row[0]
+    if stale:
+        cursor.executescript("""
+            DROP TRIGGER stats_product_insert;
+            DROP TRIGGER stats_product_delete;
+            DROP TRIGGER stats_product_quantity;
+        """)
+    cursor.executescript('''
+        CREATE TABLE IF NOT EXISTS stats (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            product_count INTEGER NOT NULL DEFAULT 0,
+            low_stock_count INTEGER NOT NULL DEFAULT 0,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO stats (id) VALUES (1);
+
+        CREATE TRIGGER IF NOT EXISTS stats_product_insert AFTER INSERT ON products BEGIN
+            UPDATE stats SET product_count = product_count + 1,
+                             low_stock_count = low_stock_count + (new.quantity < new.reorder_level)
+            WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_product_delete AFTER DELETE ON products BEGIN
+            UPDATE stats SET product_count = product_count - 1,
+                             low_stock_count = low_stock_count - (old.quantity < old.reorder_level)
+            WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_product_quantity AFTER UPDATE OF quantity, reorder_level ON products
+        WHEN (new.quantity < new.reorder_level) != (old.quantity < old.reorder_level) BEGIN
+            UPDATE stats SET low_stock_count = low_stock_count + (new.quantity < new.reorder_level)
+                                                               - (old.quantity < old.reorder_level)
+            WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_transaction_insert AFTER INSERT ON transactions BEGIN
+            UPDATE stats SET sales_count = sales_count + 1, revenue = revenue + new.total WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_transaction_delete AFTER DELETE ON transactions BEGIN
+            UPDATE stats SET sales_count = sales_count - 1, revenue = revenue - old.total WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS stats_transaction_total AFTER UPDATE OF total ON transactions BEGIN
+            UPDATE stats SET revenue = revenue + new.total - old.total WHERE id = 1;
+        END;
+    ''')
+    conn.commit()
+    if not exists or stale:
+        rebuild_stats(conn)
+
+
+def setup_stock_alerts(conn):
+    """Creates the 'stock_alerts' queue and the triggers that fill it.
+
+    A row is queued whenever a product crosses its reorder level, in the same
+    transaction as the write that moved it (a checkout's decrement, an import,
+    a stock or level edit): low = 1 when it fell below, 0 when it recovered.
+    New products that start below their level are queued too. Readers keep
+    the last id they have seen and ask for what came after it (see
+    Database.stock_alerts), so nobody has to scan the catalog to find out what
+    ran low. Only the newest ALERT_HISTORY rows are kept.
+    """
+    conn.executescript(f'''
+        CREATE TABLE IF NOT EXISTS stock_alerts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sku TEXT NOT NULL,
+            name TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            reorder_level INTEGER NOT NULL,
+            low INTEGER NOT NULL,
+            created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'))
+        );
+
+        CREATE TRIGGER IF NOT EXISTS stock_alert_insert AFTER INSERT ON products
+        WHEN new.quantity < new.reorder_level BEGIN
+            INSERT INTO stock_alerts (sku, name, quantity, reorder_level, low)
+            VALUES (new.sku, new.name, new.quantity, new.reorder_level, 1);
+        END;
+        CREATE TRIGGER IF NOT EXISTS stock_alert_cross AFTER UPDATE OF quantity, reorder_level ON products
+        WHEN (new.quantity < new.reorder_level) != (old.quantity < old.reorder_level) BEGIN
+            INSERT INTO stock_alerts (sku, name, quantity, reorder_level, low)
+            VALUES (new.sku, new.name, new.quantity, new.reorder_level, new.quantity < new.reorder_level);
+        END;
+        CREATE TRIGGER IF NOT EXISTS stock_alert_prune AFTER INSERT ON stock_alerts BEGIN
+            DELETE FROM stock_alerts WHERE id <= new.id - {ALERT_HISTORY};
+        END;
+    ''')
+    conn.commit()
+
+
+def setup_data_version(conn):
+    """Creates the single-row 'data_version' table: change counters for caches.
+
+    Triggers bump 'products' on any product write and 'sales' on any
+    transaction write, whichever connection, thread or process makes it, so
+    a cache keyed by these numbers can never serve data older than the last
+    commit. Only equality is meaningful; the values themselves are arbitrary.
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            products INTEGER NOT NULL DEFAULT 0,
+            sales INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO data_version (id) VALUES (1);
+
+        CREATE TRIGGER IF NOT EXISTS data_version_product_insert AFTER INSERT ON products BEGIN
+            UPDATE data_version SET products = products + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_product_update AFTER UPDATE ON products BEGIN
+            UPDATE data_version SET products = products + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_product_delete AFTER DELETE ON products BEGIN
+            UPDATE data_version SET products = products + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_transaction_insert AFTER INSERT ON transactions BEGIN
+            UPDATE data_version SET sales = sales + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_transaction_update AFTER UPDATE ON transactions BEGIN
+            UPDATE data_version SET sales = sales + 1 WHERE id = 1;
+        END;
+        CREATE TRIGGER IF NOT EXISTS data_version_transaction_delete AFTER DELETE ON transactions BEGIN
+            UPDATE data_version SET sales = sales + 1 WHERE id = 1;
+        END;
+    ''')
+    conn.commit()
+
+
+def setup_archives(conn):
+    """Creates the 'archives' registry of years moved out to transactions_YYYY.db files.
+
+    Each row records one archive file (its path relative to the main database)
+    and the sales it took. Archiving deletes the hot rows, which the stats
+    triggers subtract, and inserts the registry row, which adds them back, so
+    the Dashboard keeps counting the whole history. sales_daily is left alone:
+    the Analytics tab reads archived years from the rollup without the files.
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS archives (
+            year INTEGER PRIMARY KEY,
+            path TEXT NOT NULL,
+            sales_count INTEGER NOT NULL,
+            revenue REAL NOT NULL,
+            first_id INTEGER,
+            last_id INTEGER,
+            archived_at TEXT NOT NULL
+        );
+
+        CREATE TRIGGER IF NOT EXISTS stats_archive_insert AFTER INSERT ON archives BEGIN
+            UPDATE stats SET sales_count = sales_count + new.sales_count, revenue = revenue + new.revenue WHERE id = 1;
+        END;
+    ''')
+    conn.commit()
+
+
+def setup_journal_state(conn):
+    """Creates the single-row 'journal_state' table: the last sales-journal entry applied.
+
+    journal.SalesJournal advances applied_seq in the same transaction that
+    writes a batch of journaled sales, so replaying the journal after a crash
+    skips exactly the entries that already made it into the database.
+    """
+    conn.executescript('''
+        CREATE TABLE IF NOT EXISTS journal_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            applied_seq INTEGER NOT NULL DEFAULT 0
+        );
+        INSERT OR IGNORE INTO journal_state (id) VALUES (1);
+    ''')
+    conn.commit()
+
+
+def sale_quantities(lines):
+    """{sku: total qty} of a bill's (sku, name, qty, unit_price) lines, so each SKU is decremented once."""
+    wanted = {}
+    for sku, _, qty, _ in lines:
+        wanted[sku] = wanted.get(sku, 0) + qty
+    return wanted
+
+
+def scan_stats(conn):
+    """The dashboard counters computed the slow way, straight from the tables."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*), COALESCE(SUM(quantity < reorder_level), 0) FROM products")
+    product_count, low_stock = cursor.fetchone()
+    cursor.execute("""
+        SELECT (SELECT COUNT(*) FROM transactions) + (SELECT COALESCE(SUM(sales_count), 0) FROM archives),
+               (SELECT COALESCE(SUM(total), 0.0) FROM transactions) + (SELECT COALESCE(SUM(revenue), 0.0) FROM archives)
+    """)
+    sales_count, revenue = cursor.fetchone()
+    return product_count, low_stock, sales_count, revenue
+
+
+def rebuild_stats(conn):
+    """Resets the stats row to a fresh full scan of products and transactions."""
+    with conn:
+        conn.execute("UPDATE stats SET product_count = ?, low_stock_count = ?, sales_count = ?, revenue = ? WHERE id = 1",
+                     scan_stats(conn))
+
+
+def check_stats(conn):
+    """Compares the stored counters with a full scan.
+
+    Returns {counter name: (stored, actual)} for every counter that disagrees
+    (revenue to within half a cent); an empty dict means they are consistent.
+    """
+    stored = conn.execute("SELECT product_count, low_stock_count, sales_count, revenue FROM stats WHERE id = 1").fetchone()
+    actual = scan_stats(conn)
+    names = ("product_count", "low_stock_count", "sales_count", "revenue")
+    mismatches = {}
+    for name, have, want in zip(names, stored, actual):
+        if (abs(have - want) >= 0.005) if name == "revenue" else have != want:
+            mismatches[name] = (have, want)
+    return mismatches
+
+
+def setup_search_index(conn):
+    """Creates the full-text product search index, if this SQLite supports it.
+
+    products_fts is an FTS5 external-content table over products(sku, name)
+    using the trigram tokenizer, so any substring of 3+ characters is an index
+    lookup rather than a LIKE scan. Triggers keep it in step with the products
+    table. Returns False when FTS5 or the trigram tokenizer is not compiled in;
+    searches then fall back to LIKE.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")
+    exists = cursor.fetchone() is not None
+    try:
+        cursor.execute("CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(sku, name, content='products', tokenize='trigram')")
+    except sqlite3.OperationalError:
+        return False
+
+    cursor.executescript('''
+        CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, sku, name) VALUES (new.rowid, new.sku, new.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, sku, name) VALUES ('delete', old.rowid, old.sku, old.name);
+        END;
+        CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF sku, name ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, sku, name) VALUES ('delete', old.rowid, old.sku, old.name);
+            INSERT INTO products_fts(rowid, sku, name) VALUES (new.rowid, new.sku, new.name);
+        END;
+    ''')
+    if not exists:
+        # Index the products that were there before the index existed
+        cursor.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+    conn.commit()
+    return True
+
+
+def rebuild_sales_daily(conn):
+    """Recomputes the sales_daily rollup from the full transaction history.
+
+    Days in archived years keep their rows: their transactions are no longer in
+    this file, and the archives are read-only.
+    """
+    cursor = conn.cursor()
+    cursor.execute("BEGIN")
+    try:
+        cursor.execute("DELETE FROM sales_daily WHERE CAST(strftime('%Y', day) AS INTEGER) NOT IN (SELECT year FROM archives)")
+        cursor.execute('''
+            INSERT INTO sales_daily (day, revenue, tx_count, units)
+            SELECT DATE(t.created_at), SUM(t.total), COUNT(*), SUM(COALESCE(i.units, 0))
+            FROM transactions t
+            LEFT JOIN (SELECT transaction_id, SUM(qty) AS units FROM transaction_items GROUP BY transaction_id) i
+                   ON i.transaction_id = t.id
+            GROUP BY DATE(t.created_at)
+        ''')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate_transaction_items(conn, chunk_size=5000):
+    """Moves the legacy JSON 'items' blobs into the transaction_items table.
+
+    Transactions are read in id order, one chunk at a time, so memory stays flat
+    no matter how many sales the file holds. The whole conversion runs inside a
+    single SQLite transaction: it either completes or leaves the file untouched.
+    Legacy items only stored the product name, so the SKU and unit price are
+    resolved against the current catalog (NULL / 0.0 for products since deleted).
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT name, sku, price FROM products")
+    catalog = {name: (sku, price) for name, sku, price in cursor.fetchall()}
+
+    # Dropping the old transactions table must not cascade into the line items
+    # just copied out of it. The pragma only takes effect outside a transaction.
+    cursor.execute("PRAGMA foreign_keys = OFF")
+    cursor.execute("BEGIN")
+    try:
+        last_id = 0
+        while True:
+            cursor.execute("SELECT id, items FROM transactions WHERE id > ? ORDER BY id LIMIT ?",
+                           (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            line_items = []
+            for tid, items_json in rows:
+                try:
+                    items = json.loads(items_json) if items_json else []
+                except ValueError:
+                    items = []
+                for it in items:
+                    name = it.get("name", "Unknown")
+                    sku, price = catalog.get(name, (None, 0.0))
+                    line_items.append((tid, sku, name, int(it.get("quantity", 0)), price))
+            cursor.executemany("INSERT INTO transaction_items (transaction_id, sku, name, qty, unit_price) VALUES (?, ?, ?, ?, ?)",
+                               line_items)
+            last_id = rows[-1][0]
+
+        # Rebuild the transactions table without the JSON column (ids are preserved)
+        cursor.execute('''
+            CREATE TABLE transactions_new (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                total REAL NOT NULL,
+                created_at TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("INSERT INTO transactions_new (id, total, created_at) SELECT id, total, created_at FROM transactions")
+        cursor.execute("DROP TABLE transactions")
+        cursor.execute("ALTER TABLE transactions_new RENAME TO transactions")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.execute("PRAGMA foreign_keys = ON")
+
+
+class StaleVersion(Exception):
+    """An update named a row version that is no longer current; nothing was written.
+
+    'current' is the row as it is now, (sku, name, price, quantity, version).
+    """
+
+    def __init__(self, current):
+        super().__init__(f"'{current[0]}' was changed by someone else (now at version {current[4]})")
+        self.current = current
+
+
+class InsufficientStock(Exception):
+    """A checkout asked for more units than are in stock; nothing was written.
+
+    'shortfalls' lists (sku, name, requested, available) per short product.
+    """
+
+    def __init__(self, shortfalls):
+        super().__init__(", ".join(f"'{name}': requested {requested}, available {available}"
+                                   for _, name, requested, available in shortfalls) or "Insufficient stock")
+        self.shortfalls = shortfalls
+
+
+class PagedQuery:
+    """Keyset-paginated, SQL-sorted view over one table, used by the virtual lists.
+
+    'select' must produce the display columns in order. 'columns' maps each
+    display column to the SQL expression it sorts by (None when the column is
+    not sortable). 'tiebreak' is (expression, row index) of a unique column that
+    orders rows with equal sort values, so every page can be fetched with a seek
+    predicate on (sort value, tiebreak) instead of scanning past an OFFSET.
+    'connect' returns the connection to run on (default: the thread's db.conn).
+    """
+
+    def __init__(self, db, select, count_sql, columns, tiebreak, sort, descending=False, connect=None):
+        self.db = db
+        self.connect = connect or (lambda: db.conn)
+        self.select = select
+        self.count_sql = count_sql
+        self.columns = columns
+        self.tiebreak = tiebreak
+        self.sort = sort
+        self.descending = descending
+
+    def sortable(self, column):
+        return self.columns.get(column) is not None
+
+    def set_sort(self, column, descending=False):
+        if not self.sortable(column):
+            raise ValueError(f"Column '{column}' cannot be sorted")
+        self.sort = column
+        self.descending = descending
+
+    def key(self, row):
+        """The (sort value, tiebreak) seek key of a row returned by this query."""
+        return row[list(self.columns).index(self.sort)], row[self.tiebreak[1]]
+
+    def _order(self, reverse=False):
+        direction = "DESC" if self.descending != reverse else "ASC"
+        return f"ORDER BY {self.columns[self.sort]} {direction}, {self.tiebreak[0]} {direction}"
+
+    def _seek(self, forward):
+        op = ">" if forward != self.descending else "<"
+        return f"WHERE ({self.columns[self.sort]}, {self.tiebreak[0]}) {op} (?, ?)"
+
+    def count(self):
+        return self.connect().execute(self.count_sql).fetchone()[0]
+
+    def fetch_at(self, offset, limit):
+        """Rows starting at an absolute position (used for scrollbar jumps)."""
+        sql = f"{self.select} {self._order()} LIMIT ? OFFSET ?"
+        return self.connect().execute(sql, (limit, max(0, offset))).fetchall()
+
+    def fetch_after(self, key, limit):
+        """Up to 'limit' rows that follow the row with the given key."""
+        sql = f"{self.select} {self._seek(True)} {self._order()} LIMIT ?"
+        return self.connect().execute(sql, (*key, limit)).fetchall()
+
+    def fetch_before(self, key, limit):
+        """Up to 'limit' rows that precede the row with the given key, in display order."""
+        sql = f"{self.select} {self._seek(False)} {self._order(reverse=True)} LIMIT ?"
+        rows = self.connect().execute(sql, (*key, limit)).fetchall()
+        rows.reverse()
+        return rows
+
+
+class Database:
+    """Owns the application's SQLite connections and all of its queries.
+
+    Each thread that touches the database gets its own connection, opened on
+    first use and kept for the lifetime of the Database, so background workers
+    can run queries without sharing the GUI thread's connection.
+
+    Every write publishes a change event on 'self.events' once it has committed.
+    With a metrics.Metrics in 'metrics', every statement is timed (see metrics.py).
+    """
+
+    def __init__(self, path, events=None, metrics=None):
+        self.path = path
+        self.events = events or EventBus()
+        self.metrics = metrics
+        self._has_search_index = None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    # --- Connection management ---
+    def connect(self):
+        """Opens a new, tuned connection to the database file.
+
+        URI filenames are enabled so archives can be ATTACHed with mode=ro; a
+        plain path (one not starting with 'file:') is still just a path.
+        """
+        if self.metrics is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE, uri=True)
+        else:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, cached_statements=STATEMENT_CACHE_SIZE, uri=True,
+                                   factory=TimedConnection)
+            conn.metrics = self.metrics
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    @property
+    def conn(self):
+        """The calling thread's long-lived connection."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self.connect()
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def close(self):
+        """Closes every connection opened by this Database."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass  # Owned by a thread that has already finished
+        self._local = threading.local()
+
+    def setup(self):
+        """Creates (or migrates) the schema."""
+        setup_schema(self.conn)
+
+    # --- Dashboard ---
+    def dashboard_stats(self):
+        """Returns (product_count, low_stock_count, sales_count, revenue)."""
+        return self.conn.execute("SELECT product_count, low_stock_count, sales_count, revenue FROM stats WHERE id = 1").fetchone()
+
+    def check_stats(self):
+        return check_stats(self.conn)
+
+    def rebuild_stats(self):
+        rebuild_stats(self.conn)
+
+    # --- Products ---
+    def products_query(self):
+        """A PagedQuery over the catalog for the Products tab, sorted by name."""
+        return PagedQuery(
+            self,
+            select="SELECT sku, name, price, quantity, reorder_level FROM products",
+            count_sql="SELECT COUNT(*) FROM products",
+            columns={"SKU": "sku", "Name": "name", "Price": "price", "Quantity": "quantity", "Reorder Level": None},
+            tiebreak=("sku", 0),
+            sort="Name",
+        )
+
+    def add_product(self, sku, name, price, quantity, reorder_level=LOW_STOCK_THRESHOLD):
+        """Inserts a product. Raises sqlite3.IntegrityError if the SKU exists."""
+        with self.conn:
+            self.conn.execute("INSERT INTO products (sku, name, price, quantity, reorder_level) VALUES (?, ?, ?, ?, ?)",
+                              (sku, name, price, quantity, reorder_level))
+        self.events.publish(ProductAdded(sku, name, price, quantity))
+
+    def set_reorder_level(self, sku, level):
+        """Sets the stock level a product counts as low below. Raises KeyError if it does not exist.
+
+        Crossing the new level queues a stock alert like any other write (see setup_stock_alerts).
+        """
+        conn = self.conn
+        with conn:
+            cursor = conn.execute("UPDATE products SET reorder_level = ?, version = version + 1 WHERE sku = ?",
+                                  (level, sku))
+            row = conn.execute("SELECT sku, name, price, quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+        if cursor.rowcount == 0:
+            raise KeyError(sku)
+        self.events.publish(ProductUpdated(*row))
+
+    def update_product(self, sku, name, price, quantity, version):
+        """Overwrites a product if it is still at 'version'. Returns its new version.
+
+        Raises StaleVersion if another write got there first, and KeyError if
+        the product does not exist.
+        """
+        conn = self.conn
+        with conn:
+            old = conn.execute("SELECT quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+            cursor = conn.execute("""
+                UPDATE products SET name = ?, price = ?, quantity = ?, version = version + 1
+                WHERE sku = ? AND version = ?
+            """, (name, price, quantity, sku, version))
+        if cursor.rowcount == 0:
+            current = self.product_by_sku(sku, with_version=True)
+            if current is None:
+                raise KeyError(sku)
+            raise StaleVersion(current)
+        self.events.publish(ProductUpdated(sku, name, price, quantity))
+        if old[0] != quantity:
+            self.events.publish(StockChanged(((sku, old[0], quantity),)))
+        return version + 1
+
+    def delete_product(self, sku):
+        with self.conn:
+            row = self.conn.execute("SELECT quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+            self.conn.execute("DELETE FROM products WHERE sku = ?", (sku,))
+        if row:
+            self.events.publish(ProductRemoved(sku, row[0]))
+
+    def import_products(self, rows, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+        """Upserts (sku, name, price, quantity[, reorder_level]) rows from any iterable, a chunk at a time.
+
+        Rows without a reorder level (or with None) keep the product's current
+        one, or get the default if the product is new.
+
+        Each chunk is one executemany and one commit, so memory stays flat
+        whatever the input size and an interrupted import keeps the chunks that
+        were already committed. progress(rows_done) is called after each chunk.
+        Publishes a single ProductsImported at the end instead of one event per
+        row. Returns (inserted, updated).
+        """
+        conn = self.conn
+        rows = iter(rows)
+        before = conn.execute("SELECT product_count FROM stats WHERE id = 1").fetchone()[0]
+        done = 0
+        try:
+            for chunk in iter(lambda: list(itertools.islice(rows, chunk_size)), []):
+                with conn:
+                    conn.executemany(PRODUCT_UPSERT, (row if len(row) == 5 else (*row, None) for row in chunk))
+                done += len(chunk)
+                if progress is not None:
+                    progress(done)
+        finally:
+            inserted = conn.execute("SELECT product_count FROM stats WHERE id = 1").fetchone()[0] - before
+            if done:
+                self.events.publish(ProductsImported(inserted, done - inserted))
+        return inserted, done - inserted
+
+    def iter_products(self, batch_size=EXPORT_BATCH_SIZE):
+        """Yields every product as (sku, name, price, quantity, reorder_level), in SKU order, a batch at a time."""
+        cursor = self.conn.execute("SELECT sku, name, price, quantity, reorder_level FROM products ORDER BY sku")
+        for batch in iter(lambda: cursor.fetchmany(batch_size), []):
+            yield from batch
+
+    @property
+    def has_search_index(self):
+        if self._has_search_index is None:
+            row = self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'").fetchone()
+            self._has_search_index = row is not None
+        return self._has_search_index
+
+    def rebuild_search_index(self):
+        """Re-indexes every product (e.g. after a VACUUM renumbered rowids)."""
+        if self.has_search_index:
+            with self.conn:
+                self.conn.execute("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+
+    def search_products(self, term, limit=SEARCH_LIMIT):
+        """Products matching 'term' in their SKU or name, best matches first.
+
+        Results are an exact SKU hit, then names starting with the term (an
+        index range on products.name), then any other substring match from the
+        trigram index. Every step stops at 'limit' rows, so a common term costs
+        no more than a rare one. Terms under 3 characters (and databases without
+        the index) fall back to a LIKE scan that also stops at 'limit' rows.
+        """
+        term = term.strip()
+        conn = self.conn
+        if not term:
+            return conn.execute("SELECT sku, name, price, quantity FROM products ORDER BY name, sku LIMIT ?",
+                                (limit,)).fetchall()
+        if len(term) < 3 or not self.has_search_index:
+            pattern = f'%{term}%'
+            return conn.execute("SELECT sku, name, price, quantity FROM products WHERE name LIKE ? OR sku LIKE ? LIMIT ?",
+                                (pattern, pattern, limit)).fetchall()
+
+        results = {}
+        for row in conn.execute("SELECT sku, name, price, quantity FROM products WHERE sku = ?", (term,)):
+            results[row[0]] = row
+        for row in conn.execute("SELECT sku, name, price, quantity FROM products WHERE name >= ? AND name < ? ORDER BY name LIMIT ?",
+                                (term, term + '\U0010ffff', limit)):
+            results.setdefault(row[0], row)
+        if len(results) < limit:
+            phrase = '"' + term.replace('"', '""') + '"'
+            for row in conn.execute("""
+                SELECT p.sku, p.name, p.price, p.quantity
+                FROM products_fts f
+                JOIN products p ON p.rowid = f.rowid
+                WHERE products_fts MATCH ?
+                LIMIT ?
+            """, (phrase, limit)):
+                results.setdefault(row[0], row)
+                if len(results) >= limit:
+                    break
+        return list(results.values())[:limit]
+
+    def product_by_sku(self, sku, with_version=False):
+        """(sku, name, price, quantity) of one product, or None: a single primary-key lookup.
+
+        with_version=True appends the row version.
+        """
+        if with_version:
+            return self.conn.execute("SELECT sku, name, price, quantity, version FROM products WHERE sku = ?",
+                                     (sku,)).fetchone()
+        return self.conn.execute("SELECT sku, name, price, quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+
+    # --- Low Stock ---
+    def low_stock_products(self, limit=10):
+        """(name, quantity) of products below their reorder level, lowest stock first."""
+        return self.conn.execute("SELECT name, quantity FROM low_stock ORDER BY quantity, sku LIMIT ?",
+                                 (limit,)).fetchall()
+
+    def low_stock_query(self):
+        """A PagedQuery over the products below their reorder level, for the Dashboard's low-stock panel.
+
+        Pages are read from idx_products_low_stock through the low_stock view
+        and the row count comes from the stats row, so the cost follows the
+        page size, not the catalog. Only the stock column sorts: the others
+        would walk indexes over every product.
+        """
+        return PagedQuery(
+            self,
+            select="SELECT sku, name, quantity, reorder_level FROM low_stock",
+            count_sql="SELECT low_stock_count FROM stats WHERE id = 1",
+            columns={"SKU": None, "Name": None, "Stock": "quantity", "Reorder Level": None},
+            tiebreak=("sku", 0),
+            sort="Stock",
+        )
+
+    def stock_alerts(self, after=0, limit=ALERT_LIMIT):
+        """The latest 'limit' queued stock alerts newer than id 'after', oldest first.
+
+        Rows are (id, sku, name, quantity, reorder_level, low, created_at).
+        Callers pass the last id they have seen, so a poll is a primary-key
+        range read that returns nothing when nothing crossed; if more than
+        'limit' alerts came in since, the older ones are skipped.
+        """
+        rows = self.conn.execute("""
+            SELECT id, sku, name, quantity, reorder_level, low, created_at FROM stock_alerts
+            WHERE id > ? ORDER BY id DESC LIMIT ?
+        """, (after, limit)).fetchall()
+        rows.reverse()
+        return rows
+
+    # --- Sales ---
+    def checkout(self, lines, total):
+        """Atomically sells a bill: guarded stock decrements plus the transaction record.
+
+        'lines' is a list of (sku, name, qty, unit_price) tuples. BEGIN IMMEDIATE
+        takes the write lock up front, so no other terminal can change stock
+        between the check and the decrement. Every line is decremented with
+        'quantity = quantity - qty ... AND quantity >= qty' in one executemany;
+        if fewer rows changed than there are lines, some product was short and
+        the whole sale is rolled back with InsufficientStock. Returns the new
+        transaction id.
+        """
+        wanted = sale_quantities(lines)
+        conn = self.conn
+        cursor = conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            if not self._decrement_stock(cursor, wanted):
+                conn.rollback()
+                raise InsufficientStock(self._shortfalls(lines, wanted))
+            created_at = datetime.datetime.now().isoformat()
+            tid, units, changes = self._record_sale(cursor, lines, wanted, total, created_at)
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        self.events.publish(StockChanged(tuple(changes)))
+        self.events.publish(TransactionRecorded(tid, total, created_at, units,
+                                                tuple((name, qty, price) for _, name, qty, price in lines)))
+        return tid
+
+    def apply_sales(self, sales):
+        """Writes a batch of journaled sales in one transaction (see journal.py).
+
+        'sales' are (seq, created_at, lines, total) tuples in journal order.
+        Each sale gets the same guarded decrement as checkout(). The customer
+        has already paid for a journaled sale, so one that comes up short (its
+        stock was sold by another process after it was journaled) is still
+        written: its decrement is redone unguarded, taking those products
+        below zero, and the sale is reported as oversold.
+        journal_state.applied_seq moves to the batch's last seq in the same
+        transaction.
+
+        The transaction is left open: the caller commits or rolls back, then
+        publishes the events. Returns (recorded, oversold): recorded holds
+        (seq, tid, total, created_at, units, changes) per sale and oversold
+        holds (tid, shortfalls) per sale that came up short.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        recorded, oversold = [], []
+        for seq, created_at, lines, total in sales:
+            wanted = sale_quantities(lines)
+            cursor.execute("SAVEPOINT sale")
+            shortfalls = None
+            if not self._decrement_stock(cursor, wanted):
+                cursor.execute("ROLLBACK TO sale")
+                shortfalls = self._shortfalls(lines, wanted)
+                cursor.executemany("UPDATE products SET quantity = quantity - ?, version = version + 1 WHERE sku = ?",
+                                   [(qty, sku) for sku, qty in wanted.items()])
+            tid, units, changes = self._record_sale(cursor, lines, wanted, total, created_at)
+            recorded.append((seq, tid, total, created_at, units, changes))
+            if shortfalls is not None:
+                oversold.append((tid, shortfalls))
+            cursor.execute("RELEASE sale")
+        cursor.execute("UPDATE journal_state SET applied_seq = ? WHERE id = 1", (sales[-1][0],))
+        return recorded, oversold
+
+    def journal_applied_seq(self):
+        return self.conn.execute("SELECT applied_seq FROM journal_state WHERE id = 1").fetchone()[0]
+
+    def _decrement_stock(self, cursor, wanted):
+        """Guarded 'quantity = quantity - qty ... AND quantity >= qty' per SKU; False if any was short."""
+        cursor.executemany("UPDATE products SET quantity = quantity - ?, version = version + 1 WHERE sku = ? AND quantity >= ?",
+                           [(qty, sku, qty) for sku, qty in wanted.items()])
+        return cursor.rowcount == len(wanted)
+
+    def _record_sale(self, cursor, lines, wanted, total, created_at):
+        """Inserts the transaction, its lines and the rollup delta. Returns (tid, units, stock changes)."""
+        cursor.execute("INSERT INTO transactions (total, created_at) VALUES (?, ?)", (total, created_at))
+        tid = cursor.lastrowid
+        cursor.executemany("INSERT INTO transaction_items (transaction_id, sku, name, qty, unit_price) VALUES (?, ?, ?, ?, ?)",
+                           [(tid, sku, name, qty, unit_price) for sku, name, qty, unit_price in lines])
+        units = sum(wanted.values())
+        cursor.execute(SALES_DAILY_ADD, (created_at, total, 1, units))
+        changes = []
+        for sku, qty in wanted.items():
+            row = cursor.execute("SELECT quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+            if row is not None:  # An oversold journaled sale can name a product deleted since
+                changes.append((sku, row[0] + qty, row[0]))
+        return tid, units, changes
+
+    def _shortfalls(self, lines, wanted):
+        """(sku, name, requested, available) for each product the sale could not cover."""
+        names = {sku: name for sku, name, _, _ in lines}
+        shortfalls = []
+        for sku, qty in wanted.items():
+            row = self.conn.execute("SELECT quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+            available = row[0] if row else 0
+            if qty > available:
+                shortfalls.append((sku, names[sku], qty, available))
+        return shortfalls
+
+    def top_sellers(self, recent=50, limit=10):
+        """Top products by units across the 'recent' most recent transactions."""
+        return self.conn.execute("""
+            SELECT i.name, SUM(i.qty) AS units
+            FROM transaction_items i
+            WHERE i.transaction_id IN (SELECT id FROM transactions ORDER BY created_at DESC LIMIT ?)
+            GROUP BY COALESCE(i.sku, i.name)
+            ORDER BY units DESC
+            LIMIT ?
+        """, (recent, limit)).fetchall()
+
+    def revenue_by_day(self, start_date, end_date):
+        """Returns [(day, revenue)] for each day with sales between the two dates.
+
+        Reads the sales_daily rollup, so a year costs at most 365 rows however
+        many transactions it holds.
+        """
+        return self.conn.execute("""
+            SELECT day, revenue
+            FROM sales_daily
+            WHERE day BETWEEN ? AND ? AND tx_count > 0
+            ORDER BY day
+        """, (start_date.isoformat(), end_date.isoformat())).fetchall()
+
+    def revenue_by_period(self, start_date, end_date, bucket="day"):
+        """Like revenue_by_day, but summed into 'day', 'week' (from Monday) or 'month' buckets.
+
+        Each row is (first day of the bucket, revenue), so long ranges come back
+        as a few dozen points instead of one per day.
+        """
+        if bucket == "day":
+            return self.revenue_by_day(start_date, end_date)
+        return self.conn.execute(f"""
+            SELECT {SALES_BUCKETS[bucket]} AS period, SUM(revenue)
+            FROM sales_daily
+            WHERE day BETWEEN ? AND ? AND tx_count > 0
+            GROUP BY period
+            ORDER BY period
+        """, (start_date.isoformat(), end_date.isoformat())).fetchall()
+
+    def first_sale_day(self):
+        """The earliest day with sales (a datetime.date), or None if nothing was sold yet."""
+        row = self.conn.execute("SELECT MIN(day) FROM sales_daily WHERE tx_count > 0").fetchone()
+        return datetime.date.fromisoformat(row[0]) if row[0] else None
+
+    def data_version(self):
+        """(products, sales) change counters; see setup_data_version."""
+        return self.conn.execute("SELECT products, sales FROM data_version WHERE id = 1").fetchone()
+
+    def sales_version(self):
+        """A value that changes whenever the sales history does, for caching derived series.
+
+        Read from the trigger-maintained stats row plus the newest transaction id
+        (AUTOINCREMENT ids are never reused), so it costs two indexed reads.
+        """
+        count, revenue = self.conn.execute("SELECT sales_count, revenue FROM stats WHERE id = 1").fetchone()
+        last_id = self.conn.execute("SELECT MAX(id) FROM transactions").fetchone()[0]
+        return count, last_id, round(revenue, 2)
+
+    def rebuild_sales_daily(self):
+        rebuild_sales_daily(self.conn)
+
+    # --- Archives ---
+    def archives(self):
+        """[(year, path, sales_count, revenue)] for each archived year, oldest first."""
+        rows = self.conn.execute("SELECT year, path, sales_count, revenue FROM archives ORDER BY year").fetchall()
+        return [(year, self.archive_path(path), count, revenue) for year, path, count, revenue in rows]
+
+    def archive_path(self, name):
+        """Where an archive file named in the registry lives: next to the main database."""
+        return os.path.join(os.path.dirname(os.path.abspath(self.path)), name)
+
+    def archive_conn(self):
+        """The thread's connection with every archived year ATTACHed read-only.
+
+        Archives are attached on first use, not when the connection opens, so
+        everyday queries never touch the cold files. Whenever the set of
+        archives changes, the TEMP views all_transactions (id, total,
+        created_at, units) and all_transaction_items are recreated as the hot
+        table UNION ALL each archive's copy. SQLite attaches at most 10 databases by default.
+        """
+        conn = self.conn
+        archives = [(year, path) for year, path, _, _ in self.archives()]
+        attached = getattr(self._local, "archives", None)  # None: views not created yet on this connection
+        if archives == attached:
+            return conn
+        attached = attached or []
+        for year, path in archives:
+            if (year, path) not in attached:
+                uri = pathlib.Path(path).absolute().as_uri() + "?mode=ro"
+                conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA.format(year=year)}", (uri,))
+        schemas = ["main"] + [ARCHIVE_SCHEMA.format(year=year) for year, _ in archives]
+        # Each arm counts its own units, so the count is one index lookup in the
+        # right file instead of a probe into the union of every file's items
+        transactions = " UNION ALL ".join(f"""
+            SELECT t.id, t.total, t.created_at,
+                   (SELECT COALESCE(SUM(i.qty), 0) FROM {schema}.transaction_items i WHERE i.transaction_id = t.id) AS units
+            FROM {schema}.transactions t""" for schema in schemas)
+        items = " UNION ALL ".join(f"SELECT id, transaction_id, sku, name, qty, unit_price FROM {schema}.transaction_items"
+                                   for schema in schemas)
+        conn.executescript(f"""
+            DROP VIEW IF EXISTS temp.all_transactions;
+            DROP VIEW IF EXISTS temp.all_transaction_items;
+            CREATE TEMP VIEW all_transactions AS {transactions};
+            CREATE TEMP VIEW all_transaction_items AS {items};
+        """)
+        self._local.archives = archives
+        return conn
+
+    # --- Transactions ---
+    def transactions_query(self, include_archived=False):
+        """A PagedQuery over the sales history for the Transactions tab, newest first.
+
+        With include_archived, it reads hot and archived sales through the
+        all_transactions views (see archive_conn).
+        """
+        if include_archived:
+            select = "SELECT t.id, t.total, t.created_at, t.units FROM all_transactions t"
+            count_sql = "SELECT COUNT(*) FROM all_transactions"
+        else:
+            select = """
+                SELECT t.id, t.total, t.created_at,
+                       (SELECT COALESCE(SUM(i.qty), 0) FROM transaction_items i WHERE i.transaction_id = t.id)
+                FROM transactions t
+            """
+            count_sql = "SELECT COUNT(*) FROM transactions"
+        return PagedQuery(
+            self,
+            select=select,
+            count_sql=count_sql,
+            columns={"ID": "t.id", "Total": "t.total", "Created At": "t.created_at", "Items Count": None},
+            tiebreak=("t.id", 0),
+            sort="Created At",
+            descending=True,
+            connect=self.archive_conn if include_archived else None,
+        )
+
+    def iter_transaction_items(self, batch_size=EXPORT_BATCH_SIZE, include_archived=False):
+        """Yields one (id, created_at, total, sku, name, qty, unit_price) row per sold line, oldest sale first."""
+        if include_archived:
+            conn, transactions, items = self.archive_conn(), "all_transactions", "all_transaction_items"
+        else:
+            conn, transactions, items = self.conn, "transactions", "transaction_items"
+        cursor = conn.execute(f"""
+            SELECT t.id, t.created_at, t.total, i.sku, i.name, i.qty, i.unit_price
+            FROM {transactions} t JOIN {items} i ON i.transaction_id = t.id
+            ORDER BY t.id, i.id
+        """)
+        for batch in iter(lambda: cursor.fetchmany(batch_size), []):
+            yield from batch
+
+    def transaction_details(self, tid):
+        """Returns ((total, created_at), [(name, qty, unit_price)]) or (None, []).
+
+        Sales that are not in this file are looked up in the archives.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT total, created_at FROM transactions WHERE id = ?", (tid,))
+        header = cursor.fetchone()
+        if header is None and self.archives():
+            cursor = self.archive_conn().cursor()
+            cursor.execute("SELECT total, created_at FROM all_transactions WHERE id = ?", (tid,))
+            header = cursor.fetchone()
+            cursor.execute("SELECT name, qty, unit_price FROM all_transaction_items WHERE transaction_id = ? ORDER BY id", (tid,))
+            return header, cursor.fetchall()
+        cursor.execute("SELECT name, qty, unit_price FROM transaction_items WHERE transaction_id = ? ORDER BY id", (tid,))
+        return header, cursor.fetchall()
+
+    def delete_transaction(self, tid):
+        """Deletes a sale from this file. Raises ValueError for an archived (read-only) sale."""
+        if self.archives() and self.conn.execute("SELECT 1 FROM transactions WHERE id = ?", (tid,)).fetchone() is None:
+            if self.archive_conn().execute("SELECT 1 FROM all_transactions WHERE id = ?", (tid,)).fetchone():
+                raise ValueError(f"Transaction {tid} is archived; archived sales are read-only.")
+        with self.conn:
+            row = self.conn.execute("""
+                SELECT total, created_at,
+                       (SELECT COALESCE(SUM(qty), 0) FROM transaction_items WHERE transaction_id = ?)
+                FROM transactions WHERE id = ?
+            """, (tid, tid)).fetchone()
+            if row:
+                total, created_at, units = row
+                self.conn.execute(SALES_DAILY_ADD, (created_at, -total, -1, -units))
+            self.conn.execute("DELETE FROM transaction_items WHERE transaction_id = ?", (tid,))
+            self.conn.execute("DELETE FROM transactions WHERE id = ?", (tid,))
+        if row:
+            self.events.publish(TransactionDeleted(tid, row[0]))
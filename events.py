@@ -0,0 +1,102 @@
+from collections import defaultdict
+from dataclasses import dataclass
+
+# --- CHANGE EVENTS ---
+# Database writes publish one of these after they commit. Tabs subscribe to the
+# ones they care about and patch their own widgets instead of reloading
+# everything, so the cost of a refresh follows the size of the change.
+
+
+@dataclass(frozen=True)
+class ProductAdded:
+    sku: str
+    name: str
+    price: float
+    quantity: int
+
+
+@dataclass(frozen=True)
+class ProductRemoved:
+    sku: str
+    quantity: int
+
+
+@dataclass(frozen=True)
+class ProductUpdated:
+    # A product's details were overwritten (its stock, if it moved, also comes as StockChanged)
+    sku: str
+    name: str
+    price: float
+    quantity: int
+
+
+@dataclass(frozen=True)
+class ProductsImported:
+    # A bulk import: too many rows to patch one by one, so views reload once
+    inserted: int
+    updated: int
+
+
+@dataclass(frozen=True)
+class StockChanged:
+    # One (sku, old_quantity, new_quantity) entry per product whose stock moved
+    changes: tuple
+
+
+@dataclass(frozen=True)
+class TransactionRecorded:
+    tid: int
+    total: float
+    created_at: str
+    units: int
+    lines: tuple = ()  # (name, qty, unit_price) per sold line, for the receipt
+
+
+@dataclass(frozen=True)
+class TransactionDeleted:
+    tid: int
+    total: float
+
+
+@dataclass(frozen=True)
+class TransactionsArchived:
+    # A closed year moved out to its archive file (see archive.py)
+    year: int
+    sales_count: int
+
+
+@dataclass(frozen=True)
+class SaleOversold:
+    # A journaled sale recorded although the stock no longer covered it when it was applied,
+    # so those products went below zero (see journal.py); 'shortfalls' lists
+    # (sku, name, requested, available) as in InsufficientStock
+    tid: int
+    shortfalls: tuple
+
+
+class EventBus:
+    """Minimal publish/subscribe hub keyed by event class.
+
+    Handlers run synchronously unless a 'dispatch' function is set, in which
+    case each call goes through dispatch(handler, event). The GUI uses this to
+    move handlers onto the Tk thread when a background worker did the write.
+    Handlers subscribed with direct=True always run on the publishing thread,
+    for thread-safe handlers that must not wait for (or outlive) the Tk loop.
+    """
+
+    def __init__(self, dispatch=None):
+        self._handlers = defaultdict(list)
+        self.dispatch = dispatch
+
+    def subscribe(self, event_type, handler, direct=False):
+        self._handlers[event_type].append((handler, direct))
+
+    def unsubscribe(self, event_type, handler):
+        self._handlers[event_type] = [entry for entry in self._handlers[event_type] if entry[0] != handler]
+
+    def publish(self, event):
+        for handler, direct in list(self._handlers[type(event)]):
+            if self.dispatch is not None and not direct:
+                self.dispatch(handler, event)
+            else:
+                handler(event)
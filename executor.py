@@ -0,0 +1,148 @@
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# --- BACKGROUND EXECUTOR ---
+# Database queries, aggregations and HTTP calls run on a small thread pool so
+# the Tk mainloop never waits on them. Tk is not thread-safe, so workers never
+# touch widgets: their results go through a queue that the Tk thread drains on
+# a short root.after() timer, and the callbacks run there.
+
+POLL_INTERVAL_MS = 20
+
+
+class TaskCancelled(Exception):
+    """Raised by Task.check() inside a worker once the task has been cancelled."""
+
+
+class Task:
+    """Handle for one piece of submitted work."""
+
+    def __init__(self, key, timeout):
+        self.key = key
+        self.deadline = time.monotonic() + timeout if timeout else None
+        self.future = None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Drops the task: it is not started if still queued, and its result is discarded."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def check(self):
+        """For long-running work functions: stop early once the task is cancelled."""
+        if self.cancelled:
+            raise TaskCancelled()
+
+
+class BackgroundExecutor:
+    """Runs blocking work off the Tk thread and delivers results back onto it.
+
+    submit() returns a Task. 'on_done' receives the work function's result and
+    'on_error' its exception (including TimeoutError once 'timeout' seconds
+    pass); both run on the Tk thread and neither runs for a cancelled task.
+    Tasks submitted with a 'key' supersede any earlier, unfinished task with the
+    same key, so only the newest search or chart request ever reports back.
+    With pass_task=True the work function also receives its Task as a 'task'
+    keyword argument, so long loops can call task.check() to stop early.
+    """
+
+    def __init__(self, root, max_workers=4):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stockdesk-worker")
+        self._completed = queue.SimpleQueue()
+        self._pending = {}        # Task -> (on_done, on_error)
+        self._latest = {}         # key -> Task
+        self._main_thread = threading.current_thread()
+        self._after_id = self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None, timeout=None, pass_task=False):
+        task = Task(key, timeout)
+        if key is not None:
+            previous = self._latest.get(key)
+            if previous is not None:
+                previous.cancel()
+                self._pending.pop(previous, None)
+            self._latest[key] = task
+        self._pending[task] = (on_done, on_error)
+        kwargs = {"task": task} if pass_task else {}
+        task.future = self._pool.submit(self._run, task, fn, args, kwargs)
+        return task
+
+    def call_in_main(self, fn, *args):
+        """Runs fn(*args) on the Tk thread: now if already there, else on the next poll."""
+        if threading.current_thread() is self._main_thread:
+            fn(*args)
+        else:
+            self._completed.put((None, fn, args))
+
+    def cancel(self, key):
+        task = self._latest.pop(key, None)
+        if task is not None:
+            task.cancel()
+            self._pending.pop(task, None)
+
+    def is_pending(self, task):
+        """True until the task has reported back, timed out or been cancelled."""
+        return task in self._pending
+
+    def shutdown(self):
+        for task in list(self._pending):
+            task.cancel()
+        self._pending.clear()
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+        self._pool.shutdown(wait=False)
+
+    def _run(self, task, fn, args, kwargs):
+        if task.cancelled:
+            return
+        try:
+            result = fn(*args, **kwargs)
+        except TaskCancelled:
+            return
+        except Exception as e:
+            self._completed.put((task, False, e))
+        else:
+            self._completed.put((task, True, result))
+
+    def _finish(self, task):
+        callbacks = self._pending.pop(task, (None, None))
+        if task.key is not None and self._latest.get(task.key) is task:
+            del self._latest[task.key]
+        return callbacks
+
+    def _poll(self):
+        # Reschedule first so an exception in a callback cannot stop the loop
+        self._after_id = self.root.after(POLL_INTERVAL_MS, self._poll)
+
+        now = time.monotonic()
+        for task in [t for t in self._pending if t.deadline is not None and now > t.deadline]:
+            task.cancel()
+            _, on_error = self._finish(task)
+            if on_error is not None:
+                on_error(TimeoutError("The operation timed out."))
+
+        while True:
+            try:
+                task, ok, value = self._completed.get_nowait()
+            except queue.Empty:
+                break
+            if task is None:
+                ok(*value)  # call_in_main(): (None, fn, args)
+                continue
+            if task.cancelled or task not in self._pending:
+                self._pending.pop(task, None)
+                continue
+            on_done, on_error = self._finish(task)
+            if ok and on_done is not None:
+                on_done(value)
+            elif not ok and on_error is not None:
+                on_error(value)
@@ -0,0 +1,134 @@
+import datetime
+import math
+import threading
+
+# --- REORDER FORECAST ---
+# Sales velocity and reorder points for every product at once. The last
+# WINDOW_DAYS of per-SKU unit sales come out of SQLite in one grouped query and
+# land in a (products x days) NumPy matrix; velocity, days of stock remaining,
+# reorder point and suggested order quantity are then whole-array expressions,
+# with no Python loop over products.
+#
+# Forecaster caches the result under the database's data_version() and the
+# date, so the Reorder tab and the AI Assistant share one computation until a
+# sale or a stock change arrives. NumPy is imported on first use, not with the
+# module.
+
+WINDOW_DAYS = 28      # moving-average window for sales velocity
+LEAD_TIME_DAYS = 7    # days between placing an order and the stock arriving
+REVIEW_DAYS = 14      # days an order should cover beyond the lead time
+SERVICE_Z = 1.65      # safety-stock factor (about a 95% chance of not running out)
+
+
+class Forecast:
+    """Per-product forecast arrays, all indexed alike (products in SKU order).
+
+    'velocity' is units sold per day over the window, 'days_left' the days
+    until the current stock runs out at that pace (inf for products that do
+    not sell), 'reorder_point' the stock level at which to order and
+    'order_qty' how much to order now (0 if stock is above the reorder point).
+    """
+
+    def __init__(self, skus, names, quantity, velocity, days_left, reorder_point, order_qty, today):
+        self.skus = skus
+        self.names = names
+        self.quantity = quantity
+        self.velocity = velocity
+        self.days_left = days_left
+        self.reorder_point = reorder_point
+        self.order_qty = order_qty
+        self.today = today
+
+    def __len__(self):
+        return len(self.skus)
+
+    def row(self, i):
+        """(sku, name, quantity, velocity, days_left, reorder_point, order_qty) for product i."""
+        return (str(self.skus[i]), self.names[i], int(self.quantity[i]), float(self.velocity[i]),
+                float(self.days_left[i]), int(self.reorder_point[i]), int(self.order_qty[i]))
+
+    def reorder_list(self, limit=None):
+        """Rows for the products due for reordering, the soonest to run out first."""
+        import numpy as np
+
+        due = np.flatnonzero(self.order_qty > 0)
+        # Ties (e.g. already out of stock) go to the faster seller
+        order = due[np.lexsort((-self.velocity[due], self.days_left[due]))]
+        if limit is not None:
+            order = order[:limit]
+        return [self.row(i) for i in order]
+
+
+def load_daily_units(db, today, days=WINDOW_DAYS):
+    """(skus, days_ago, units) arrays: units sold per SKU per day over the last 'days' days.
+
+    One grouped query over the transactions in the window (found through
+    idx_transactions_created_at); day 0 is 'today'.
+    """
+    import numpy as np
+
+    start = today - datetime.timedelta(days=days - 1)
+    rows = db.conn.execute("""
+        SELECT i.sku, CAST(julianday(?) - julianday(substr(t.created_at, 1, 10)) AS INTEGER) AS ago, SUM(i.qty)
+        FROM transactions t JOIN transaction_items i ON i.transaction_id = t.id
+        WHERE t.created_at >= ? AND t.created_at < ? AND i.sku IS NOT NULL
+        GROUP BY i.sku, ago
+    """, (today.isoformat(), start.isoformat(), (today + datetime.timedelta(days=1)).isoformat())).fetchall()
+    if not rows:
+        return np.array([], dtype=str), np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+    skus, ago, units = zip(*rows)
+    return np.array(skus), np.array(ago, dtype=np.int64), np.array(units, dtype=np.float64)
+
+
+def compute(db, today=None, days=WINDOW_DAYS, lead_time=LEAD_TIME_DAYS, review=REVIEW_DAYS, z=SERVICE_Z):
+    """Builds a Forecast for every product from the last 'days' days of sales."""
+    import numpy as np
+
+    today = today or datetime.date.today()
+    products = db.conn.execute("SELECT sku, name, quantity FROM products ORDER BY sku").fetchall()
+    if products:
+        skus, names, quantity = zip(*products)
+    else:
+        skus, names, quantity = (), (), ()
+    skus = np.array(skus, dtype=str)
+    quantity = np.array(quantity, dtype=np.float64)
+    n = len(skus)
+
+    # Scatter the (sku, day, units) triples into a products x days matrix.
+    # ORDER BY sku is byte order, which for UTF-8 is code point order, as NumPy sorts.
+    sale_skus, ago, units = load_daily_units(db, today, days)
+    index = np.searchsorted(skus, sale_skus) if n else np.zeros(len(sale_skus), dtype=np.int64)
+    known = index < n
+    known[known] = skus[index[known]] == sale_skus[known]  # drop sales of deleted products
+    daily = np.bincount(index[known] * days + ago[known], weights=units[known],
+                        minlength=n * days).reshape(n, days)
+
+    velocity = daily.mean(axis=1)
+    spread = daily.std(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(velocity > 0, np.maximum(quantity, 0) / velocity, np.inf)
+    reorder_point = np.ceil(velocity * lead_time + z * spread * math.sqrt(lead_time))
+    order_qty = np.where((velocity > 0) & (quantity <= reorder_point),
+                         np.ceil(reorder_point + velocity * review - quantity), 0)
+    return Forecast(skus, list(names), quantity, velocity, days_left,
+                    reorder_point.astype(np.int64), order_qty.astype(np.int64), today)
+
+
+class Forecaster:
+    """Computes Forecasts on demand, cached per data version and day."""
+
+    def __init__(self, db):
+        self.db = db
+        self._cached = None  # ((data version, today), Forecast)
+        self._lock = threading.Lock()
+
+    def get(self, today=None):
+        today = today or datetime.date.today()
+        key = (self.db.data_version(), today)
+        with self._lock:
+            if self._cached is not None and self._cached[0] == key:
+                return self._cached[1]
+        forecast = compute(self.db, today)
+        with self._lock:
+            self._cached = (key, forecast)
+        return forecast
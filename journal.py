@@ -0,0 +1,422 @@
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+
+from db import InsufficientStock, sale_quantities
+from events import SaleOversold, StockChanged, TransactionRecorded
+
+# --- SALES JOURNAL ---
+# Checkout appends the sale to an append-only journal file next to the
+# database and returns once that line is on disk; a background thread then
+# writes journaled sales into products/transactions many at a time. Sales
+# arriving together share one fsync (group commit) and one SQLite transaction.
+#
+# Each line is '<json>\t<crc32>'. A crash can leave a torn last line, which
+# fails its checksum and is cut off on the next start(). journal_state in the
+# database records the last applied seq in the same transaction as the sales,
+# so start() replays exactly the entries the database has not seen. Once
+# everything is applied and the file has grown past rotate_bytes, it is
+# truncated (after a checkpoint has made the applied sales durable).
+#
+# Until a sale is applied, its units are 'pending': checkout admits a sale only
+# if database stock minus pending units covers it, and the StockChanged events
+# it publishes carry that projected stock, so the UI never shows units that
+# are already sold.
+#
+# One process owns the journal: start() takes an exclusive OS lock on
+# '<journal>.lock' (released by close(), or by the OS if the process dies) and
+# raises JournalInUse if another process holds it. Other tills on the same
+# database check out through Database.checkout instead. Their sales still take
+# priority, but a journaled sale is already paid for: one they make impossible
+# is recorded anyway, taking the stock below zero, and reported as SaleOversold.
+#
+# A locked database is retried. Any other apply error stops the journal: new
+# checkouts are refused, nothing later is applied out of order, and the sales
+# not applied yet stay in the file for the next start(). on_error(exception)
+# hears about it (and about a failing event listener) on the apply thread.
+
+JOURNAL_SUFFIX = ".sales.jsonl"
+LOCK_SUFFIX = ".lock"            # next to the journal: held by the process that owns it
+GROUP_MAX = 256                  # sales per fsync and per apply transaction
+ROTATE_BYTES = 4 * 1024 * 1024   # truncate the fully applied journal past this size
+APPLY_RETRY_DELAY = 0.05         # seconds before retrying a failed apply (doubles up to 2s)
+
+
+def encode_entry(seq, created_at, lines, total):
+    body = json.dumps([seq, created_at, lines, total], ensure_ascii=False, separators=(",", ":"))
+    return f"{body}\t{zlib.crc32(body.encode('utf-8')):08x}\n".encode("utf-8")
+
+
+class JournalInUse(RuntimeError):
+    """Another process owns the sales journal of this database."""
+
+
+def lock_file(path):
+    """Opens 'path' with an exclusive, non-blocking OS lock. Returns the open file, or None if it is held."""
+    f = open(path, "a+b")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def read_journal(path):
+    """([(seq, created_at, lines, total)], valid bytes) from a journal file.
+
+    Reading stops at the first line that is incomplete or fails its checksum:
+    everything from there on is the torn tail of an interrupted write.
+    """
+    entries = []
+    valid = 0
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return entries, 0
+    for raw in data.splitlines(keepends=True):
+        if not raw.endswith(b"\n"):
+            break
+        body, _, crc = raw.rstrip(b"\n").rpartition(b"\t")
+        try:
+            if int(crc, 16) != zlib.crc32(body):
+                break
+            seq, created_at, lines, total = json.loads(body)
+        except ValueError:
+            break
+        entries.append((seq, created_at, [tuple(line) for line in lines], total))
+        valid += len(raw)
+    return entries, valid
+
+
+class SalesJournal:
+    """Crash-safe, group-committed checkout in front of a Database.
+
+    start() replays unapplied entries and starts the writer threads; close()
+    finishes the queued work and stops them. checkout() is safe to call from
+    any thread.
+    """
+
+    def __init__(self, db, path=None, group_max=GROUP_MAX, fsync=True, rotate_bytes=ROTATE_BYTES, on_error=None):
+        self.db = db
+        self.path = path or os.path.splitext(os.path.abspath(db.path))[0] + JOURNAL_SUFFIX
+        self.group_max = group_max
+        self.fsync = fsync
+        self.rotate_bytes = rotate_bytes
+        self.on_error = on_error
+        self._lock = threading.Lock()       # admission: pending units and the next seq
+        self._file_lock = threading.Lock()  # the journal file, between writing and rotation
+        self._pending = {}                  # sku -> units journaled but not applied yet
+        self._waiters = {}                  # seq -> Ack of a checkout waiting for the sale to be applied
+        self._next_seq = None
+        self._accepting = False
+        self._last_applied = 0
+        self._failed = None                 # the write or apply error that stopped the journal
+        self._file = None
+        self._lock_file = None              # holds the OS lock while the journal is open
+        self._writes = queue.SimpleQueue()  # (seq, created_at, lines, total, changes, Ack) or None
+        self._applies = queue.SimpleQueue() # batches of sales, or None to stop
+        self._threads = []
+
+    # --- Lifecycle ---
+    def start(self):
+        """Cuts off a torn tail, applies what the database is missing, then starts accepting sales.
+
+        Raises JournalInUse if another process has the journal open.
+        """
+        self._lock_file = lock_file(self.path + LOCK_SUFFIX)
+        if self._lock_file is None:
+            raise JournalInUse(f"Another process is using the sales journal {self.path}.")
+        try:
+            return self._start()
+        except BaseException:
+            self._lock_file.close()
+            self._lock_file = None
+            raise
+
+    def _start(self):
+        entries, valid = read_journal(self.path)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > valid:
+            with open(self.path, "r+b") as f:
+                f.truncate(valid)
+                os.fsync(f.fileno())
+        applied = self.db.journal_applied_seq()
+        unapplied = [entry for entry in entries if entry[0] > applied]
+        for _, _, lines, _ in unapplied:
+            for sku, qty in sale_quantities(lines).items():
+                self._pending[sku] = self._pending.get(sku, 0) + qty
+        for i in range(0, len(unapplied), self.group_max):
+            self._apply(unapplied[i:i + self.group_max], retry=False)
+        self._last_applied = max(applied, entries[-1][0] if entries else 0)
+        self._next_seq = self._last_applied + 1
+
+        created = not os.path.exists(self.path)
+        self._file = open(self.path, "ab")
+        if created and self.fsync:
+            self._sync_directory()
+        self._maybe_rotate()
+        self._accepting = True
+        self._threads = [threading.Thread(target=self._write_loop, name="journal-writer", daemon=True),
+                         threading.Thread(target=self._apply_loop, name="journal-applier", daemon=True)]
+        for thread in self._threads:
+            thread.start()
+        return len(unapplied)
+
+    def close(self):
+        """Writes and applies everything already accepted, then stops."""
+        with self._lock:
+            if not self._accepting:
+                return
+            self._accepting = False
+            self._writes.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._file.close()
+        self._lock_file.close()  # Releases the OS lock
+        self._lock_file = None
+
+    # --- Checkout ---
+    def checkout(self, lines, total, applied=False):
+        """Journals a sale of (sku, name, qty, unit_price) lines; returns its seq once it is durable.
+
+        With applied=True, waits until the sale is in the database as well and
+        returns (transaction id, created_at) instead, e.g. for a receipt.
+        Raises InsufficientStock, without journaling anything, if stock minus
+        the units of sales still pending does not cover it.
+        """
+        wanted = sale_quantities(lines)
+        created_at = datetime.datetime.now().isoformat()
+        ack = Ack()
+        waiter = Ack() if applied else None
+        conn = self.db.conn
+        with self._lock:
+            if self._failed is not None:
+                raise RuntimeError(f"The sales journal stopped after an error: {self._failed}")
+            if not self._accepting:
+                raise RuntimeError("The sales journal is not running.")
+            names = {sku: name for sku, name, _, _ in lines}
+            changes, shortfalls = [], []
+            for sku, qty in wanted.items():
+                row = conn.execute("SELECT quantity FROM products WHERE sku = ?", (sku,)).fetchone()
+                available = (row[0] if row else 0) - self._pending.get(sku, 0)
+                if qty > available:
+                    shortfalls.append((sku, names[sku], qty, available))
+                changes.append((sku, available, available - qty))
+            if shortfalls:
+                raise InsufficientStock(shortfalls)
+            for sku, qty in wanted.items():
+                self._pending[sku] = self._pending.get(sku, 0) + qty
+            seq = self._next_seq
+            self._next_seq += 1
+            if waiter is not None:
+                self._waiters[seq] = waiter
+            self._writes.put((seq, created_at, [tuple(line) for line in lines], total, tuple(changes), ack))
+        ack.wait()
+        if waiter is not None:
+            return waiter.wait()
+        return seq
+
+    @property
+    def last_seq(self):
+        """Seq of the last sale accepted (0 before any)."""
+        with self._lock:
+            return (self._next_seq or 1) - 1
+
+    def pending_units(self, sku):
+        """Units of 'sku' sold through the journal but not yet in the database."""
+        with self._lock:
+            return self._pending.get(sku, 0)
+
+    # --- Writer thread: group commit to the journal file ---
+    def _write_loop(self):
+        stopping = False
+        while not stopping:
+            batch = [self._writes.get()]
+            while batch[-1] is not None and len(batch) < self.group_max:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is None:
+                stopping = True
+                batch.pop()
+            if batch:
+                self._write(batch)
+        self._applies.put(None)
+
+    def _write(self, batch):
+        data = b"".join(encode_entry(seq, created_at, lines, total) for seq, created_at, lines, total, _, _ in batch)
+        try:
+            with self._file_lock:
+                self._file.write(data)
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+        except OSError as e:
+            # The sales may or may not be on disk: refuse new ones rather than guess,
+            # and fail these. Whatever did reach the file is applied on the next start().
+            with self._lock:
+                self._failed = e
+                for seq, _, lines, _, _, _ in batch:
+                    self._release(sale_quantities(lines))
+                    self._waiters.pop(seq, None)
+            for *_, ack in batch:
+                ack.fail(e)
+            return
+        for *_, changes, ack in batch:
+            ack.done()
+            # Published here, in seq order, so the projected stock shown never goes back in time
+            self.db.events.publish(StockChanged(changes))
+        self._applies.put([sale[:4] for sale in batch])
+
+    # --- Apply thread: group commit to the database ---
+    def _apply_loop(self):
+        stopped = False
+        while True:
+            batch = self._applies.get()
+            if batch is None:
+                return
+            while len(batch) < self.group_max:
+                try:
+                    more = self._applies.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._applies.put(None)
+                    break
+                batch.extend(more)
+            if stopped:
+                continue  # Left in the journal for the next start()
+            try:
+                self._apply(batch)
+            except Exception as e:
+                stopped = True
+                with self._lock:
+                    self._failed = e
+                    waiters, self._waiters = self._waiters, {}
+                for waiter in waiters.values():
+                    waiter.fail(e)
+                self._report(e)
+                continue
+            try:
+                self._maybe_rotate()
+            except (OSError, sqlite3.Error) as e:
+                self._report(e)  # Nothing is lost; the next batch tries again
+
+    def _apply(self, batch, retry=True):
+        """Writes 'batch' to the database, retrying while it is locked, and publishes the outcome."""
+        conn = self.db.conn
+        delay = APPLY_RETRY_DELAY
+        while True:
+            try:
+                recorded, oversold = self.db.apply_sales(batch)
+                with self._lock:
+                    conn.commit()
+                    self._settle(batch, recorded)
+                break
+            except Exception as e:
+                conn.rollback()
+                if not retry or not isinstance(e, sqlite3.Error):
+                    raise
+                time.sleep(delay)  # e.g. another process holds the write lock longer than the busy timeout
+                delay = min(delay * 2, 2.0)
+        events = self.db.events
+        sold = {seq: lines for seq, _, lines, _ in batch}
+        try:
+            for seq, tid, total, created_at, units, _ in recorded:
+                events.publish(TransactionRecorded(tid, total, created_at, units,
+                                                   tuple((name, qty, price) for _, name, qty, price in sold[seq])))
+            for tid, shortfalls in oversold:
+                events.publish(SaleOversold(tid, tuple(shortfalls)))
+        except Exception as e:
+            self._report(e)  # The sales are applied; only a listener failed
+
+    def _settle(self, batch, recorded):
+        """Moves an applied batch out of 'pending' (under self._lock) and wakes its waiting checkouts.
+
+        The projected stock stays as it was: the database went down by exactly
+        the units that stop being pending (below zero for an oversold sale).
+        """
+        for _, _, lines, _ in batch:
+            self._release(sale_quantities(lines))
+        self._last_applied = batch[-1][0]
+        for seq, tid, _, created_at, _, _ in recorded:
+            waiter = self._waiters.pop(seq, None)
+            if waiter is not None:
+                waiter.done((tid, created_at))
+
+    def _report(self, error):
+        if self.on_error is not None:
+            self.on_error(error)
+        else:
+            print(f"Sales journal: {error!r}", file=sys.stderr)
+
+    def _release(self, wanted):
+        for sku, qty in wanted.items():
+            left = self._pending[sku] - qty
+            if left:
+                self._pending[sku] = left
+            else:
+                del self._pending[sku]
+
+    # --- Rotation ---
+    def _maybe_rotate(self):
+        """Truncates the journal once every entry in it is applied and it is larger than rotate_bytes."""
+        if not self.rotate_bytes or self._file.tell() < self.rotate_bytes:
+            return
+        with self._lock:
+            if self._last_applied != self._next_seq - 1:
+                return  # Sales still in flight
+            # The applied sales must survive a power cut before their journal lines go
+            busy, _, _ = self.db.conn.execute("PRAGMA wal_checkpoint(FULL)").fetchone()
+            if busy:
+                return  # Readers in the way; try after the next batch
+            with self._file_lock:
+                self._file.truncate(0)
+                self._file.seek(0)
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+
+    def _sync_directory(self):
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(os.path.dirname(self.path), os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+
+class Ack:
+    """Lets a checkout wait until a background thread has made its sale durable (or applied it)."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._value = None
+        self._error = None
+
+    def done(self, value=None):
+        self._value = value
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
@@ -0,0 +1,369 @@
+import argparse
+import datetime
+import os
+import random
+import sys
+import tempfile
+
+import archive
+import backup
+import csvio
+import reports
+from bill import Bill, OutOfStock, to_cents
+from db import Database, InsufficientStock
+
+# --- MAINTENANCE COMMANDS ---
+# Headless utilities for an inventory.db, run from a terminal or a scheduler:
+#
+#     python manage.py rebuild-rollup [--db inventory.db]
+#     python manage.py check-stats [--repair]
+#     python manage.py fuzz-stats [--ops 5000] [--seed 1]
+#     python manage.py fuzz-bill [--ops 5000] [--seed 1]
+#     python manage.py import-products catalog.csv [--chunk-size 1000]
+#     python manage.py export-products products.csv
+#     python manage.py export-transactions transactions.csv
+#     python manage.py archive [--year 2023] [--vacuum] [--list]
+#     python manage.py report [--out reports] [--kind monthly] [--format both] [--from 2024-01-01] [--to 2024-12-31]
+#     python manage.py backup [--dest backups] [--keep 7] [--list]
+#     python manage.py restore backups/inventory-20261017-031500.db [--no-safety-copy]
+
+DEFAULT_DB = "inventory.db"
+
+
+def cmd_rebuild_rollup(db, args):
+    """Recomputes the daily sales rollup used by the Analytics tab."""
+    db.rebuild_sales_daily()
+    days = db.conn.execute("SELECT COUNT(*) FROM sales_daily").fetchone()[0]
+    print(f"Rebuilt sales_daily: {days} days.")
+
+
+def cmd_check_stats(db, args):
+    """Compares the dashboard counters with a full scan (and optionally repairs them)."""
+    mismatches = db.check_stats()
+    if not mismatches:
+        print("Dashboard counters are consistent.")
+        return 0
+    for name, (stored, actual) in mismatches.items():
+        print(f"{name}: stored {stored}, actual {actual}")
+    if args.repair:
+        db.rebuild_stats()
+        print("Counters rebuilt.")
+        return 0
+    return 1
+
+
+def cmd_fuzz_stats(db, args):
+    """Runs a randomized write workload on a scratch database and verifies the counters and stock alerts."""
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as scratch:
+        fuzz_db = Database(os.path.join(scratch, "fuzz.db"))
+        try:
+            fuzz_db.setup()
+            failures = run_stats_workload(fuzz_db, rng, args.ops)
+        finally:
+            fuzz_db.close()
+    if failures:
+        for step, mismatches in failures[:10]:
+            print(f"after op {step}: {mismatches}")
+        print(f"FAILED: {len(failures)} inconsistent checkpoints.")
+        return 1
+    print(f"OK: counters and stock alerts matched full scans after {args.ops} random writes.")
+    return 0
+
+
+def run_stats_workload(db, rng, ops, check_every=50):
+    """Applies 'ops' random product/sale writes, checking the counters as it goes."""
+    skus = []
+    tids = []
+    failures = []
+    conn = db.conn
+    for step in range(1, ops + 1):
+        action = rng.random()
+        if action < 0.25 or not skus:
+            sku = f"F{step}"
+            db.add_product(sku, f"Item {step}", round(rng.uniform(0.5, 50), 2), rng.randint(0, 12), rng.randint(0, 8))
+            skus.append(sku)
+        elif action < 0.35:
+            db.delete_product(skus.pop(rng.randrange(len(skus))))
+        elif action < 0.45:
+            with conn:
+                conn.execute("UPDATE products SET quantity = ? WHERE sku = ?",
+                             (rng.randint(0, 12), rng.choice(skus)))
+        elif action < 0.55:
+            sku = rng.choice(skus)
+            if rng.random() < 0.5:
+                db.set_reorder_level(sku, rng.randint(0, 10))
+            else:
+                # An upsert as a CSV import does it, with a new level or None (keep the current one)
+                name, price = conn.execute("SELECT name, price FROM products WHERE sku = ?", (sku,)).fetchone()
+                db.import_products([(sku, name, price, rng.randint(0, 12), rng.choice((None, rng.randint(0, 10))))])
+        elif action < 0.85:
+            sku = rng.choice(skus)
+            name, price = conn.execute("SELECT name, price FROM products WHERE sku = ?", (sku,)).fetchone()
+            qty = rng.randint(1, 3)
+            try:
+                tids.append(db.checkout([(sku, name, qty, price)], round(qty * price, 2)))
+            except InsufficientStock:
+                pass  # Rolled back; the counters must be untouched too
+        elif action < 0.95 and tids:
+            db.delete_transaction(tids.pop(rng.randrange(len(tids))))
+        elif tids:
+            with conn:
+                conn.execute("UPDATE transactions SET total = ? WHERE id = ?",
+                             (round(rng.uniform(1, 100), 2), rng.choice(tids)))
+        if step % check_every == 0 or step == ops:
+            mismatches = db.check_stats()
+            stale = stale_alerts(conn)
+            if stale:
+                mismatches["stock_alerts"] = stale
+            if mismatches:
+                failures.append((step, mismatches))
+    return failures
+
+
+def stale_alerts(conn):
+    """SKUs whose latest queued stock alert disagrees with their current stock and reorder level.
+
+    Pruning only drops the oldest alerts, so a product's newest alert left in
+    the queue is its newest alert ever and must match its state now.
+    """
+    return [sku for sku, low, now in conn.execute("""
+        SELECT a.sku, a.low, p.quantity < p.reorder_level
+        FROM stock_alerts a JOIN products p ON p.sku = a.sku
+        WHERE a.id = (SELECT MAX(id) FROM stock_alerts WHERE sku = a.sku)
+    """) if low != now]
+
+
+def cmd_fuzz_bill(db, args):
+    """Rings up random bills (with prices changing between scans) and verifies their totals."""
+    failures = run_bill_workload(random.Random(args.seed), args.ops)
+    if failures:
+        for step, problem in failures[:10]:
+            print(f"after op {step}: {problem}")
+        print(f"FAILED: {len(failures)} inconsistent bills.")
+        return 1
+    print(f"OK: bill totals matched their lines after {args.ops} random edits.")
+    return 0
+
+
+def run_bill_workload(rng, ops):
+    """Applies 'ops' random adds, quantity changes, removals and checkouts to a Bill, checking it after each."""
+    failures = []
+    # A rescan after a price edit: the line keeps its first price, and so must the total
+    bill = Bill()
+    bill.add("A1", "Item A1", 150, 10)
+    bill.add("A1", "Item A1", 200, 10)
+    if bill.total_cents != 300 or bill.get("A1").total_cents != 300:
+        failures.append((0, f"rescan at a new price: total {bill.total_cents}, line {bill.get('A1').total_cents}"))
+
+    # A scan while the checkout is being written: only the sold units come off
+    bill = Bill()
+    bill.add("A1", "Item A1", 150, 10)
+    sold = bill.sale_lines()
+    bill.add("A1", "Item A1", 150, 10)
+    bill.add("A2", "Item A2", 99, 10)
+    bill.deduct(sold)
+    if [(line.sku, line.qty) for line in bill] != [("A1", 1), ("A2", 1)] or bill.total_cents != 249:
+        failures.append((0, f"deduct after a rescan: {[(line.sku, line.qty) for line in bill]}, total {bill.total_cents}"))
+
+    bill = Bill()
+    skus = [f"B{i}" for i in range(8)]
+    checking_out = None  # sale lines of a checkout still running
+    for step in range(1, ops + 1):
+        sku = rng.choice(skus)
+        action = rng.random()
+        try:
+            if action < 0.55:
+                bill.add(sku, f"Item {sku}", rng.randint(1, 5000), rng.randint(0, 20), rng.randint(1, 3))
+            elif action < 0.75 and sku in bill:
+                bill.set_quantity(sku, rng.randint(-1, 20))
+            elif action < 0.87:
+                bill.remove(sku)
+            elif action < 0.97:
+                if checking_out is None:
+                    checking_out = bill.sale_lines()
+                else:
+                    bill.deduct(checking_out)
+                    checking_out = None
+            else:
+                bill.clear()
+        except OutOfStock:
+            pass  # The bill must be unchanged, which the check below covers too
+        lines = sum(line.total_cents for line in bill)
+        sold = sum(to_cents(qty * price) for _, _, qty, price in bill.sale_lines())
+        if bill.total_cents != lines or lines != sold:
+            failures.append((step, f"total {bill.total_cents}, lines {lines}, sale lines {sold}"))
+            bill.total_cents = lines  # Report each drift once
+    return failures
+
+
+def cmd_import_products(db, args):
+    """Upserts products from a CSV file (columns: sku,name,price,quantity)."""
+    report = csvio.import_products(db, args.file, args.chunk_size,
+                                   progress=lambda rows: print(f"\r{rows} rows...", end="", file=sys.stderr))
+    print(file=sys.stderr)
+    print(report.summary())
+    return 1 if report.rejected else 0
+
+
+def cmd_export_products(db, args):
+    """Writes every product to a CSV file in import format."""
+    print(f"Wrote {csvio.export_products(db, args.file)} products to {args.file}.")
+
+
+def cmd_export_transactions(db, args):
+    """Writes the sales history to a CSV file, one row per sold line."""
+    print(f"Wrote {csvio.export_transactions(db, args.file)} sale lines to {args.file}.")
+
+
+def cmd_archive(db, args):
+    """Moves closed years of sales into read-only transactions_YYYY.db files."""
+    if args.list:
+        for year, path, count, revenue in db.archives():
+            print(f"{year}: {count} sales, ${revenue:.2f}  {path}")
+        return 0
+    if args.year is not None:
+        archived = [(args.year, archive.archive_year(db, args.year))]
+        if args.vacuum:
+            db.conn.execute("VACUUM")
+    else:
+        archived = archive.archive_closed_years(db, vacuum=args.vacuum,
+                                                progress=lambda year: print(f"Archiving {year}...", file=sys.stderr))
+    if not archived:
+        print("Nothing to archive.")
+    for year, count in archived:
+        print(f"Archived {count} sales from {year} to {db.archive_path(archive.ARCHIVE_FILE.format(year=year))}.")
+    return 0
+
+
+def cmd_report(db, args):
+    """Writes daily, monthly, annual and per-product sales reports (CSV and/or HTML)."""
+    formats = reports.FORMATS if args.format == "both" else (args.format,)
+    end = args.to + datetime.timedelta(days=1) if args.to else None
+
+    def progress(done, total):
+        print(f"\rAggregated {done}/{total} date ranges", end="", file=sys.stderr)
+
+    written = reports.generate(db, args.out, args.kind or reports.REPORT_KINDS, formats, args.start, end,
+                               args.workers, progress)
+    print(file=sys.stderr)
+    for path, rows in written:
+        print(f"Wrote {rows} rows to {path}.")
+    return 0
+
+
+def cmd_backup(db, args):
+    """Takes an online snapshot of the database (safe while the app is selling) and prunes old ones."""
+    dest = backup.backup_dir(db.path, args.dest)
+    stem = os.path.splitext(os.path.basename(db.path))[0]
+    if args.list:
+        for taken, path in backup.snapshots(dest, stem):
+            print(f"{taken:%Y-%m-%d %H:%M:%S}  {os.path.getsize(path) / 1e6:9.1f} MB  {path}")
+        return 0
+
+    def progress(done, total):
+        print(f"\rCopied {done}/{total} pages", end="", file=sys.stderr)
+
+    path = backup.backup(db, dest, pages=args.pages, keep_last=args.keep, progress=progress)
+    print(file=sys.stderr)
+    print(f"Snapshot written and verified: {path}")
+    return 0
+
+
+def cmd_restore(db, args):
+    """Replaces the database with a snapshot (stop the app and server first)."""
+    # Run without 'db': nothing of ours may hold the file open (or migrate it) before the restore
+    safety = backup.restore(args.db, args.snapshot, keep_current=not args.no_safety_copy)
+    if safety is not None:
+        print(f"The previous database was saved as {safety}.")
+    print(f"Restored {args.db} from {args.snapshot}.")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Stock-Desk maintenance commands.")
+    parser.add_argument("--db", default=DEFAULT_DB, help="path to the inventory database (default: %(default)s)")
+    parser.set_defaults(opens_db=True)  # Commands with opens_db=False get db=None and never touch --db's file
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-rollup", help=cmd_rebuild_rollup.__doc__)
+    rebuild.set_defaults(func=cmd_rebuild_rollup)
+
+    check = commands.add_parser("check-stats", help=cmd_check_stats.__doc__)
+    check.add_argument("--repair", action="store_true", help="rebuild the counters if they disagree")
+    check.set_defaults(func=cmd_check_stats)
+
+    fuzz = commands.add_parser("fuzz-stats", help=cmd_fuzz_stats.__doc__)
+    fuzz.add_argument("--ops", type=int, default=5000, help="number of random writes (default: %(default)s)")
+    fuzz.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    fuzz.set_defaults(func=cmd_fuzz_stats, opens_db=False)
+
+    bill_fuzz = commands.add_parser("fuzz-bill", help=cmd_fuzz_bill.__doc__)
+    bill_fuzz.add_argument("--ops", type=int, default=5000, help="number of random bill edits (default: %(default)s)")
+    bill_fuzz.add_argument("--seed", type=int, default=1, help="random seed (default: %(default)s)")
+    bill_fuzz.set_defaults(func=cmd_fuzz_bill, opens_db=False)
+
+    importer = commands.add_parser("import-products", help=cmd_import_products.__doc__)
+    importer.add_argument("file", help="CSV file to read")
+    importer.add_argument("--chunk-size", type=int, default=csvio.IMPORT_CHUNK_SIZE,
+                          help="rows per commit (default: %(default)s)")
+    importer.set_defaults(func=cmd_import_products)
+
+    for name, func in (("export-products", cmd_export_products), ("export-transactions", cmd_export_transactions)):
+        exporter = commands.add_parser(name, help=func.__doc__)
+        exporter.add_argument("file", help="CSV file to write")
+        exporter.set_defaults(func=func)
+
+    archiver = commands.add_parser("archive", help=cmd_archive.__doc__)
+    archiver.add_argument("--year", type=int, help="archive only this year (default: every closed year)")
+    archiver.add_argument("--vacuum", action="store_true", help="compact the main file afterwards")
+    archiver.add_argument("--list", action="store_true", help="list the archived years instead")
+    archiver.set_defaults(func=cmd_archive)
+
+    reporter = commands.add_parser("report", help=cmd_report.__doc__)
+    reporter.add_argument("--out", help="folder to write to (default: reports/ next to the database)")
+    reporter.add_argument("--kind", action="append", choices=reports.REPORT_KINDS,
+                          help="a report to write; repeat for several (default: all)")
+    reporter.add_argument("--format", choices=reports.FORMATS + ("both",), default="csv",
+                          help="file format (default: %(default)s)")
+    reporter.add_argument("--from", dest="start", type=datetime.date.fromisoformat,
+                          help="first day to include, YYYY-MM-DD (default: the first sale)")
+    reporter.add_argument("--to", type=datetime.date.fromisoformat,
+                          help="last day to include, YYYY-MM-DD (default: the latest sale)")
+    reporter.add_argument("--workers", type=int,
+                          help="worker processes (default: one per CPU for large stores, else 1)")
+    reporter.set_defaults(func=cmd_report)
+
+    backer = commands.add_parser("backup", help=cmd_backup.__doc__)
+    backer.add_argument("--dest", help="snapshot folder (default: backups/ next to the database)")
+    backer.add_argument("--keep", type=int, default=backup.KEEP_LAST,
+                        help="newest snapshots to keep, besides one per week for %d weeks (default: %%(default)s)"
+                             % backup.KEEP_WEEKLY)
+    backer.add_argument("--pages", type=int, default=backup.PAGES_PER_STEP,
+                        help="pages copied per step (default: %(default)s)")
+    backer.add_argument("--list", action="store_true", help="list the snapshots instead")
+    backer.set_defaults(func=cmd_backup)
+
+    restorer = commands.add_parser("restore", help=cmd_restore.__doc__)
+    restorer.add_argument("snapshot", help="snapshot file to restore")
+    restorer.add_argument("--no-safety-copy", action="store_true",
+                          help="do not snapshot the current database first")
+    restorer.set_defaults(func=cmd_restore, opens_db=False)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not args.opens_db:
+        return args.func(None, args) or 0
+    db = Database(args.db)
+    try:
+        db.setup()
+        return args.func(db, args) or 0
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+import collections
+import datetime
+import functools
+import json
+import sqlite3
+import sys
+import threading
+import time
+
+# --- INSTRUMENTATION ---
+# Optional latency tracking for diagnosing a sluggish till. A Metrics registry
+# keeps a rolling window of samples per (category, name) and reports
+# p50/p95/p99 from it; SQL statements land in the "sql" category, GUI handlers
+# in "ui" and background work in "task". Statements slower than
+# 'slow_query_ms' are logged together with their EXPLAIN QUERY PLAN.
+#
+# Nothing here runs unless a Metrics object is handed to Database and
+# InventoryApp: without one, connections are plain sqlite3 connections and
+# handlers are the plain bound methods, so disabled instrumentation costs nothing.
+
+WINDOW = 1024          # samples kept per histogram
+SLOW_QUERY_MS = 25.0   # statements slower than this go to the slow-query log
+SLOW_LOG_SIZE = 200    # slow-query entries kept in memory
+
+# Statements worth asking SQLite for a plan (not BEGIN, COMMIT, PRAGMA, ...)
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+class Histogram:
+    """Latency samples (in milliseconds) over a rolling window, plus lifetime totals."""
+
+    __slots__ = ("samples", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.samples = collections.deque(maxlen=WINDOW)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+        self.total_ms += ms
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def summary(self):
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * p))], 3) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+
+class Metrics:
+    """Thread-safe registry of latency histograms and the slow-query log.
+
+    If 'slow_log_path' is set, each slow statement is also appended to that
+    file as one JSON line.
+    """
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_log_path=None):
+        self.slow_query_ms = slow_query_ms
+        self.slow_log_path = slow_log_path
+        self.slow_queries = collections.deque(maxlen=SLOW_LOG_SIZE)
+        self._histograms = {}
+        self._plans = {}  # sql -> EXPLAIN QUERY PLAN text, so each statement is explained once
+        self._lock = threading.Lock()
+
+    def record(self, category, name, ms):
+        with self._lock:
+            histogram = self._histograms.get((category, name))
+            if histogram is None:
+                histogram = self._histograms[(category, name)] = Histogram()
+            histogram.add(ms)
+
+    def wrap(self, fn, category, name=None):
+        """Returns fn wrapped so that every call is timed under (category, name)."""
+        name = name or getattr(fn, "__name__", repr(fn))
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(category, name, (time.perf_counter() - start) * 1000)
+        return timed
+
+    def record_statement(self, conn, sql, params, ms):
+        key = " ".join(sql.split())
+        self.record("sql", key, ms)
+        if ms >= self.slow_query_ms:
+            self._log_slow(conn, key, sql, params, ms)
+
+    def _log_slow(self, conn, key, sql, params, ms):
+        with self._lock:
+            plan = self._plans.get(key)
+        if plan is None:
+            plan = explain(conn, sql, params)
+            with self._lock:
+                self._plans[key] = plan
+        entry = {
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "thread": threading.current_thread().name,
+            "ms": round(ms, 3),
+            "sql": key,
+            "plan": plan,
+        }
+        with self._lock:
+            self.slow_queries.append(entry)
+        if self.slow_log_path:
+            try:
+                with open(self.slow_log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError:
+                pass  # The in-memory log still has it
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self.slow_queries.clear()
+
+    def snapshot(self):
+        """All histograms summarized, slowest p95 first, plus the slow-query log."""
+        with self._lock:
+            items = [(category, name, histogram.summary()) for (category, name), histogram in self._histograms.items()]
+            slow = list(self.slow_queries)
+        items.sort(key=lambda item: item[2]["p95_ms"], reverse=True)
+        return {
+            "taken_at": datetime.datetime.now().isoformat(timespec="seconds"),
+            "timings": [dict(category=category, name=name, **summary) for category, name, summary in items],
+            "slow_queries": slow,
+        }
+
+    def export_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+
+def explain(conn, sql, params):
+    """EXPLAIN QUERY PLAN for a statement, as indented text ('' if it has none)."""
+    if not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return ""
+    try:
+        # A plain cursor, so the EXPLAIN itself is not timed or logged
+        rows = sqlite3.Cursor(conn).execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except sqlite3.Error as e:
+        return f"(no plan: {e})"
+    depth = {0: 0}
+    lines = []
+    for node, parent, _, detail in rows:
+        depth[node] = depth.get(parent, 0) + 1
+        lines.append("  " * (depth[node] - 1) + detail)
+    return "\n".join(lines)
+
+
+class TimedCursor(sqlite3.Cursor):
+    """A cursor that times each statement from execute() until its rows are consumed.
+
+    Time spent in fetch calls is added to the statement that produced the
+    rows; the sample is recorded when the next statement starts or the cursor
+    is released.
+    """
+
+    def __init__(self, conn):
+        super().__init__(conn)
+        self._statement = None  # (sql, params, elapsed_seconds) awaiting its final fetch
+
+    def _flush(self):
+        if self._statement is not None:
+            sql, params, elapsed = self._statement
+            self._statement = None
+            self.connection.metrics.record_statement(self.connection, sql, params, elapsed * 1000)
+
+    def _timed(self, method, sql, params, first_params):
+        self._flush()
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self._statement = (sql, first_params, time.perf_counter() - start)
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        return self._timed(super().executemany, sql, seq_of_params, seq_of_params[0] if seq_of_params else ())
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._statement is not None:
+                sql, params, elapsed = self._statement
+                self._statement = (sql, params, elapsed + time.perf_counter() - start)
+
+    def fetchone(self):
+        return self._fetch(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._fetch(super().fetchmany, self.arraysize if size is None else size)
+
+    def fetchall(self):
+        return self._fetch(super().fetchall)
+
+    def __next__(self):
+        return self._fetch(super().__next__)
+
+    def close(self):
+        self._flush()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._flush()
+        except Exception:
+            pass  # Never let a metrics problem surface from garbage collection
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements all run through a TimedCursor.
+
+    Pass as sqlite3.connect(..., factory=TimedConnection) and then set
+    'metrics' on the new connection.
+    """
+
+    metrics = None
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+
+class StartupTimer:
+    """Milestones of one application start, in milliseconds since 'started'.
+
+    'started' is a time.perf_counter() value taken as early as possible.
+    finish() closes the report: it records each milestone in 'metrics' (if
+    any) under the "startup" category and, with echo=True, prints it to stderr.
+    """
+
+    def __init__(self, started, budget_ms=None, echo=False):
+        self.started = started
+        self.budget_ms = budget_ms
+        self.echo = echo
+        self.marks = []
+        self.finished = False
+
+    def mark(self, stage):
+        if not self.finished:
+            self.marks.append((stage, (time.perf_counter() - self.started) * 1000))
+
+    def finish(self, stage, metrics=None):
+        if self.finished:
+            return
+        self.mark(stage)
+        self.finished = True
+        if metrics is not None:
+            for name, ms in self.marks:
+                metrics.record("startup", name, ms)
+        if self.echo and sys.stderr is not None:  # no stderr in a windowed build
+            print(self.report(), file=sys.stderr)
+
+    def report(self):
+        lines = [f"  {stage:<24s}{ms:8.1f} ms" for stage, ms in self.marks]
+        total = self.marks[-1][1] if self.marks else 0.0
+        if self.budget_ms is not None:
+            verdict = "OVER BUDGET" if total > self.budget_ms else "within budget"
+            lines.append(f"  {verdict} ({self.budget_ms} ms)")
+        return "Startup timings:\n" + "\n".join(lines)
@@ -0,0 +1,354 @@
+import collections
+import datetime
+import os
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import dataclass
+
+from bill import to_cents, format_cents
+
+# --- RECEIPTS ---
+# Each sale's receipt is rendered and printed on a background spool thread, so
+# checkout never waits for a printer. ReceiptSpool.submit() only queues the
+# sale; the spool thread renders it (text, ESC/POS or PDF) from a
+# ReceiptTemplate compiled once, writes it into the spool folder and hands the
+# files, oldest first, to a sink: the Windows spooler (pywin32), CUPS' lp, or
+# a plain folder. A failed print is retried with growing delays, holding back
+# the receipts behind it so they still come out in order; after MAX_ATTEMPTS
+# it is moved to the spool's failed/ folder. Receipts still in the spool when
+# the app stops are printed at the next start.
+#
+# A sale's receipt is queued from its TransactionRecorded event, once the sale
+# is written (with the sales journal, when it is applied), so it carries the
+# transaction ID and time the Transactions tab shows and a reprint matches it.
+#
+#     STOCKDESK_RECEIPT_PRINTER   unset: save receipts into receipts/ (nothing is printed)
+#                                 default | <printer name>: print; dir:<folder>: save there; off: no receipts
+#     STOCKDESK_RECEIPT_FORMAT    text (default) | escpos (raw, for thermal printers) | pdf
+
+PRINTER_ENV = "STOCKDESK_RECEIPT_PRINTER"
+FORMAT_ENV = "STOCKDESK_RECEIPT_FORMAT"
+SPOOL_DIR = "receipt_spool"
+FAILED_DIR = "failed"             # inside the spool folder
+RECEIPT_DIR = "receipts"          # where the default sink saves them
+STORE_NAME = "Stock-Desk"
+FOOTER = "Thank you for shopping with us!"
+RECEIPT_WIDTH = 42                # characters per line (80 mm paper; 32 for 58 mm)
+QTY_WIDTH = 4
+AMOUNT_WIDTH = 10
+RETRY_DELAYS = (2, 5, 15, 30, 60)  # seconds before each retry of a failed print; the last one repeats
+MAX_ATTEMPTS = 20                 # prints of one receipt before it is moved to failed/
+SINK_TIMEOUT = 30                 # seconds a print command may take
+STOP_TIMEOUT = 5                  # seconds stop() waits for a print in progress
+
+
+class PrintError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class Receipt:
+    sale: int
+    created_at: str   # ISO timestamp
+    lines: tuple      # (name, qty, unit_price) per line
+    total: float
+
+
+class ReceiptTemplate:
+    """A receipt layout compiled for one paper width: render() only fills in the sale.
+
+    Rows come out as (bold, text), already padded to the width.
+    """
+
+    def __init__(self, store=STORE_NAME, footer=FOOTER, width=RECEIPT_WIDTH):
+        self.width = width
+        name_width = width - QTY_WIDTH - AMOUNT_WIDTH - 2
+        self._header = [(True, store.center(width)[:width]), (False, "")]
+        self._sale = f"{{sale:<{width - 17}.{width - 17}}}{{date:>17}}"
+        self._rule = (False, "-" * width)
+        self._columns = (False, f"{'Item':<{name_width}} {'Qty':>{QTY_WIDTH}} {'Amount':>{AMOUNT_WIDTH}}")
+        self._line = f"{{name:<{name_width}.{name_width}}} {{qty:>{QTY_WIDTH}}} {{amount:>{AMOUNT_WIDTH}}}"
+        self._each = "  @ {price}"
+        self._total = f"{{label:<{width - AMOUNT_WIDTH - 1}}} {{amount:>{AMOUNT_WIDTH}}}"
+        self._footer = [(False, "")] + [(False, text.center(width)[:width]) for text in footer.splitlines()]
+
+    def render(self, receipt):
+        created = datetime.datetime.fromisoformat(receipt.created_at)
+        rows = list(self._header)
+        rows.append((False, self._sale.format(sale=f"Sale {receipt.sale}", date=f"{created:%Y-%m-%d %H:%M}")))
+        rows += [self._rule, self._columns, self._rule]
+        units = 0
+        for name, qty, unit_price in receipt.lines:
+            price = to_cents(unit_price)
+            rows.append((False, self._line.format(name=name, qty=qty, amount=format_cents(price * qty))))
+            if qty > 1:
+                rows.append((False, self._each.format(price=format_cents(price))))
+            units += qty
+        rows.append(self._rule)
+        rows.append((True, self._total.format(label="TOTAL", amount=format_cents(to_cents(receipt.total)))))
+        rows.append((False, self._total.format(label="Items", amount=units)))
+        return rows + self._footer
+
+
+# --- Renderers: rows -> file bytes ---
+def render_text(rows, width):
+    return "".join(text + "\n" for _, text in rows).encode("utf-8")
+
+
+def render_escpos(rows, width):
+    """Bytes for an ESC/POS thermal printer: bold rows, then a feed and a partial cut."""
+    out = bytearray(b"\x1b@\x1bt\x00")  # initialize; code page 437
+    for bold, text in rows:
+        data = text.encode("cp437", errors="replace") + b"\n"
+        out += b"\x1bE\x01" + data + b"\x1bE\x00" if bold else data
+    out += b"\x1bd\x04\x1dV\x42\x00"  # feed 4 lines, partial cut
+    return bytes(out)
+
+
+def render_pdf(rows, width):
+    """A one-page PDF as long as the receipt, in Courier (only the built-in fonts, so no font files)."""
+    size, leading, margin = 8, 10, 12
+    page_width = margin * 2 + width * size * 0.6
+    page_height = margin * 2 + len(rows) * leading
+    content = [f"BT {leading} TL {margin} {page_height - margin - size} Td"]
+    for bold, text in rows:
+        text = text.encode("latin-1", errors="replace").decode("latin-1")
+        text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        content.append(f"/{'F2' if bold else 'F1'} {size} Tf ({text}) Tj T*")
+    content.append("ET")
+    stream = "\n".join(content).encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {page_width:.1f} {page_height}] "
+         f"/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> /Contents 4 0 R >>").encode(),
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+# format -> (renderer, file extension)
+RENDERERS = {
+    "text": (render_text, ".txt"),
+    "escpos": (render_escpos, ".bin"),
+    "pdf": (render_pdf, ".pdf"),
+}
+
+
+# --- Sinks: where a rendered receipt goes ---
+class FileSink:
+    """Saves receipts into a folder instead of printing them."""
+
+    def __init__(self, folder=RECEIPT_DIR):
+        self.folder = folder
+
+    def send(self, path, fmt):
+        os.makedirs(self.folder, exist_ok=True)
+        shutil.copyfile(path, os.path.join(self.folder, os.path.basename(path)))
+
+
+class LpSink:
+    """Prints through CUPS' lp command (Linux, macOS); ESC/POS goes as a raw job."""
+
+    def __init__(self, printer=None, command="lp"):
+        self.printer = printer
+        self.command = command
+
+    def send(self, path, fmt):
+        args = [self.command, "-s"]
+        if self.printer:
+            args += ["-d", self.printer]
+        if fmt == "escpos":
+            args += ["-o", "raw"]
+        result = subprocess.run(args + [path], capture_output=True, text=True, timeout=SINK_TIMEOUT)
+        if result.returncode != 0:
+            raise PrintError(result.stderr.strip() or f"{self.command} exited with status {result.returncode}")
+
+
+class Win32Sink:
+    """Prints through the Windows spooler (pywin32): text and ESC/POS as raw jobs, PDFs through their viewer."""
+
+    def __init__(self, printer=None):
+        self.printer = printer
+
+    def send(self, path, fmt):
+        import win32print
+
+        printer = self.printer or win32print.GetDefaultPrinter()
+        if fmt == "pdf":
+            import win32api
+
+            win32api.ShellExecute(0, "printto", path, f'"{printer}"', ".", 0)
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        handle = win32print.OpenPrinter(printer)
+        try:
+            win32print.StartDocPrinter(handle, 1, ("Receipt", None, "RAW"))
+            try:
+                win32print.StartPagePrinter(handle)
+                win32print.WritePrinter(handle, data)
+                win32print.EndPagePrinter(handle)
+            finally:
+                win32print.EndDocPrinter(handle)
+        finally:
+            win32print.ClosePrinter(handle)
+
+
+def make_sink(spec):
+    """The sink a STOCKDESK_RECEIPT_PRINTER value names (see the top of this module)."""
+    if not spec:
+        return FileSink()
+    if spec.startswith("dir:"):
+        return FileSink(spec[len("dir:"):])
+    printer = None if spec == "default" else spec
+    if sys.platform == "win32":
+        try:
+            import win32print  # noqa: F401  (optional; without it, fall back to lp)
+            return Win32Sink(printer)
+        except ImportError:
+            pass
+    return LpSink(printer)
+
+
+class ReceiptSpool:
+    """Renders, keeps and prints receipts on one background thread; safe to submit to from any thread.
+
+    on_error(job name, exception, retry in seconds or None once given up)
+    runs on the spool thread.
+    """
+
+    def __init__(self, folder, sink, fmt="text", template=None, retry_delays=RETRY_DELAYS,
+                 max_attempts=MAX_ATTEMPTS, on_error=None):
+        if fmt not in RENDERERS:
+            raise ValueError(f"Unknown receipt format {fmt!r}; expected one of {', '.join(RENDERERS)}.")
+        self.folder = folder
+        self.sink = sink
+        self.format = fmt
+        self.template = template or ReceiptTemplate()
+        self.retry_delays = retry_delays
+        self.max_attempts = max_attempts
+        self.on_error = on_error
+        self._incoming = collections.deque()  # Receipts submitted, not rendered yet
+        self._jobs = collections.deque()      # spooled files waiting for the sink, oldest first
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._attempts = 0   # failed sends of the job at the head
+        self._due = 0.0      # time.monotonic() at which the head job may be sent
+        self._thread = None
+
+    def start(self):
+        """Picks up receipts spooled before the last stop and starts the thread. Returns how many."""
+        os.makedirs(os.path.join(self.folder, FAILED_DIR), exist_ok=True)
+        extensions = tuple(extension for _, extension in RENDERERS.values())
+        names = []
+        for name in os.listdir(self.folder):
+            if name.endswith(".partial"):
+                os.remove(os.path.join(self.folder, name))  # Never finished writing
+            elif name.endswith(extensions):
+                names.append(name)
+        self._jobs.extend(os.path.join(self.folder, name) for name in sorted(names))
+        self._thread = threading.Thread(target=self._run, name="receipt-spool", daemon=True)
+        self._thread.start()
+        return len(names)
+
+    def submit(self, receipt):
+        """Queues a Receipt and returns at once."""
+        with self._cond:
+            self._incoming.append(receipt)
+            self._cond.notify()
+
+    def print_sale(self, event):
+        """Queues the receipt of an events.TransactionRecorded sale."""
+        if event.lines:
+            self.submit(Receipt(event.tid, event.created_at, event.lines, event.total))
+
+    def pending(self):
+        """Receipts submitted or spooled but not printed yet."""
+        with self._cond:
+            return len(self._incoming) + len(self._jobs)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        """Stops the thread. Unprinted receipts stay in the spool folder for the next start."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)  # A printer that hangs must not hold up the app's exit
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not (self._stopping or self._incoming or
+                           (self._jobs and time.monotonic() >= self._due)):
+                    self._cond.wait(max(0.0, self._due - time.monotonic()) if self._jobs else None)
+                incoming = list(self._incoming)
+                self._incoming.clear()
+                stopping = self._stopping
+            for receipt in incoming:
+                self._spool(receipt)  # Even when stopping: spooled receipts survive the restart
+            if stopping:
+                return
+            if self._jobs and time.monotonic() >= self._due:
+                self._send(self._jobs[0])
+
+    def _spool(self, receipt):
+        renderer, extension = RENDERERS[self.format]
+        name = f"{time.time_ns():020d}-sale-{receipt.sale}{extension}"
+        path = os.path.join(self.folder, name)
+        try:
+            data = renderer(self.template.render(receipt), self.template.width)
+            with open(path + ".partial", "wb") as f:
+                f.write(data)
+            os.replace(path + ".partial", path)
+        except Exception as e:
+            self._report(name, e, None)
+            return
+        with self._cond:
+            self._jobs.append(path)
+
+    def _send(self, path):
+        try:
+            self.sink.send(path, self.format)
+        except Exception as e:
+            self._attempts += 1
+            if self._attempts < self.max_attempts:
+                delay = self.retry_delays[min(self._attempts, len(self.retry_delays)) - 1]
+                self._due = time.monotonic() + delay
+                self._report(os.path.basename(path), e, delay)
+                return
+            os.replace(path, os.path.join(self.folder, FAILED_DIR, os.path.basename(path)))
+            self._report(os.path.basename(path), e, None)
+        else:
+            os.remove(path)
+        with self._cond:
+            self._jobs.popleft()
+        self._attempts = 0
+        self._due = 0.0
+
+    def _report(self, name, error, retry_in):
+        if self.on_error is not None:
+            self.on_error(name, error, retry_in)
+
+
+def from_env(folder=SPOOL_DIR, on_error=None):
+    """A ReceiptSpool configured from STOCKDESK_RECEIPT_PRINTER / _FORMAT (not started), or None if off."""
+    spec = os.environ.get(PRINTER_ENV, "").strip()
+    if spec == "off":
+        return None
+    return ReceiptSpool(folder, make_sink(spec), os.environ.get(FORMAT_ENV, "text").strip() or "text",
+                        on_error=on_error)
@@ -0,0 +1,309 @@
+import concurrent.futures
+import csv
+import datetime
+import html
+import multiprocessing
+import os
+import pathlib
+import sqlite3
+
+# --- END-OF-PERIOD REPORTS ---
+# Daily, monthly and annual sales, plus a per-product summary, over the whole
+# sales history (archived years included). The history is split into date
+# ranges of whole months within each database file, about TASKS_PER_WORKER per
+# worker (every range re-emits the products it sold, so finer ranges only add
+# merging); the ranges are aggregated by SQLite (GROUP BY in C, through
+# idx_transactions_created_at) in a pool of worker processes, each with its own
+# read-only connections, and the partial sums are merged here. Small stores are
+# aggregated in-process, where the pool's start-up would cost more than it saves.
+#
+# Each range is read in its own snapshot. Ranges never overlap, so a sale is
+# counted at most once; one recorded while the report runs may or may not be
+# in it. Reports of closed periods are exact.
+#
+# Reports are streamed row by row to CSV (for spreadsheets) or HTML (for
+# reading), each through a .partial file renamed into place once complete.
+#
+#     python manage.py report [--out reports] [--kind monthly] [--format both] [--from 2024-01-01]
+
+REPORT_KINDS = ("daily", "monthly", "annual", "products")
+FORMATS = ("csv", "html")
+REPORT_DIR = "reports"          # next to the database, unless given
+REPORT_FILE = "{kind}.{ext}"
+MAX_WORKERS = 8
+TASKS_PER_WORKER = 4            # ranges per worker: balances the pool, and paces the progress reports
+PARALLEL_MIN_SALES = 200_000    # below this many sales, aggregate in-process
+
+COLUMNS = {
+    "daily": ("Day", "Sales", "Units", "Revenue", "Average Sale"),
+    "monthly": ("Month", "Sales", "Units", "Revenue", "Average Sale"),
+    "annual": ("Year", "Sales", "Units", "Revenue", "Average Sale"),
+    "products": ("SKU", "Name", "Units", "Sales", "Revenue", "Share of Revenue %"),
+}
+TITLES = {
+    "daily": "Daily Sales",
+    "monthly": "Monthly Sales",
+    "annual": "Annual Sales",
+    "products": "Sales by Product",
+}
+PERIOD_LENGTH = {"daily": 10, "monthly": 7, "annual": 4}  # characters of the ISO day that name the period
+
+# Money is summed in integer cents, so merging partials in any order gives the same totals.
+# (day, sales, revenue in cents, units) for each day of a range
+DAY_TOTALS = """
+    SELECT substr(t.created_at, 1, 10) AS day, COUNT(*), SUM(CAST(ROUND(t.total * 100) AS INTEGER)),
+           SUM((SELECT COALESCE(SUM(i.qty), 0) FROM transaction_items i WHERE i.transaction_id = t.id))
+    FROM transactions t
+    WHERE t.created_at >= ? AND t.created_at < ?
+    GROUP BY day
+"""
+# (product, sku, name, last sale id, units, line revenue in cents, sales) for each product sold in a range;
+# the bare sku and name columns come from the row with MAX(t.id), i.e. the product's latest sale
+PRODUCT_TOTALS = """
+    SELECT COALESCE(i.sku, i.name) AS product, i.sku, i.name, MAX(t.id), SUM(i.qty),
+           SUM(CAST(ROUND(i.qty * i.unit_price * 100) AS INTEGER)),
+           COUNT(DISTINCT t.id)
+    FROM transactions t JOIN transaction_items i ON i.transaction_id = t.id
+    WHERE t.created_at >= ? AND t.created_at < ?
+    GROUP BY product
+"""
+
+_connections = {}  # path -> read-only connection, per process
+
+
+def _connection(path):
+    conn = _connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(pathlib.Path(path).absolute().as_uri() + "?mode=ro", uri=True)
+        _connections[path] = conn
+    return conn
+
+
+def _close_connections():
+    while _connections:
+        _connections.popitem()[1].close()
+
+
+def aggregate_range(path, start, end):
+    """Partial sums for the sales in [start, end) of one database file: (day rows, product rows)."""
+    conn = _connection(path)
+    return (conn.execute(DAY_TOTALS, (start, end)).fetchall(),
+            conn.execute(PRODUCT_TOTALS, (start, end)).fetchall())
+
+
+def month_ranges(first, last):
+    """[(start, end)] ISO bounds of each calendar month from the one holding date 'first' to the one holding 'last'."""
+    ranges = []
+    month = datetime.date(first.year, first.month, 1)
+    while month <= last:
+        following = datetime.date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        ranges.append((month.isoformat(), following.isoformat()))
+        month = following
+    return ranges
+
+
+def plan(db, start=None, end=None):
+    """[(path, start, end)] tasks covering the sales in [start, end) (dates; None for open-ended).
+
+    One per calendar month with possible sales in each file: the hot file from
+    its oldest to its newest sale, each archive over its year. The first and
+    last month are clipped to the bounds.
+    """
+    sources = []
+    oldest, newest = db.conn.execute("SELECT MIN(created_at), MAX(created_at) FROM transactions").fetchone()
+    if oldest is not None:
+        sources.append((db.path, datetime.date.fromisoformat(oldest[:10]), datetime.date.fromisoformat(newest[:10])))
+    for year, path, count, _ in db.archives():
+        if count:
+            sources.append((path, datetime.date(year, 1, 1), datetime.date(year, 12, 31)))
+    low = start.isoformat() if start else ""
+    high = end.isoformat() if end else "9999"
+    tasks = []
+    for path, first, last in sources:
+        for month_start, month_end in month_ranges(first, last):
+            clipped = (max(month_start, low), min(month_end, high))
+            if clipped[0] < clipped[1]:
+                tasks.append((path, *clipped))
+    return tasks
+
+
+class SalesTotals:
+    """The merged partial sums; adding partials in any order gives the same totals."""
+
+    def __init__(self):
+        self.days = {}      # day -> [sales, units, revenue in cents]
+        self.products = {}  # product -> [sku, name, last sale id, units, revenue in cents, sales]
+
+    def add(self, partial):
+        day_rows, product_rows = partial
+        for day, sales, revenue, units in day_rows:
+            totals = self.days.setdefault(day, [0, 0, 0])
+            totals[0] += sales
+            totals[1] += units
+            totals[2] += revenue
+        for product, sku, name, last_id, units, revenue, sales in product_rows:
+            totals = self.products.get(product)
+            if totals is None:
+                self.products[product] = [sku, name, last_id, units, revenue, sales]
+                continue
+            if last_id > totals[2]:
+                totals[0:3] = sku, name, last_id  # Keep the name of the latest sale
+            totals[3] += units
+            totals[4] += revenue
+            totals[5] += sales
+
+    def periods(self, kind):
+        """Rows of COLUMNS[kind] for 'daily', 'monthly' or 'annual', oldest first."""
+        length = PERIOD_LENGTH[kind]
+        merged = {}
+        for day in sorted(self.days):
+            sales, units, revenue = self.days[day]
+            totals = merged.setdefault(day[:length], [0, 0, 0])
+            totals[0] += sales
+            totals[1] += units
+            totals[2] += revenue
+        for period, (sales, units, revenue) in merged.items():
+            yield period, sales, units, revenue / 100, round(revenue / sales / 100, 2) if sales else 0.0
+
+    def product_rows(self):
+        """Rows of COLUMNS['products'], the highest revenue first."""
+        total = sum(totals[4] for totals in self.products.values())
+        for sku, name, _, units, revenue, sales in sorted(self.products.values(),
+                                                          key=lambda t: (-t[4], t[1], t[0] or "")):
+            yield sku or "", name, units, sales, revenue / 100, round(100 * revenue / total, 2) if total else 0.0
+
+    def rows(self, kind):
+        return self.product_rows() if kind == "products" else self.periods(kind)
+
+
+def coarsen(tasks, count):
+    """Joins neighbouring tasks on the same file into at most about 'count' ranges."""
+    size = max(1, -(-len(tasks) // max(count, 1)))
+    joined = []
+    for path, start, end in tasks:
+        if joined and joined[-1][0] == path and joined[-1][2] == start and joined[-1][3] < size:
+            joined[-1] = [path, joined[-1][1], end, joined[-1][3] + 1]
+        else:
+            joined.append([path, start, end, 1])
+    return [(path, start, end) for path, start, end, _ in joined]
+
+
+def aggregate(tasks, workers=None, progress=None):
+    """Runs aggregate_range over 'tasks' and merges the results into a SalesTotals.
+
+    Neighbouring tasks are joined into about TASKS_PER_WORKER ranges per
+    worker. With more than one worker they go to a process pool;
+    progress(done, total) runs in this process as ranges finish.
+    """
+    totals = SalesTotals()
+    workers = min(workers or os.cpu_count() or 1, MAX_WORKERS, len(tasks))
+    tasks = coarsen(tasks, workers * TASKS_PER_WORKER)
+    if workers <= 1:
+        try:
+            for done, task in enumerate(tasks, 1):
+                totals.add(aggregate_range(*task))
+                if progress is not None:
+                    progress(done, len(tasks))
+        finally:
+            _close_connections()
+        return totals
+
+    # spawn, not fork: the GUI process has threads (and Tk) that a forked child must not inherit
+    with concurrent.futures.ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(aggregate_range, *task) for task in tasks]
+        try:
+            for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                totals.add(future.result())
+                if progress is not None:
+                    progress(done, len(tasks))
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+    return totals
+
+
+# --- Writers ---
+class CsvReport:
+    """Writes a report's rows to a CSV file as they come."""
+
+    def __init__(self, f, title, columns):
+        self.writer = csv.writer(f)
+        self.writer.writerow(columns)
+
+    def write(self, row):
+        self.writer.writerow(row)
+
+    def close(self):
+        pass
+
+
+class HtmlReport:
+    """Writes a report's rows to a standalone HTML table as they come."""
+
+    def __init__(self, f, title, columns):
+        self.f = f
+        title = html.escape(title)
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{title}</title>\n"
+                "<style>body{font-family:sans-serif} table{border-collapse:collapse} "
+                "th,td{border:1px solid #ccc;padding:2px 8px} td.n{text-align:right}</style></head>\n"
+                f"<body><h1>{title}</h1>\n<table><thead><tr>"
+                + "".join(f"<th>{html.escape(column)}</th>" for column in columns) + "</tr></thead><tbody>\n")
+
+    def write(self, row):
+        self.f.write("<tr>" + "".join(self._cell(value) for value in row) + "</tr>\n")
+
+    def close(self):
+        self.f.write(f"</tbody></table>\n<p>Generated {datetime.datetime.now():%Y-%m-%d %H:%M}</p></body></html>\n")
+
+    @staticmethod
+    def _cell(value):
+        if isinstance(value, float):
+            return f'<td class="n">{value:,.2f}</td>'
+        if isinstance(value, int):
+            return f'<td class="n">{value:,}</td>'
+        return f"<td>{html.escape(str(value))}</td>"
+
+
+WRITERS = {"csv": CsvReport, "html": HtmlReport}
+
+
+def write_report(path, kind, rows, fmt="csv", title=None):
+    """Streams 'rows' of a report kind to 'path'. Returns the row count."""
+    partial = path + ".partial"
+    written = 0
+    with open(partial, "w", newline="", encoding="utf-8") as f:
+        writer = WRITERS[fmt](f, title or TITLES[kind], COLUMNS[kind])
+        for row in rows:
+            writer.write(row)
+            written += 1
+        writer.close()
+    os.replace(partial, path)
+    return written
+
+
+def generate(db, dest=None, kinds=REPORT_KINDS, formats=("csv",), start=None, end=None, workers=None,
+             progress=None):
+    """Builds the reports of 'kinds' for sales in [start, end) into 'dest'. Returns [(path, rows)].
+
+    'workers' defaults to one per CPU for stores with at least
+    PARALLEL_MIN_SALES sales, else 1. progress(done, total) counts the date
+    ranges aggregated.
+    """
+    dest = dest or os.path.join(os.path.dirname(os.path.abspath(db.path)), REPORT_DIR)
+    os.makedirs(dest, exist_ok=True)
+    if workers is None and db.dashboard_stats()[2] < PARALLEL_MIN_SALES:
+        workers = 1
+    totals = aggregate(plan(db, start, end), workers, progress)
+
+    if start or end:
+        span = f"{start or 'first sale'} to {(end - datetime.timedelta(days=1)) if end else 'latest sale'}"
+    else:
+        span = None
+    written = []
+    for kind in kinds:
+        title = f"{TITLES[kind]}, {span}" if span else None
+        for fmt in formats:
+            path = os.path.join(dest, REPORT_FILE.format(kind=kind, ext=fmt))
+            written.append((path, write_report(path, kind, totals.rows(kind), fmt, title)))
+    return written
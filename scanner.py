@@ -0,0 +1,119 @@
+# --- BARCODE SCANNING ---
+# A USB keyboard-wedge scanner "types" the code a few milliseconds per
+# character and presses Enter. BurstDetector tells such bursts apart from a
+# person typing, from the Tk timestamps of the key events; SkuCache resolves
+# the scanned code to a product in O(1) without a search query.
+#
+# Both live on the Tk thread. Key events are handled one at a time in arrival
+# order, so as long as the scan handler never waits (no dialogs, no blocking
+# calls), back-to-back scans cannot drop or interleave keystrokes. A cache miss
+# is therefore looked up on a worker thread (SkuCache.fetch) and the result
+# handed back to the Tk thread, never read inline. Lookups can finish in any
+# order, and a later scan may even be a cache hit, so ScanQueue holds each
+# result back until every earlier scan has been handled: lines reach the bill
+# in the order they were scanned.
+
+SCAN_MAX_GAP_MS = 50   # keystrokes closer together than this come from a scanner
+SCAN_MIN_LENGTH = 3    # shorter bursts are treated as typing
+
+
+class BurstDetector:
+    """Tracks the keystrokes typed into an entry since it was last cleared."""
+
+    def __init__(self, max_gap_ms=SCAN_MAX_GAP_MS, min_length=SCAN_MIN_LENGTH):
+        self.max_gap_ms = max_gap_ms
+        self.min_length = min_length
+        self.reset()
+
+    def reset(self):
+        self.first_ms = None
+        self.last_ms = None
+        self.keys = 0
+        self.slowest_gap_ms = 0
+
+    def key(self, event):
+        """Records a printable keystroke (bind to '<Key>'); other keys are ignored."""
+        if not event.char or not event.char.isprintable():
+            return
+        if self.last_ms is not None:
+            gap = event.time - self.last_ms
+            if gap > self.max_gap_ms * 4:
+                self.reset()  # A pause: whatever came before was typed, not scanned
+            else:
+                self.slowest_gap_ms = max(self.slowest_gap_ms, gap)
+        if self.first_ms is None:
+            self.first_ms = event.time
+        self.last_ms = event.time
+        self.keys += 1
+
+    def is_burst(self, text):
+        """Whether 'text' (the entry's contents at Enter) arrived as one scanner burst."""
+        return (self.keys >= self.min_length and self.keys == len(text)
+                and self.slowest_gap_ms <= self.max_gap_ms)
+
+
+class ScanQueue:
+    """Releases scan outcomes in scan order, whatever order their lookups finish in.
+
+    add() gives a scan its ticket; resolve(ticket, outcome) records what the
+    scan came to and returns the outcomes now due, oldest first (none while an
+    earlier scan is still being looked up). Used on the Tk thread only.
+    """
+
+    def __init__(self):
+        self._next = 0      # ticket of the next scan
+        self._due = 0       # oldest ticket not released yet
+        self._outcomes = {}  # ticket -> outcome, resolved but waiting for earlier scans
+
+    def add(self):
+        ticket = self._next
+        self._next += 1
+        return ticket
+
+    def resolve(self, ticket, outcome):
+        self._outcomes[ticket] = outcome
+        due = []
+        while self._due in self._outcomes:
+            due.append(self._outcomes.pop(self._due))
+            self._due += 1
+        return due
+
+
+class SkuCache:
+    """SKU -> (sku, name, price, quantity), filled from primary-key lookups.
+
+    get() only ever looks in the dict, so it is safe on the Tk thread. On a
+    miss the caller runs fetch() (one indexed read, or an HTTP request on a
+    remote till) on a worker thread and remember()s the row back on the Tk
+    thread. The app keeps cached stock current from StockChanged events and
+    drops entries on removals and imports. Another terminal's sales are not
+    seen until then, but Database.checkout re-checks stock anyway.
+    """
+
+    def __init__(self, db):
+        self.db = db  # a Database, core.StockService or client.StockClient
+        self._rows = {}
+
+    def get(self, sku):
+        """The cached row for 'sku', or None on a miss."""
+        return self._rows.get(sku)
+
+    def fetch(self, sku):
+        """Reads one product from the store, bypassing the cache; blocks, so not for the Tk thread."""
+        return self.db.product_by_sku(sku)
+
+    def remember(self, rows):
+        """Caches rows already read elsewhere (e.g. the search results)."""
+        for row in rows:
+            self._rows[row[0]] = row
+
+    def update_stock(self, sku, quantity):
+        row = self._rows.get(sku)
+        if row is not None:
+            self._rows[sku] = row[:3] + (quantity,)
+
+    def discard(self, sku):
+        self._rows.pop(sku, None)
+
+    def clear(self):
+        self._rows.clear()
@@ -0,0 +1,260 @@
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from client import TOKEN_ENV
+from core import StockService
+from db import Database, InsufficientStock, StaleVersion, SEARCH_LIMIT
+from journal import JournalInUse, SalesJournal
+from backup import BackupScheduler
+
+# --- STOCK SERVER ---
+# Serves one inventory.db to several tills over a small JSON API, so every
+# terminal sells from the same stock (see client.StockClient, and app.py
+# --server). Requests run on a fixed pool of worker threads, each with its own
+# SQLite connection; checkouts go through the sales journal, so the sales of
+# all terminals share fsyncs and write transactions.
+#
+#     GET  /api/products?q=<term>&limit=<n>   search          {"products": [[sku, name, price, quantity], ...]}
+#     GET  /api/products/<sku>                one product     {"product": [...], "version": n}
+#     PUT  /api/products/<sku>                {"name", "price", "quantity", "version"}: overwrite if still at
+#                                             'version', else 409 with the current row
+#     POST /api/checkout                      {"lines": [[sku, name, qty, unit_price], ...], "total"}
+#                                             -> {"sale": transaction id, "created_at", "stock": {sku: left}},
+#                                             or 409 {"shortfalls"}; answered once the sale is in the database
+#     GET  /api/stats                         the dashboard counters
+#
+# GET responses carry an ETag and answer If-None-Match with 304, and every
+# response has X-Data-Version, so clients can cache reads and know when to
+# drop them. If STOCKDESK_SERVER_TOKEN is set, requests must send it as a
+# Bearer token. The server listens on 127.0.0.1 unless told otherwise.
+#
+#     python server.py [--db inventory.db] [--host 0.0.0.0] [--port 8766] [--workers 32]
+
+DEFAULT_PORT = 8766
+WORKERS = 32              # concurrent connections served; keep-alive holds one per terminal
+KEEPALIVE_TIMEOUT = 15    # seconds an idle connection keeps its worker
+MAX_BODY = 1024 * 1024    # bytes accepted in a request body
+MAX_LIMIT = 500           # largest search page
+PRODUCT_PATH = "/api/products/"
+
+
+class BadRequest(Exception):
+    pass
+
+
+class PooledHTTPServer(HTTPServer):
+    """An HTTPServer that hands each connection to a fixed thread pool."""
+
+    def __init__(self, address, service, workers=WORKERS, token=None):
+        super().__init__(address, StockHandler)
+        self.service = service
+        self.token = token
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="stock-server")
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive: a terminal reuses one connection
+    timeout = KEEPALIVE_TIMEOUT
+    disable_nagle_algorithm = True  # headers and body are separate writes; don't hold the body for an ACK
+
+    def log_message(self, *args):
+        pass
+
+    # --- Routing ---
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_PUT(self):
+        self._handle(self._put)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _handle(self, route):
+        token = self.server.token
+        if token is not None and self.headers.get("Authorization") != f"Bearer {token}":
+            self.send_json(401, {"error": "Missing or wrong token."})
+            return
+        try:
+            route(urlsplit(self.path))
+        except BadRequest as e:
+            self.close_connection = True  # The body may not have been read
+            self.send_json(400, {"error": str(e)})
+
+    def _get(self, url):
+        service = self.server.service
+        if url.path == "/api/products":
+            query = parse_qs(url.query)
+            term = query.get("q", [""])[0]
+            limit = min(self._int(query.get("limit", [SEARCH_LIMIT])[0]), MAX_LIMIT)
+            version = service.version()
+            if not self.not_modified(version):
+                self.send_json(200, {"products": service.search_products(term, limit)}, etag=version)
+        elif url.path.startswith(PRODUCT_PATH):
+            row = service.product_by_sku(unquote(url.path[len(PRODUCT_PATH):]), with_version=True)
+            if row is None:
+                self.send_json(404, {"error": "No such product."})
+                return
+            etag = f"{row[4]}.{row[3]}"  # the row version, plus the stock pending sales project
+            if not self.not_modified(etag):
+                self.send_json(200, {"product": row[:4], "version": row[4]}, etag=etag)
+        elif url.path == "/api/stats":
+            version = service.version()
+            if not self.not_modified(version):
+                product_count, low_stock, sales_count, revenue = service.dashboard_stats()
+                self.send_json(200, {"product_count": product_count, "low_stock_count": low_stock,
+                                     "sales_count": sales_count, "revenue": revenue}, etag=version)
+        else:
+            self.send_json(404, {"error": "Not found."})
+
+    def _put(self, url):
+        if not url.path.startswith(PRODUCT_PATH):
+            self.send_json(404, {"error": "Not found."})
+            return
+        sku = unquote(url.path[len(PRODUCT_PATH):])
+        body = self.read_json()
+        try:
+            name, price, quantity, version = (str(body["name"]), float(body["price"]),
+                                              int(body["quantity"]), int(body["version"]))
+        except (KeyError, TypeError, ValueError):
+            raise BadRequest("Expected name, price, quantity and version.")
+        try:
+            new_version = self.server.service.update_product(sku, name, price, quantity, version)
+        except KeyError:
+            self.send_json(404, {"error": "No such product."})
+        except StaleVersion as e:
+            self.send_json(409, {"error": str(e), "product": e.current[:4], "version": e.current[4]})
+        else:
+            self.send_json(200, {"product": [sku, name, price, quantity], "version": new_version})
+
+    def _post(self, url):
+        if url.path != "/api/checkout":
+            self.send_json(404, {"error": "Not found."})
+            return
+        body = self.read_json()
+        try:
+            lines = [(str(sku), str(name), int(qty), float(unit_price)) for sku, name, qty, unit_price in body["lines"]]
+            total = float(body["total"])
+        except (KeyError, TypeError, ValueError):
+            raise BadRequest("Expected lines of [sku, name, qty, unit_price] and a total.")
+        if not lines or any(qty < 1 for _, _, qty, _ in lines):
+            raise BadRequest("A sale needs at least one line, each with a positive quantity.")
+        try:
+            sale, created_at, stock = self.server.service.record_sale(lines, total)
+        except InsufficientStock as e:
+            self.send_json(409, {"error": str(e), "shortfalls": e.shortfalls})
+        else:
+            self.send_json(200, {"sale": sale, "created_at": created_at, "stock": stock})
+
+    # --- Helpers ---
+    def read_json(self):
+        length = self._int(self.headers.get("Content-Length", "0"))
+        if length > MAX_BODY:
+            raise BadRequest("Request body too large.")
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            raise BadRequest("Request body is not JSON.")
+
+    def not_modified(self, etag):
+        """Answers 304 if the client's copy is current; returns whether it did."""
+        if self.headers.get("If-None-Match") != f'"{etag}"':
+            return False
+        self.send_response(304)
+        self.send_header("ETag", f'"{etag}"')
+        self.send_header("X-Data-Version", self.server.service.version())
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        return True
+
+    def send_json(self, status, payload, etag=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("X-Data-Version", self.server.service.version())
+        if etag is not None:
+            self.send_header("ETag", f'"{etag}"')
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def _int(text):
+        try:
+            return int(text)
+        except (TypeError, ValueError):
+            raise BadRequest(f"Not a number: {text!r}")
+
+
+def serve(db_path, host="127.0.0.1", port=DEFAULT_PORT, workers=WORKERS, token=None, journal=True):
+    """Opens the database (replaying the sales journal) and returns a PooledHTTPServer, not yet serving.
+
+    If another process owns the journal, checkouts are written directly instead.
+    """
+    db = Database(db_path)
+    db.setup()
+    sales_journal = None
+    if journal:
+        sales_journal = SalesJournal(db)
+        try:
+            sales_journal.start()
+        except JournalInUse:
+            sales_journal = None
+    return PooledHTTPServer((host, port), StockService(db, sales_journal), workers, token)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the inventory to several tills over HTTP.")
+    parser.add_argument("--db", default="inventory.db")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to listen on (0.0.0.0 for the whole network)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--no-journal", action="store_true", help="write each checkout directly instead")
+    args = parser.parse_args(argv)
+
+    server = serve(args.db, args.host, args.port, args.workers, os.environ.get(TOKEN_ENV), not args.no_journal)
+    backups = BackupScheduler(server.service.db, on_done=lambda path: print(f"Backup saved: {path}", flush=True),
+                              on_error=lambda e: print(f"Backup failed: {e}", file=sys.stderr, flush=True))
+    backups.start()
+    if not args.no_journal and server.service.journal is None:
+        print("Another process owns the sales journal; checkouts are written directly.", file=sys.stderr, flush=True)
+    print(f"Serving {args.db} on {server.url} (Ctrl+C to stop)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        backups.stop()
+        server.server_close()
+        server.service.close()
+        server.service.db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+from tkinter import ttk
+
+# --- REUSABLE WIDGETS ---
+
+
+class VirtualTreeview(ttk.Frame):
+    """A Treeview that only materializes the rows currently on screen.
+
+    Rows come from a db.PagedQuery. The widget keeps a small buffer of fetched
+    rows around the visible window; scrolling a little extends the buffer with a
+    keyset page before/after its first/last row, while scrollbar jumps fetch a
+    fresh window at the requested offset. The Treeview itself never holds more
+    than one screenful of items, whatever the size of the table.
+
+    Visible rows use the query's tiebreak value (e.g. the SKU) as their item id,
+    so callers can keep using focus()/item() as with a plain Treeview.
+    """
+
+    def __init__(self, parent, query, columns, formatter=None, page_size=100, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.query = query
+        self.columns = columns
+        self.formatter = formatter or (lambda row: row)
+        self.page_size = page_size
+
+        self.tree = ttk.Treeview(self, columns=columns, show='headings', selectmode='browse')
+        for col in columns:
+            if query.sortable(col):
+                self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            else:
+                self.tree.heading(col, text=col)
+        self.scrollbar = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.scrollbar.pack(side='right', fill='y')
+        self.tree.pack(expand=True, fill='both', side='left')
+
+        self.total = 0
+        self.top = 0                # index of the first visible row
+        self.visible = 20           # rows that fit in the current widget height
+        self._buffer = []           # fetched rows, in display order
+        self._buffer_start = 0      # absolute index of self._buffer[0]
+        self._update_heading_labels()
+
+        self.tree.bind("<Configure>", self._on_resize)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self._scroll_and_break(-3))
+        self.tree.bind("<Button-5>", lambda e: self._scroll_and_break(3))
+        self.tree.bind("<Up>", lambda e: self._move_selection(-1))
+        self.tree.bind("<Down>", lambda e: self._move_selection(1))
+        self.tree.bind("<Prior>", lambda e: self._move_selection(-self.visible))
+        self.tree.bind("<Next>", lambda e: self._move_selection(self.visible))
+        self.tree.bind("<Home>", lambda e: self._move_selection(-self.total))
+        self.tree.bind("<End>", lambda e: self._move_selection(self.total))
+
+    # --- Treeview compatibility ---
+    def focus(self):
+        return self.tree.focus()
+
+    def item(self, iid, **kwargs):
+        return self.tree.item(iid, **kwargs)
+
+    def bind_tree(self, sequence, func):
+        self.tree.bind(sequence, func, add='+')
+
+    # --- Data ---
+    def refresh(self):
+        """Re-reads the row count and the visible window (e.g. after a write)."""
+        self.total = self.query.count()
+        self._buffer = []
+        self._buffer_start = 0
+        self.top = max(0, min(self.top, self.total - self.visible))
+        self._render()
+
+    def reload(self, total_delta=0):
+        """Like refresh(), but adjusts the known row count instead of re-counting."""
+        self.total = max(0, self.total + total_delta)
+        self._buffer = []
+        self._buffer_start = 0
+        self.top = max(0, min(self.top, self.total - self.visible))
+        self._render()
+
+    def set_total(self, total):
+        """Re-reads the visible window for a row count computed elsewhere."""
+        self.reload(total - self.total)
+
+    def update_row(self, key, changes):
+        """Patches columns of one row in place, redrawing it if it is on screen.
+
+        'key' is the row's tiebreak value and 'changes' maps column names to new
+        values. Only valid when the change does not move the row in the current
+        sort order; otherwise call reload().
+        """
+        index = self.query.tiebreak[1]
+        for i, buffered in enumerate(self._buffer):
+            if buffered[index] == key:
+                row = list(buffered)
+                for column, value in changes.items():
+                    row[self.columns.index(column)] = value
+                self._buffer[i] = tuple(row)
+                iid = str(key)
+                if self.tree.exists(iid):
+                    self.tree.item(iid, values=self.formatter(row))
+                break
+
+    def sort_by(self, column):
+        """Sorts on a column in SQL; clicking the current sort column flips direction."""
+        descending = not self.query.descending if column == self.query.sort else False
+        self.query.set_sort(column, descending)
+        self._update_heading_labels()
+        self.top = 0
+        self.refresh()
+
+    def _update_heading_labels(self):
+        for col in self.columns:
+            label = col
+            if col == self.query.sort:
+                label += " ▼" if self.query.descending else " ▲"
+            self.tree.heading(col, text=label)
+
+    def _rows(self, start, count):
+        """Returns rows [start, start + count), fetching pages only when needed."""
+        end = min(self.total, start + count)
+        buf_end = self._buffer_start + len(self._buffer)
+        if self._buffer and self._buffer_start <= start and end <= buf_end:
+            pass
+        elif self._buffer and start >= self._buffer_start and start <= buf_end:
+            # Scrolled forward past the buffer: seek after its last row
+            more = self.query.fetch_after(self.query.key(self._buffer[-1]), max(self.page_size, end - buf_end))
+            self._buffer.extend(more)
+        elif self._buffer and end <= buf_end and end >= self._buffer_start:
+            # Scrolled backward past the buffer: seek before its first row
+            more = self.query.fetch_before(self.query.key(self._buffer[0]),
+                                           max(self.page_size, self._buffer_start - start))
+            self._buffer[:0] = more
+            self._buffer_start -= len(more)
+        else:
+            # A jump (or first load): fetch a window around the target position
+            self._buffer_start = max(0, start - self.page_size // 2)
+            self._buffer = self.query.fetch_at(self._buffer_start, count + self.page_size)
+
+        # Keep the buffer bounded by trimming the side furthest from the window
+        limit = 3 * self.page_size + count
+        if len(self._buffer) > limit:
+            if start - self._buffer_start > self._buffer_start + len(self._buffer) - end:
+                drop = len(self._buffer) - limit
+                del self._buffer[:drop]
+                self._buffer_start += drop
+            else:
+                del self._buffer[limit:]
+
+        offset = start - self._buffer_start
+        return self._buffer[offset:offset + (end - start)]
+
+    # --- Rendering ---
+    def _render(self):
+        selected = self.tree.focus()
+        self.tree.delete(*self.tree.get_children())
+        for row in self._rows(self.top, self.visible):
+            iid = str(row[self.query.tiebreak[1]])
+            self.tree.insert("", "end", iid=iid, values=self.formatter(row))
+        if selected and self.tree.exists(selected):
+            self.tree.focus(selected)
+            self.tree.selection_set(selected)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        if self.total <= 0:
+            self.scrollbar.set(0.0, 1.0)
+        else:
+            self.scrollbar.set(self.top / self.total, min(1.0, (self.top + self.visible) / self.total))
+
+    def scroll_to(self, top):
+        top = max(0, min(top, self.total - self.visible))
+        if top != self.top:
+            self.top = top
+            self._render()
+
+    # --- Event handlers ---
+    def _on_resize(self, event):
+        style = ttk.Style()
+        row_height = int(style.lookup("Treeview", "rowheight") or 20)
+        # One row's worth of space is taken by the headings
+        visible = max(1, event.height // row_height - 1)
+        if visible != self.visible:
+            self.visible = visible
+            self.top = max(0, min(self.top, self.total - self.visible))
+            self._render()
+
+    def _on_scrollbar(self, action, amount, unit=None):
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * self.total))
+        elif action == 'scroll':
+            step = self.visible if unit == 'pages' else 1
+            self.scroll_to(self.top + int(amount) * step)
+
+    def _on_mousewheel(self, event):
+        return self._scroll_and_break(-3 if event.delta > 0 else 3)
+
+    def _scroll_and_break(self, rows):
+        self.scroll_to(self.top + rows)
+        return "break"
+
+    def _move_selection(self, delta):
+        """Moves the selection by 'delta' rows, scrolling the window to follow it."""
+        children = self.tree.get_children()
+        if not children:
+            return "break"
+        selected = self.tree.focus()
+        index = self.top + (children.index(selected) if selected in children else 0)
+        index = max(0, min(self.total - 1, index + delta))
+        if index < self.top:
+            self.scroll_to(index)
+        elif index >= self.top + self.visible:
+            self.scroll_to(index - self.visible + 1)
+        children = self.tree.get_children()
+        target = children[min(len(children) - 1, index - self.top)]
+        self.tree.focus(target)
+        self.tree.selection_set(target)
+        return "break"